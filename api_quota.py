@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+第三方API每日配额计数模块
+计数保存在数据库 api_usage_daily 表中，通过条件自增实现原子占用，
+所有gunicorn worker共享同一配额，进程重启也不会清零
+"""
+
+import logging
+from datetime import datetime
+
+from database_config import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+
+class DailyQuota:
+    """按自然日计数的API配额"""
+
+    def __init__(self, provider, daily_limit):
+        self.provider = provider
+        self.daily_limit = daily_limit
+
+    @staticmethod
+    def today():
+        return datetime.now().strftime('%Y-%m-%d')
+
+    def usage_today(self):
+        """读取今日已使用次数"""
+        try:
+            with get_db_connection() as db:
+                row = db.execute(
+                    'SELECT count FROM api_usage_daily WHERE provider = ? AND usage_date = ?',
+                    (self.provider, self.today())
+                ).fetchone()
+            return row[0] if row else 0
+        except Exception as e:
+            logger.error(f"读取{self.provider}配额失败: {e}")
+            return 0
+
+    def try_acquire(self, limit=None):
+        """
+        尝试占用一次配额，成功返回True
+        使用 UPDATE ... WHERE count < limit 保证多个worker并发时不会超额
+        """
+        limit = self.daily_limit if limit is None else min(limit, self.daily_limit)
+        today = self.today()
+        try:
+            with get_db_connection() as db:
+                db.execute(
+                    'INSERT OR IGNORE INTO api_usage_daily (provider, usage_date, count) VALUES (?, ?, 0)',
+                    (self.provider, today)
+                )
+                cursor = db.execute(
+                    'UPDATE api_usage_daily SET count = count + 1 '
+                    'WHERE provider = ? AND usage_date = ? AND count < ?',
+                    (self.provider, today, limit)
+                )
+                acquired = cursor.rowcount == 1
+                db.commit()
+            return acquired
+        except Exception as e:
+            # 计数不可用时不调用API，宁可少用也不超额
+            logger.error(f"占用{self.provider}配额失败: {e}")
+            return False
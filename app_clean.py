@@ -6,15 +6,33 @@ import sqlite3
 import hashlib
 import hmac
 import json
-import requests
-import math
+import base64
 import logging
 import time
+import tempfile
 from datetime import datetime, timedelta
 from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from flask import Flask, request, jsonify, session, redirect, url_for, render_template_string, send_file
 import bcrypt
-from database_config import get_db_connection
+from database_config import get_db_connection, get_pool_stats
+from store_index import (search_local_stores, refresh_store_index, get_store_index,
+                         store_to_location, parse_coordinates, LOCAL_HIT_SCORE)
+from spatial_index import haversine_distance
+from route_cache import route_cache
+from route_optimizer import build_distance_matrix, optimize_order, route_length
+from shared_cache import SharedCache, LRUCache
+from api_quota import DailyQuota
+from csv_export import iter_query_csv
+from xlsx_writer import iter_query_xlsx, XLSX_MIMETYPE
+from export_jobs import (register_export, enqueue as enqueue_export, get_job as get_export_job,
+                         job_path as export_job_path)
+from timesheet_importer import import_timesheet
+from timesheet_stats import month_range, fetch_monthly_totals, get_monthly_statistics
+from rollups import (fetch_rollup_record, apply_to_rollups, rebuild_department_rollups,
+                     remove_user_rollups, clear_rollups, admin_overview_sql)
+from http_client import http_client
+from timesheet_queries import MY_TIMESHEET_COLUMNS, my_timesheet_page_sql, admin_records_page_sql
 # 从环境变量或默认值获取配置
 AMAP_API_KEY = os.environ.get('AMAP_API_KEY', 'f2ed89b710d6a630881906c440f71691')
 AMAP_SECRET_KEY = os.environ.get('AMAP_SECRET_KEY', 'your_amap_secret_key_here')
@@ -99,23 +117,8 @@ def get_department_filter():
 
 # 带重试机制的HTTP请求
 def safe_request(url, params=None, timeout=15, max_retries=3):
-    """安全的HTTP请求，带重试机制"""
-    for attempt in range(max_retries):
-        try:
-            logger.info(f"API请求 (尝试 {attempt + 1}/{max_retries}): {url}")
-            response = requests.get(url, params=params, timeout=timeout)
-            response.raise_for_status()
-            return response
-        except requests.exceptions.Timeout:
-            logger.warning(f"请求超时 (尝试 {attempt + 1}/{max_retries}): {url}")
-            if attempt == max_retries - 1:
-                raise
-            time.sleep(1)  # 等待1秒后重试
-        except requests.exceptions.RequestException as e:
-            logger.error(f"请求失败 (尝试 {attempt + 1}/{max_retries}): {e}")
-            if attempt == max_retries - 1:
-                raise
-            time.sleep(1)  # 等待1秒后重试
+    """安全的HTTP请求，复用连接池，失败时按带抖动的指数退避重试"""
+    return http_client.get(url, params=params, timeout=timeout, max_retries=max_retries)
 
 # 输入验证和清理
 def validate_and_clean_input(data, field_name, data_type=str, default=None, min_value=None, max_value=None):
@@ -148,6 +151,27 @@ def validate_and_clean_input(data, field_name, data_type=str, default=None, min_
         logger.warning(f"数据类型转换失败 {field_name}: {value}, 使用默认值 {default}")
         return default
 
+# 列表接口分页配置
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+def encode_page_cursor(values):
+    """把上一页最后一行的排序键编码为分页游标"""
+    raw = json.dumps(list(values), ensure_ascii=False, default=str).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def decode_page_cursor(token, size):
+    """解析分页游标，无效时返回None"""
+    if not token:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token.encode('ascii')).decode('utf-8'))
+    except (ValueError, UnicodeError):
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    return values
+
 # 错误处理装饰器
 def handle_errors(f):
     """统一错误处理装饰器"""
@@ -788,6 +812,11 @@ USER_INPUT_TEMPLATE = '''
             color: white;
         }
         
+        .data-source.local {
+            background-color: #fa8c16;
+            color: white;
+        }
+        
         .match-level {
             font-size: 10px;
             padding: 1px 4px;
@@ -1239,6 +1268,8 @@ USER_INPUT_TEMPLATE = '''
                 // 添加数据源标识和匹配度
                 const sourceText = location.source === 'tencent' ? 
                     '<span class="data-source tencent">腾讯</span>' : 
+                    location.source === 'local' ?
+                    '<span class="data-source local">门店库</span>' :
                     '<span class="data-source amap">高德</span>';
                 
                 // 匹配度显示
@@ -2036,6 +2067,11 @@ USER_RECORDS_TEMPLATE = '''
             color: white;
         }
         
+        .data-source.local {
+            background-color: #fa8c16;
+            color: white;
+        }
+        
         .match-level {
             font-size: 10px;
             padding: 1px 4px;
@@ -2217,6 +2253,7 @@ USER_RECORDS_TEMPLATE = '''
             <div class="table-header">
                 <div class="table-title">工时记录列表</div>
                 <div class="table-actions">
+                    <select id="monthSelect" class="form-control" style="width: auto; display: inline-block; margin-right: 10px;" onchange="loadRecords()"></select>
                     <button class="btn btn-success" onclick="exportData()">导出数据</button>
                 </div>
             </div>
@@ -2255,20 +2292,68 @@ USER_RECORDS_TEMPLATE = '''
     </div>
 
     <script>
+        // 当前月份（YYYY-MM）
+        function currentMonth() {
+            const now = new Date();
+            return now.getFullYear() + '-' + String(now.getMonth() + 1).padStart(2, '0');
+        }
+
+        // 加载有记录的月份列表，保留当前选择
+        async function loadMonths() {
+            const select = document.getElementById('monthSelect');
+            const selected = select.value || currentMonth();
+            try {
+                const response = await fetch('/api/my_timesheet/summary');
+                const data = await response.json();
+                const months = (data.months || []).map(m => m.month);
+                if (!months.includes(currentMonth())) {
+                    months.unshift(currentMonth());
+                }
+                months.sort().reverse();
+                select.innerHTML = months.map(m => {
+                    const summary = (data.months || []).find(item => item.month === m);
+                    const count = summary ? summary.record_count : 0;
+                    return `<option value="${m}">${m}（${count}条）</option>`;
+                }).join('');
+                select.value = months.includes(selected) ? selected : currentMonth();
+            } catch (error) {
+                console.error('加载月份失败:', error);
+                select.innerHTML = `<option value="${selected}">${selected}</option>`;
+            }
+        }
+
+        // 加载所选月份的工时记录（按页获取直到取完）
+        async function fetchMonthRecords(month) {
+            let records = [];
+            let cursor = null;
+            do {
+                const params = new URLSearchParams({ month: month, page_size: 200 });
+                if (cursor) {
+                    params.set('cursor', cursor);
+                }
+                const response = await fetch('/api/my_timesheet?' + params);
+                const data = await response.json();
+                if (!data.success) {
+                    throw new Error(data.message || '加载失败');
+                }
+                records = records.concat(data.records || []);
+                cursor = data.has_more ? data.next_cursor : null;
+            } while (cursor);
+            return records;
+        }
+
         // 加载工时记录
         async function loadRecords() {
             try {
-                const response = await fetch('/api/my_timesheet');
-                const data = await response.json();
+                const month = document.getElementById('monthSelect').value || currentMonth();
+                const [records] = await Promise.all([fetchMonthRecords(month), loadStatistics(month)]);
                 
-                if (data.records && data.records.length > 0) {
-                    displayRecords(data.records);
-                    updateStatistics(data.records);
+                if (records.length > 0) {
+                    displayRecords(records);
                     document.getElementById('emptyState').style.display = 'none';
                 } else {
                     document.getElementById('dataTableBody').innerHTML = '';
                     document.getElementById('emptyState').style.display = 'block';
-                    resetStatistics();
                 }
             } catch (error) {
                 console.error('加载记录失败:', error);
@@ -2305,104 +2390,28 @@ USER_RECORDS_TEMPLATE = '''
             });
         }
 
-        // 薪资梯队计算函数
-        function calculateBonusSalary(avgStoreTime, extraStores) {
-            // 根据月店均巡店时长确定梯队
-            let salaryMatrix;
-            if (avgStoreTime <= 1.5) {
-                salaryMatrix = [25, 30, 35, 40];
-            } else if (avgStoreTime <= 1.7) {
-                salaryMatrix = [30, 35, 40, 45];
-            } else if (avgStoreTime <= 2) {
-                salaryMatrix = [35, 40, 45, 50];
-            } else {
-                salaryMatrix = [40, 45, 50, 55];
-            }
-            
-            // 根据额外巡店量确定档位
-            let tierIndex;
-            if (extraStores <= 10) {
-                tierIndex = 0;
-            } else if (extraStores <= 20) {
-                tierIndex = 1;
-            } else if (extraStores <= 30) {
-                tierIndex = 2;
-            } else {
-                tierIndex = 3;
-            }
-            
-            return extraStores * salaryMatrix[tierIndex];
-        }
-
-        // 更新统计信息
-        function updateStatistics(records) {
-            const totalRecords = records.length;
-            let totalHours = 0;
-            let totalStores = 0;
-            let totalDistance = 0;
-            let totalTravelHours = 0;  // 总里程时长
-            let totalVisitHours = 0;   // 总巡店时长
-            let totalActualVisitDays = 0; // 累计实际巡店天数
-            
-            // 统计不同工作日期的数量（实际巡店日期数）
-            const uniqueDates = new Set();
-            
-            records.forEach(record => {
-                totalHours += record.total_work_hours || 0;
-                totalStores += record.audit_store_count || 0;
-                totalDistance += record.round_trip_distance || 0;
-                totalTravelHours += record.travel_hours || 0;
-                totalVisitHours += record.visit_hours || 0;
-                
-                // 累加每条记录的实际巡店天数（用于显示）
-                totalActualVisitDays += record.actual_visit_days || 0;
-                
-                // 添加工作日期到集合中（去重）
-                if (record.work_date) {
-                    uniqueDates.add(record.work_date);
+        // 更新统计信息（由服务端 /api/my_stats 计算）
+        async function loadStatistics(month) {
+            try {
+                const response = await fetch('/api/my_stats?month=' + encodeURIComponent(month));
+                const data = await response.json();
+                if (!data.success) {
+                    resetStatistics();
+                    return;
                 }
-            });
-            
-            // 实际巡店日期数 = 不同日期的数量
-            const actualWorkDays = uniqueDates.size;
-            
-            // 路途天数计算逻辑：非浙江省需要减去路途时间
-            // 填写期间：每个日期-1天，最终核算：总共-2天
-            const isZhejiang = false; // 这里可以根据用户地区设置
-            let adjustedWorkDays = actualWorkDays;
-            
-            if (!isZhejiang && actualWorkDays > 0) {
-                // 填写期间逻辑：每个工作日期减去1天路途时间
-                adjustedWorkDays = Math.max(1, actualWorkDays - 1);
-                // 注：最终核算时再减去2天的逻辑可以在月度汇总时应用
+                const stats = data.stats;
+                document.getElementById('totalRecords').textContent = stats.record_count;
+                document.getElementById('totalHours').textContent = stats.total_hours.toFixed(2) + 'h';
+                document.getElementById('totalDistance').textContent = stats.total_distance.toFixed(1) + 'km';
+                document.getElementById('actualWorkDays').textContent = stats.work_days + '天';
+                document.getElementById('avgDailyHours').textContent = stats.avg_daily_hours.toFixed(2) + 'h';
+                document.getElementById('avgStoreTime').textContent = stats.avg_store_time.toFixed(2) + 'h';
+                document.getElementById('extraStores').textContent = stats.extra_stores + '家';
+                document.getElementById('bonusSalary').textContent = stats.bonus_salary + '元';
+            } catch (error) {
+                console.error('加载统计失败:', error);
+                resetStatistics();
             }
-            
-            // 日均工时 = 总工时 ÷ 实际巡店日期数
-            const avgDailyHours = actualWorkDays > 0 ? totalHours / actualWorkDays : 0;
-            
-            // 月店均巡店时长 = 个人当月店均里程时长 + 个人平均巡店时长（最高60分钟）
-            const avgTravelTimePerStore = totalStores > 0 ? totalTravelHours / totalStores : 0;
-            const avgVisitTimePerStore = totalStores > 0 ? totalVisitHours / totalStores : 0;
-            const cappedVisitTime = Math.min(avgVisitTimePerStore, 1.0); // 最高60分钟(1小时)
-            const avgStoreTime = avgTravelTimePerStore + cappedVisitTime;
-            
-            // 额外巡店量 = (本月实际总工时 - 调整后巡店天数×8H) ÷ 月店均巡店时长
-            const standardHours = adjustedWorkDays * 8; // 标准工时 = 调整后巡店天数 × 8小时
-            const extraHours = Math.max(0, totalHours - standardHours); // 超出的工时
-            const extraStores = avgStoreTime > 0 ? Math.floor(extraHours / avgStoreTime) : 0;
-            
-            // 自主巡店加班薪资
-            const bonusSalary = calculateBonusSalary(avgStoreTime, extraStores);
-            
-            // 更新页面显示
-            document.getElementById('totalRecords').textContent = totalRecords;
-            document.getElementById('totalHours').textContent = totalHours.toFixed(2) + 'h';
-            document.getElementById('totalDistance').textContent = totalDistance.toFixed(1) + 'km';
-            document.getElementById('actualWorkDays').textContent = actualWorkDays + '天';
-            document.getElementById('avgDailyHours').textContent = avgDailyHours.toFixed(2) + 'h';
-            document.getElementById('avgStoreTime').textContent = avgStoreTime.toFixed(2) + 'h';
-            document.getElementById('extraStores').textContent = extraStores + '家';
-            document.getElementById('bonusSalary').textContent = bonusSalary + '元';
         }
 
         // 重置统计信息
@@ -2437,7 +2446,7 @@ USER_RECORDS_TEMPLATE = '''
                 
                 if (result.success) {
                     alert('记录删除成功！');
-                    loadRecords();
+                    loadMonths().then(loadRecords);
                 } else {
                     alert('删除失败：' + result.message);
                 }
@@ -2447,9 +2456,31 @@ USER_RECORDS_TEMPLATE = '''
             }
         }
 
-        // 导出数据
-        function exportData() {
-            window.location.href = '/api/export_timesheet';
+        // 导出数据（后台生成文件，完成后自动下载）
+        async function exportData() {
+            try {
+                let response = await fetch('/api/exports', {
+                    method: 'POST',
+                    headers: {'Content-Type': 'application/json'},
+                    body: JSON.stringify({kind: 'my_timesheet'})
+                });
+                let result = await response.json();
+                while (result.success && ['queued', 'running'].includes(result.job.status)) {
+                    await new Promise(resolve => setTimeout(resolve, 1000));
+                    response = await fetch('/api/exports/' + result.job.id);
+                    result = await response.json();
+                }
+                if (!result.success) {
+                    alert('导出失败：' + result.message);
+                } else if (result.job.status === 'done') {
+                    window.location.href = result.job.download_url;
+                } else {
+                    alert('导出失败：' + (result.job.error || '未知错误'));
+                }
+            } catch (error) {
+                alert('网络错误，请稍后重试');
+                console.error('Error:', error);
+            }
         }
 
         // 切换表单显示/隐藏
@@ -2737,6 +2768,8 @@ USER_RECORDS_TEMPLATE = '''
                 // 添加数据源标识和匹配度
                 const sourceText = location.source === 'tencent' ? 
                     '<span class="data-source tencent">腾讯</span>' : 
+                    location.source === 'local' ?
+                    '<span class="data-source local">门店库</span>' :
                     '<span class="data-source amap">高德</span>';
                 
                 // 匹配度显示
@@ -2879,7 +2912,7 @@ USER_RECORDS_TEMPLATE = '''
                     alert('工时记录保存成功！');
                     resetForm();
                     toggleForm(); // 隐藏表单
-                    loadRecords(); // 重新加载记录
+                    loadMonths().then(loadRecords); // 重新加载记录
                 } else {
                     alert('保存失败：' + result.message);
                 }
@@ -2890,7 +2923,7 @@ USER_RECORDS_TEMPLATE = '''
         
         // 页面加载完成后初始化
         document.addEventListener('DOMContentLoaded', function() {
-            loadRecords();
+            loadMonths().then(loadRecords);
             setupStoreSearch('startStore', 'startStoreResults');
             setupStoreSearch('endStore', 'endStoreResults');
             
@@ -3005,37 +3038,62 @@ def calculate_relevance_score(keyword, location):
     logger.info(f"相关性分数计算完成 {location['name']}: {score:.2f}")
     return max(0.0, score)  # 确保分数不为负
 
-# 腾讯地图搜索缓存和使用统计
-tencent_search_cache = {}  # 清空缓存以便测试
-tencent_daily_usage = {'date': '', 'count': 0}
+# 地图API并发请求线程池（每个worker进程一个，限制同时发出的请求数）
+MAP_API_MAX_WORKERS = int(os.environ.get('MAP_API_MAX_WORKERS', 8))
+map_api_executor = ThreadPoolExecutor(max_workers=MAP_API_MAX_WORKERS, thread_name_prefix='map-api')
+
+# 腾讯地图/高德地图搜索缓存（LRU+TTL，多个worker通过共享存储共用）和使用统计
+TENCENT_CACHE_SIZE = int(os.environ.get('TENCENT_CACHE_SIZE', 2000))
+TENCENT_CACHE_TTL = int(os.environ.get('TENCENT_CACHE_TTL', 7 * 86400))
+AMAP_SEARCH_CACHE_SIZE = int(os.environ.get('AMAP_SEARCH_CACHE_SIZE', 5000))
+AMAP_SEARCH_CACHE_TTL = int(os.environ.get('AMAP_SEARCH_CACHE_TTL', 3 * 86400))
+
+tencent_search_cache = SharedCache('tencent_search', maxsize=TENCENT_CACHE_SIZE, ttl=TENCENT_CACHE_TTL)
+amap_search_cache = SharedCache('amap_place_text', maxsize=AMAP_SEARCH_CACHE_SIZE, ttl=AMAP_SEARCH_CACHE_TTL)
+
+# 腾讯地图每日配额（所有worker共享计数），18点前最多使用70%
+TENCENT_DAILY_LIMIT = 200
+TENCENT_DAYTIME_LIMIT = 140
+tencent_quota = DailyQuota('tencent', TENCENT_DAILY_LIMIT)
+
+def tencent_cache_key(keyword, region=None):
+    """腾讯地图搜索缓存键（包含搜索区域）"""
+    return f"{keyword.lower().strip()}_{region or 'nationwide'}"
+
+def amap_place_search(params, timeout=10):
+    """调用高德place/text搜索，成功的响应写入共享缓存"""
+    cache_key = json.dumps({k: v for k, v in params.items() if k != 'key'}, ensure_ascii=False, sort_keys=True)
+    cached = amap_search_cache.get(cache_key)
+    if cached is not None:
+        logger.info(f"高德搜索缓存命中: {params.get('keywords')}")
+        return cached
+    
+    response = safe_request('https://restapi.amap.com/v3/place/text', params=params, timeout=timeout)
+    data = response.json()
+    if data.get('status') == '1':
+        amap_search_cache.set(cache_key, data)
+    return data
 
-def get_tencent_usage_today():
-    """获取今日腾讯地图API使用次数"""
-    from datetime import datetime
-    today = datetime.now().strftime('%Y-%m-%d')
-    if tencent_daily_usage['date'] != today:
-        # 新的一天，重置计数
-        tencent_daily_usage['date'] = today
-        tencent_daily_usage['count'] = 0
-    return tencent_daily_usage['count']
+def tencent_quota_limit(now=None):
+    """当前时段可用的腾讯配额上限：18点前保留30%给晚间"""
+    hour = (now or datetime.now()).hour
+    return TENCENT_DAYTIME_LIMIT if hour < 18 else TENCENT_DAILY_LIMIT
 
-def increment_tencent_usage():
-    """增加腾讯地图API使用计数"""
-    tencent_daily_usage['count'] += 1
-    logger.info(f"腾讯地图API今日使用次数: {tencent_daily_usage['count']}/200")
+def get_tencent_usage_today():
+    """获取今日腾讯地图API使用次数（跨worker共享）"""
+    return tencent_quota.usage_today()
 
 def should_use_tencent_api(keyword, amap_results):
     """智能判断是否需要使用腾讯地图API补充搜索"""
+    # 检查缓存：命中缓存不消耗配额，直接使用
+    if tencent_cache_key(keyword) in tencent_search_cache:
+        logger.info(f"使用腾讯地图搜索缓存: {keyword}")
+        return True
+    
     # 检查今日使用次数
     usage_today = get_tencent_usage_today()
-    if usage_today >= 200:
-        logger.warning("腾讯地图API今日使用次数已达上限(200次)")
-        return False
-    
-    # 检查缓存
-    cache_key = keyword.lower().strip()
-    if cache_key in tencent_search_cache:
-        logger.info(f"使用腾讯地图搜索缓存: {keyword}")
+    if usage_today >= TENCENT_DAILY_LIMIT:
+        logger.warning(f"腾讯地图API今日使用次数已达上限({TENCENT_DAILY_LIMIT}次)")
         return False
     
     # 智能判断：高德结果质量评估
@@ -3056,12 +3114,10 @@ def should_use_tencent_api(keyword, amap_results):
         return False
     
     # 节约策略：保留30%的配额用于下午和晚上使用
-    from datetime import datetime
-    current_hour = datetime.now().hour
-    if current_hour < 18:  # 上午到下午6点
-        if usage_today >= 140:  # 使用了70%配额
-            logger.info("节约模式：保留配额给晚间使用")
-            return False
+    # （这里只是预判，实际上限由 search_tencent_location 中的原子占用保证）
+    if usage_today >= tencent_quota_limit():
+        logger.info("节约模式：保留配额给晚间使用")
+        return False
     
     # 检查是否有明显的品牌关键词，如果没有品牌关键词可能是地标搜索，优先使用腾讯
     brand_keywords = ['古茗', '赵一鸣', '蜜雪冰城', '正新鸡排', '华莱士', '肯德基', '麦当劳']
@@ -3083,16 +3139,20 @@ def should_use_tencent_api(keyword, amap_results):
 def search_tencent_location(keyword, region=None):
     """使用腾讯地图API搜索地点（带缓存和限制）"""
     # 创建缓存key，如果有region则包含region
-    cache_key = f"{keyword.lower()}_{region or 'nationwide'}".strip()
+    cache_key = tencent_cache_key(keyword, region)
     
     # 检查缓存
-    if cache_key in tencent_search_cache:
+    cached = tencent_search_cache.get(cache_key)
+    if cached is not None:
         logger.info(f"返回腾讯地图缓存结果: {keyword}")
-        return tencent_search_cache[cache_key]
+        return cached
     
     try:
-        # 增加使用计数
-        increment_tencent_usage()
+        # 原子占用一次配额，所有worker共享计数，达到当前时段上限（18点前为日间上限）则不再请求
+        limit = tencent_quota_limit()
+        if not tencent_quota.try_acquire(limit=limit):
+            logger.warning(f"腾讯地图API当前时段配额已用完({limit}次)，跳过搜索: {keyword}")
+            return []
         url = 'https://apis.map.qq.com/ws/place/v1/search'
         params = {
             'keyword': keyword,
@@ -3102,7 +3162,7 @@ def search_tencent_location(keyword, region=None):
             'boundary': f'region({region},0)' if region else 'nearby(39.915,116.404,50000)'  # 腾讯API要求boundary参数，全国搜索改为附近搜索
         }
         
-        logger.info(f"腾讯地图API请求: {url} (今日第{tencent_daily_usage['count']}次)")
+        logger.info(f"腾讯地图API请求: {url} (今日第{get_tencent_usage_today()}次)")
         response = safe_request(url, params=params)
         
         if response and response.status_code == 200:
@@ -3134,9 +3194,8 @@ def search_tencent_location(keyword, region=None):
                     locations.append(location)
                     logger.info(f"腾讯地图结果: 名称='{location['name']}', 地址='{location['address']}', 相关性={relevance_score:.2f}")
                 
-                # 缓存结果（限制缓存大小，避免内存占用过多）
-                if len(tencent_search_cache) < 100:
-                    tencent_search_cache[cache_key] = locations
+                # 缓存结果（超出容量时按LRU淘汰）
+                tencent_search_cache.set(cache_key, locations)
                 
                 return locations
             else:
@@ -3157,7 +3216,16 @@ def search_location(keyword, city=None):
         return {'success': False, 'message': '搜索关键词太短'}
     
     try:
-        url = 'https://restapi.amap.com/v3/place/text'
+        # 优先查询本地门店索引，命中高相关门店时直接返回，不调用地图API
+        local_locations = []
+        try:
+            local_locations = search_local_stores(keyword, city=city)
+        except Exception as e:
+            logger.error(f"本地门店索引查询失败: {e}")
+        
+        if local_locations and local_locations[0]['relevance_score'] >= LOCAL_HIT_SCORE:
+            logger.info(f"本地门店索引命中 {len(local_locations)} 个结果: {keyword}")
+            return {'success': True, 'locations': local_locations[:8], 'source': 'local'}
         
         # 智能搜索策略 - 优先使用高德地图，腾讯地图作为备选
         search_strategies = []
@@ -3221,18 +3289,17 @@ def search_location(keyword, city=None):
         
         logger.info(f"搜索关键词: {keyword}")
         
-        all_locations = []  # 收集所有策略的结果
+        all_locations = list(local_locations)  # 收集所有策略的结果（含本地低分结果）
         
-        for i, params in enumerate(search_strategies):
+        def run_strategy(i, params):
+            """执行单个搜索策略，返回该策略的结果列表"""
             params['key'] = AMAP_API_KEY
             logger.info(f"尝试搜索策略 {i+1}: {params}")
             
             try:
-                response = safe_request(url, params=params, timeout=10)
-                data = response.json()
+                data = amap_place_search(params, timeout=10)
                 
                 logger.info(f"策略 {i+1} API响应状态: {data.get('status')}")
-                logger.info(f"策略 {i+1} API完整响应: {json.dumps(data, ensure_ascii=False, indent=2)}")
                 
                 if data['status'] == '1' and data.get('pois'):
                     strategy_locations = []
@@ -3264,21 +3331,31 @@ def search_location(keyword, city=None):
                         # 详细日志记录每个搜索结果
                         logger.info(f"策略{i+1} 结果 {len(strategy_locations)}: 名称='{poi['name']}', 地址='{poi['address']}', 相关性={relevance_score:.2f}")
                     
-                    # 将这个策略的结果添加到总结果中
-                    all_locations.extend(strategy_locations)
                     logger.info(f"策略 {i+1} 成功找到 {len(strategy_locations)} 个结果")
-                    
-                    # 如果找到了高分结果（相关性>100），优先返回
-                    high_score_results = [loc for loc in strategy_locations if loc['relevance_score'] > 100]
-                    if high_score_results:
-                        logger.info(f"策略 {i+1} 找到高相关性结果，提前返回")
-                        high_score_results.sort(key=lambda x: x['relevance_score'], reverse=True)
-                        return {'success': True, 'locations': high_score_results[:8]}
-                else:
-                    logger.info(f"策略 {i+1} 未找到结果")
+                    return strategy_locations
+                
+                logger.info(f"策略 {i+1} 未找到结果")
             except Exception as e:
                 logger.error(f"策略 {i+1} 执行失败: {e}")
-                continue
+            return []
+        
+        # 所有策略并发请求，先返回高分结果的策略胜出，其余未开始的策略直接取消
+        futures = {map_api_executor.submit(run_strategy, i, params): i
+                   for i, params in enumerate(search_strategies)}
+        for future in as_completed(futures):
+            strategy_locations = future.result()
+            
+            # 将这个策略的结果添加到总结果中
+            all_locations.extend(strategy_locations)
+            
+            # 如果找到了高分结果（相关性>100），优先返回
+            high_score_results = [loc for loc in strategy_locations if loc['relevance_score'] > 100]
+            if high_score_results:
+                logger.info(f"策略 {futures[future]+1} 找到高相关性结果，提前返回")
+                for other in futures:
+                    other.cancel()
+                high_score_results.sort(key=lambda x: x['relevance_score'], reverse=True)
+                return {'success': True, 'locations': high_score_results[:8]}
         
         # 智能决策是否使用腾讯地图搜索
         if should_use_tencent_api(keyword, all_locations):
@@ -3320,11 +3397,12 @@ def search_location(keyword, city=None):
             filtered_locations = final_locations[:8]  # 只取前8个最相关的结果
             
             # 统计数据源分布
-            amap_count = sum(1 for loc in filtered_locations if loc.get('source') != 'tencent')
+            amap_count = sum(1 for loc in filtered_locations if loc.get('source') not in ('tencent', 'local'))
             tencent_count = sum(1 for loc in filtered_locations if loc.get('source') == 'tencent')
+            local_count = sum(1 for loc in filtered_locations if loc.get('source') == 'local')
             
             logger.info(f"合并多数据源结果: 总共{len(all_locations)}个，去重后{len(final_locations)}个，最终返回{len(filtered_locations)}个")
-            logger.info(f"数据源分布: 高德{amap_count}个，腾讯{tencent_count}个")
+            logger.info(f"数据源分布: 高德{amap_count}个，腾讯{tencent_count}个，本地门店{local_count}个")
             return {'success': True, 'locations': filtered_locations}
         
         # 所有策略都失败，尝试智能推荐作为最后手段
@@ -3355,7 +3433,6 @@ def get_smart_recommendations(original_keyword):
         
         if found_brand:
             try:
-                url = 'https://restapi.amap.com/v3/place/text'
                 params = {
                     'key': AMAP_API_KEY,
                     'keywords': found_brand,
@@ -3367,8 +3444,7 @@ def get_smart_recommendations(original_keyword):
                     'citylimit': 'false'  # 全国范围搜索
                 }
                 
-                response = safe_request(url, params=params, timeout=10)
-                data = response.json()
+                data = amap_place_search(params, timeout=10)
                 
                 if data['status'] == '1' and data.get('pois'):
                     recommendations = []
@@ -3414,7 +3490,6 @@ def get_smart_recommendations(original_keyword):
                         keywords_to_try.append(simplified)
                 
                 for keyword_to_search in keywords_to_try[:1]:  # 只尝试第一个，避免过多请求
-                    url = 'https://restapi.amap.com/v3/place/text'
                     params = {
                         'key': AMAP_API_KEY,
                         'keywords': keyword_to_search,
@@ -3425,8 +3500,7 @@ def get_smart_recommendations(original_keyword):
                         'citylimit': 'false'
                     }
                     
-                    response = safe_request(url, params=params, timeout=10)
-                    data = response.json()
+                    data = amap_place_search(params, timeout=10)
                     
                     if data['status'] == '1' and data.get('pois'):
                         recommendations = []
@@ -3458,6 +3532,67 @@ def get_smart_recommendations(original_keyword):
         logger.error(f"获取智能推荐失败: {e}")
         return []
 
+def get_driving_route(start_location, end_location, route_strategy='10'):
+    """获取驾车路线（单程距离km、时长h，不含停车/等待时间），结果写入路线缓存"""
+    cached = route_cache.get(start_location, end_location, 'driving', route_strategy)
+    if cached:
+        logger.info(f"路线缓存命中: {start_location} -> {end_location}")
+        return dict(cached, success=True, cached=True)
+    
+    # 使用高德路径规划API - 驾车路线
+    url = 'https://restapi.amap.com/v3/direction/driving'
+    params = {
+        'key': AMAP_API_KEY,
+        'origin': start_location,
+        'destination': end_location,
+        'strategy': route_strategy,  # 使用用户选择的路线策略
+        'extensions': 'all',  # 返回详细信息
+        'waypoints': '',  # 途经点
+        'avoidpolygons': '',  # 避让区域
+        'avoidroad': '',  # 避让道路
+        'number': '3',  # 返回多条路径供选择
+        'multiexport': '1'  # 启用多路径导出
+    }
+    
+    response = safe_request(url, params=params, timeout=15)
+    data = response.json()
+    
+    if data['status'] == '1' and data.get('route', {}).get('paths'):
+        paths = data['route']['paths']
+        
+        # 打印所有路线选项
+        logger.info(f"找到 {len(paths)} 条路线:")
+        for i, p in enumerate(paths):
+            dist = float(p['distance']) / 1000
+            dur = float(p['duration']) / 3600
+            logger.info(f"  路线{i+1}: {dist:.3f}km, {dur*60:.1f}分钟")
+        
+        # 根据策略选择最佳路径
+        if route_strategy == '2':  # 最短路线（时间及里程最短）- 优先考虑时间
+            best_path = min(paths, key=lambda p: float(p['duration']))
+            logger.info("选择最短时间路线（时间及里程最短）")
+        elif route_strategy == '1':  # 最快路线
+            best_path = min(paths, key=lambda p: float(p['duration']))
+            logger.info("选择最快时间路线")
+        else:  # 默认选择第一条（推荐路线）
+            best_path = paths[0]
+            logger.info("选择推荐路线")
+        
+        route = {
+            'distance': float(best_path['distance']) / 1000,  # 转换为公里
+            'duration': float(best_path['duration']) / 3600,  # 转换为小时
+            'traffic_lights': best_path.get('traffic_lights', 0),  # 红绿灯数量
+            'tolls': float(best_path.get('tolls', 0)),  # 过路费
+            'toll_distance': float(best_path.get('toll_distance', 0)) / 1000  # 收费路段距离
+        }
+        logger.info(f"红绿灯数量: {route['traffic_lights']}, 过路费: {route['tolls']}元, 收费路段: {route['toll_distance']}km")
+        
+        route_cache.set(start_location, end_location, 'driving', route_strategy, route)
+        return dict(route, success=True, cached=False)
+    
+    logger.error(f"高德API错误: {data}")
+    return {'success': False, 'message': f"路线规划失败: {data.get('info', '未知错误')}"}
+
 def calculate_route(start_store, end_store, transport_mode='driving', route_strategy='10', start_location=None, end_location=None):
     """计算路线"""
     try:
@@ -3516,82 +3651,40 @@ def calculate_route(start_store, end_store, transport_mode='driving', route_stra
             end_location = normalize_coordinate(end_result['locations'][0]['location'])
         
         if transport_mode in ['driving', 'taxi']:
-            # 使用高德路径规划API - 驾车路线（打车也使用驾车路线）
-            url = 'https://restapi.amap.com/v3/direction/driving'
-            params = {
-                'key': AMAP_API_KEY,
-                'origin': start_location,
-                'destination': end_location,
-                'strategy': route_strategy,  # 使用用户选择的路线策略
-                'extensions': 'all',  # 返回详细信息
-                'waypoints': '',  # 途经点
-                'avoidpolygons': '',  # 避让区域
-                'avoidroad': '',  # 避让道路
-                'number': '3',  # 返回多条路径供选择
-                'multiexport': '1'  # 启用多路径导出
-            }
-            
-            response = safe_request(url, params=params, timeout=15)
-            data = response.json()
-            
+            # 驾车路线（打车也使用驾车路线），优先读取路线缓存
             logger.info(f"起点: {start_store} -> {start_location}")
             logger.info(f"终点: {end_store} -> {end_location}")
             logger.info(f"路线策略: {route_strategy}")
             logger.info(f"交通方式: {transport_mode}")
             
-            if data['status'] == '1' and data.get('route', {}).get('paths'):
-                paths = data['route']['paths']
-                
-                # 打印所有路线选项
-                logger.info(f"找到 {len(paths)} 条路线:")
-                for i, p in enumerate(paths):
-                    dist = float(p['distance']) / 1000
-                    dur = float(p['duration']) / 3600
-                    logger.info(f"  路线{i+1}: {dist:.3f}km, {dur*60:.1f}分钟")
-                
-                # 根据策略选择最佳路径
-                if route_strategy == '2':  # 最短路线（时间及里程最短）- 优先考虑时间
-                    best_path = min(paths, key=lambda p: float(p['duration']))
-                    logger.info("选择最短时间路线（时间及里程最短）")
-                elif route_strategy == '1':  # 最快路线
-                    best_path = min(paths, key=lambda p: float(p['duration']))
-                    logger.info("选择最快时间路线")
-                else:  # 默认选择第一条（推荐路线）
-                    best_path = paths[0]
-                    logger.info("选择推荐路线")
-                
-                distance = float(best_path['distance']) / 1000  # 转换为公里
-                duration = float(best_path['duration']) / 3600   # 转换为小时
-                
-                # 根据交通方式添加额外时间
-                if transport_mode == 'driving':
-                    # 驾车：添加0.16小时停车时长
-                    duration += 0.16
-                    logger.info(f"驾车模式：添加0.16小时停车时长")
-                elif transport_mode == 'taxi':
-                    # 打车：使用高德自驾路线时间 + 0.083小时等待时长
-                    duration += 0.083  # 只添加打车的等待时长
-                    logger.info(f"打车模式：添加0.083小时等待时长")
-                
-                # 获取路线详细信息
-                traffic_lights = best_path.get('traffic_lights', 0)  # 红绿灯数量
-                tolls = float(best_path.get('tolls', 0))  # 过路费
-                toll_distance = float(best_path.get('toll_distance', 0)) / 1000  # 收费路段距离
-                
-                logger.info(f"最终选择: {distance:.3f}km, {duration*60:.1f}分钟")
-                logger.info(f"红绿灯数量: {traffic_lights}, 过路费: {tolls}元, 收费路段: {toll_distance}km")
-                
-                return {
-                    'success': True,
-                    'distance': distance,  # 返回单程距离
-                    'duration': duration,  # 返回单程时间（已包含额外时间）
-                    'traffic_lights': traffic_lights,
-                    'tolls': tolls,  # 单程过路费
-                    'toll_distance': toll_distance
-                }
-            else:
-                logger.error(f"高德API错误: {data}")
-                return {'success': False, 'message': f"路线规划失败: {data.get('info', '未知错误')}"}
+            route = get_driving_route(start_location, end_location, route_strategy)
+            if not route['success']:
+                return route
+            
+            distance = route['distance']
+            duration = route['duration']
+            
+            # 根据交通方式添加额外时间
+            if transport_mode == 'driving':
+                # 驾车：添加0.16小时停车时长
+                duration += 0.16
+                logger.info(f"驾车模式：添加0.16小时停车时长")
+            elif transport_mode == 'taxi':
+                # 打车：使用高德自驾路线时间 + 0.083小时等待时长
+                duration += 0.083  # 只添加打车的等待时长
+                logger.info(f"打车模式：添加0.083小时等待时长")
+            
+            logger.info(f"最终选择: {distance:.3f}km, {duration*60:.1f}分钟")
+            
+            return {
+                'success': True,
+                'distance': distance,  # 返回单程距离
+                'duration': duration,  # 返回单程时间（已包含额外时间）
+                'traffic_lights': route['traffic_lights'],
+                'tolls': route['tolls'],  # 单程过路费
+                'toll_distance': route['toll_distance'],
+                'cached': route.get('cached', False)
+            }
         else:
             # 公共交通使用直线距离估算
             start_coords = start_location.split(',')
@@ -3634,22 +3727,14 @@ def calculate_route(start_store, end_store, transport_mode='driving', route_stra
         logger.error(f"路线计算失败: {e}")
         return {'success': False, 'message': '路线计算服务暂时不可用'}
 
-def haversine_distance(lat1, lon1, lat2, lon2):
-    """计算两点间的直线距离（公里）"""
-    R = 6371  # 地球半径（公里）
-    
-    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    
-    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-    c = 2 * math.asin(math.sqrt(a))
-    
-    return R * c
-
 def calculate_walking_time(start_location, end_location):
     """计算步行时长（小时）"""
     try:
+        cached = route_cache.get(start_location, end_location, 'walking')
+        if cached:
+            logger.info(f"步行路线缓存命中: {cached['distance']:.3f}km, {cached['duration']*60:.1f}分钟")
+            return cached['duration']
+        
         # 使用高德步行路径规划API
         url = 'https://restapi.amap.com/v3/direction/walking'
         params = {
@@ -3669,6 +3754,8 @@ def calculate_walking_time(start_location, end_location):
             walking_distance = float(data['route']['paths'][0]['distance']) / 1000
             
             logger.info(f"步行路线: {walking_distance:.3f}km, {walking_duration*60:.1f}分钟")
+            route_cache.set(start_location, end_location, 'walking', '',
+                            {'distance': walking_distance, 'duration': walking_duration})
             return walking_duration
         else:
             logger.warning(f"步行路线API错误: {data}")
@@ -3704,6 +3791,145 @@ def calculate_walking_time(start_location, end_location):
             logger.error("无法计算步行时长，返回0")
             return 0
 
+# 单次请求最多计算的站点数
+ROUTE_MATRIX_MAX_STOPS = 30
+
+def resolve_stop(stop):
+    """
+    将站点解析为 (名称, '经度,纬度', 门店编码)
+    支持门店编码、坐标字符串，或包含 store_code/location/name 的字典
+    """
+    if isinstance(stop, dict):
+        store_code = str(stop.get('store_code', '') or '').strip()
+        location = str(stop.get('location', '') or '').strip()
+        name = str(stop.get('name', '') or '').strip()
+    else:
+        store_code, location, name = '', '', str(stop or '').strip()
+        if ',' in name:
+            location, name = name, ''
+        elif name.isdigit():
+            store_code, name = name, ''
+    
+    if store_code and not location:
+        store = get_store_index().get(store_code)
+        if store:
+            location = f"{store['longitude']},{store['latitude']}"
+            name = name or store['name']
+    
+    if location:
+        try:
+            lng, lat = (float(x) for x in location.split(','))
+        except ValueError:
+            return None
+        # 兼容 纬度,经度 顺序
+        if 18 <= lng <= 54 and 73 <= lat <= 135:
+            lng, lat = lat, lng
+        return (name or store_code or location, f"{lng},{lat}", store_code)
+    
+    if name:
+        result = search_location(name)
+        if result.get('success') and result.get('locations'):
+            top = result['locations'][0]
+            return (name, top['location'], top.get('store_code', ''))
+    return None
+
+def calculate_route_matrix(stops, transport_mode='driving', route_strategy='10'):
+    """按顺序计算一天内各站点之间每一段的路线，缓存未命中的路段并发请求高德"""
+    resolved = []
+    for i, stop in enumerate(stops):
+        point = resolve_stop(stop)
+        if not point:
+            return {'success': False, 'message': f'无法确定第{i + 1}个站点的位置: {stop}'}
+        resolved.append(point)
+    
+    legs = list(zip(resolved[:-1], resolved[1:]))
+    futures = [
+        map_api_executor.submit(calculate_route, start[0], end[0], transport_mode,
+                                route_strategy, start[1], end[1])
+        for start, end in legs
+    ]
+    
+    leg_results = []
+    total_distance = 0.0
+    total_duration = 0.0
+    for index, ((start, end), future) in enumerate(zip(legs, futures)):
+        route = future.result()
+        if not route.get('success'):
+            return {'success': False, 'message': f'第{index + 1}段路线计算失败: {route.get("message", "")}'}
+        total_distance += route['distance']
+        total_duration += route['duration']
+        leg_results.append({
+            'index': index,
+            'from': {'name': start[0], 'location': start[1], 'store_code': start[2]},
+            'to': {'name': end[0], 'location': end[1], 'store_code': end[2]},
+            'distance': round(route['distance'], 3),
+            'duration': round(route['duration'], 3),
+            'cached': route.get('cached', False)
+        })
+    
+    return {
+        'success': True,
+        'transport_mode': transport_mode,
+        'legs': leg_results,
+        'total_distance': round(total_distance, 3),
+        'total_duration': round(total_duration, 3)
+    }
+
+def optimize_visit_order(stops, transport_mode='driving', return_to_start=False):
+    """
+    优化一天内的巡店顺序（第一个站点为出发点，保持不动）
+    路段距离优先使用路线缓存中的真实距离，未缓存的用直线距离估算，不额外调用高德API
+    """
+    resolved = []
+    for i, stop in enumerate(stops):
+        point = resolve_stop(stop)
+        if not point:
+            return {'success': False, 'message': f'无法确定第{i + 1}个站点的位置: {stop}'}
+        resolved.append(point)
+
+    if transport_mode == 'walking':
+        cache_mode, cache_strategy = 'walking', ''
+    else:
+        cache_mode, cache_strategy = 'driving', '10'  # 打车与驾车共用驾车路线缓存
+
+    # 耗时包含读取路线缓存和构建距离矩阵
+    started = time.perf_counter()
+    locations = [point[1] for point in resolved]
+    cached = route_cache.get_many(
+        [(a, b) for a in locations for b in locations if a != b], cache_mode, cache_strategy
+    )
+
+    def cached_distance(i, j):
+        route = cached.get((locations[i], locations[j]))
+        return route['distance'] if route else None
+
+    points = [tuple(float(x) for x in location.split(',')) for location in locations]
+    matrix, cached_legs = build_distance_matrix(points, cached_distance)
+    order, method = optimize_order(matrix, return_to_start)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    original_distance = route_length(matrix, list(range(len(resolved))), return_to_start)
+    optimized_distance = route_length(matrix, order, return_to_start)
+    logger.info(f"巡店顺序优化: {len(resolved)}个站点, 方法={method}, "
+                f"{original_distance:.2f}km -> {optimized_distance:.2f}km, 耗时{elapsed_ms:.1f}ms")
+
+    return {
+        'success': True,
+        'method': method,
+        'order': order,
+        'stops': [
+            {'name': resolved[i][0], 'location': resolved[i][1], 'store_code': resolved[i][2], 'input_index': i}
+            for i in order
+        ],
+        'original_distance': round(original_distance, 3),
+        'optimized_distance': round(optimized_distance, 3),
+        'saved_distance': round(original_distance - optimized_distance, 3),
+        'return_to_start': return_to_start,
+        'cached_legs': cached_legs,
+        'estimated_legs': len(resolved) * (len(resolved) - 1) - cached_legs,
+        'elapsed_ms': round(elapsed_ms, 1)
+    }
+
 # 路由
 @app.route('/')
 def index():
@@ -4412,6 +4638,10 @@ ADMIN_DASHBOARD_TEMPLATE = '''
                             </tr>
                         </tbody>
                     </table>
+                    <div id="recordsPager" style="display: none; text-align: center; padding: 15px; color: #666;">
+                        <span id="recordsPagerInfo"></span>
+                        <button class="btn" id="loadMoreRecordsBtn" onclick="loadRecords(true)" style="margin-left: 10px;">加载更多</button>
+                    </div>
                 </div>
             </div>
             
@@ -4937,8 +5167,30 @@ ADMIN_DASHBOARD_TEMPLATE = '''
             }
         }
 
-        // 加载工时记录
-        function loadRecords() {
+        // 加载工时记录（分页：首次查询重置列表，"加载更多"追加下一页）
+        let recordsCursor = null;
+        let recordsTotal = 0;
+        let recordsLoaded = 0;
+        
+        function renderRecordRow(record) {
+            return `
+                <tr>
+                    <td>${record.id}</td>
+                    <td>${record.user_name}</td>
+                    <td>${record.work_date}</td>
+                    <td>${record.start_location || '未设置'}</td>
+                    <td>${record.end_location || '未设置'}</td>
+                    <td>${record.round_trip_distance || 0}</td>
+                    <td>${record.total_work_hours}</td>
+                    <td>${formatDateTime(record.created_at)}</td>
+                    <td>
+                        <button class="btn btn-danger" onclick="deleteRecord(${record.id})">删除</button>
+                    </td>
+                </tr>
+            `;
+        }
+        
+        function loadRecords(append = false) {
             const startDate = document.getElementById('startDate').value;
             const endDate = document.getElementById('endDate').value;
             const userId = document.getElementById('userFilter').value;
@@ -4948,33 +5200,37 @@ ADMIN_DASHBOARD_TEMPLATE = '''
                 start_date: startDate,
                 end_date: endDate,
                 user_id: userId,
-                department: department
+                department: department,
+                page_size: 100
             });
+            if (append && recordsCursor) {
+                params.set('cursor', recordsCursor);
+            }
             
             fetch('/api/admin/records?' + params)
                 .then(response => response.json())
                 .then(data => {
                     if (data.success) {
                         const tbody = document.getElementById('recordsList');
-                        if (data.records && data.records.length > 0) {
-                            tbody.innerHTML = data.records.map(record => `
-                                <tr>
-                                    <td>${record.id}</td>
-                                    <td>${record.user_name}</td>
-                                    <td>${record.work_date}</td>
-                                    <td>${record.start_location || '未设置'}</td>
-                                    <td>${record.end_location || '未设置'}</td>
-                                    <td>${record.round_trip_distance || 0}</td>
-                                    <td>${record.total_work_hours}</td>
-                                    <td>${formatDateTime(record.created_at)}</td>
-                                    <td>
-                                        <button class="btn btn-danger" onclick="deleteRecord(${record.id})">删除</button>
-                                    </td>
-                                </tr>
-                            `).join('');
-                        } else {
+                        const records = data.records || [];
+                        if (!append) {
+                            recordsTotal = data.total || 0;
+                            recordsLoaded = 0;
+                            tbody.innerHTML = '';
+                        }
+                        recordsCursor = data.next_cursor;
+                        recordsLoaded += records.length;
+                        
+                        if (recordsLoaded === 0) {
                             tbody.innerHTML = '<tr><td colspan="9" style="text-align: center; color: #666;">没有找到符合条件的记录</td></tr>';
+                        } else {
+                            tbody.insertAdjacentHTML('beforeend', records.map(renderRecordRow).join(''));
                         }
+                        
+                        const pager = document.getElementById('recordsPager');
+                        pager.style.display = recordsLoaded > 0 ? 'block' : 'none';
+                        document.getElementById('recordsPagerInfo').textContent = `已显示 ${recordsLoaded} / 共 ${recordsTotal} 条`;
+                        document.getElementById('loadMoreRecordsBtn').style.display = data.has_more ? 'inline-block' : 'none';
                     }
                 })
                 .catch(error => {
@@ -5013,21 +5269,52 @@ ADMIN_DASHBOARD_TEMPLATE = '''
             });
         }
         
-        // 导出记录
+        // 导出记录（后台生成文件，完成后自动下载）
         function exportRecords() {
-            const startDate = document.getElementById('startDate').value;
-            const endDate = document.getElementById('endDate').value;
-            const userId = document.getElementById('userFilter').value;
-            const department = document.getElementById('departmentFilter').value;
+            const payload = {
+                kind: 'admin_records',
+                start_date: document.getElementById('startDate').value,
+                end_date: document.getElementById('endDate').value,
+                user_id: document.getElementById('userFilter').value,
+                department: document.getElementById('departmentFilter').value,
+                format: 'xlsx'
+            };
             
-            const params = new URLSearchParams({
-                start_date: startDate,
-                end_date: endDate,
-                user_id: userId,
-                department: department
+            fetch('/api/exports', {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify(payload)
+            })
+            .then(response => response.json())
+            .then(handleExportJob)
+            .catch(error => {
+                console.error('导出失败:', error);
+                alert('导出失败，请重试');
             });
-            
-            window.open('/api/admin/export_records?' + params, '_blank');
+        }
+        
+        // 轮询导出任务，完成后下载
+        function handleExportJob(result) {
+            if (!result.success) {
+                alert('导出失败：' + result.message);
+                return;
+            }
+            const job = result.job;
+            if (job.status === 'done') {
+                window.location.href = job.download_url;
+            } else if (job.status === 'failed') {
+                alert('导出失败：' + (job.error || '未知错误'));
+            } else {
+                setTimeout(() => {
+                    fetch('/api/exports/' + job.id)
+                        .then(response => response.json())
+                        .then(handleExportJob)
+                        .catch(error => {
+                            console.error('查询导出状态失败:', error);
+                            alert('导出失败，请重试');
+                        });
+                }, 1000);
+            }
         }
         
         // 格式化日期时间
@@ -5058,111 +5345,80 @@ def admin_dashboard():
     
     return render_template_string(ADMIN_DASHBOARD_TEMPLATE, user=user)
 
+# 管理概览缓存：键为 (月份, 查看者部门)，切换月份时短时间内重复访问直接返回
+ADMIN_OVERVIEW_CACHE_TTL = int(os.environ.get('ADMIN_OVERVIEW_CACHE_TTL', 30))
+admin_overview_cache = LRUCache(maxsize=256, ttl=ADMIN_OVERVIEW_CACHE_TTL)
+
+
+def query_admin_overview(db, month_start, month_end, department=None):
+    """
+    一次查询得到概览汇总行和各部门行（kind 区分），再取最近5条记录
+    department 不为空时只统计该部门
+    """
+    today = datetime.now().strftime('%Y-%m-%d')
+    overview_sql, recent_sql = admin_overview_sql(bool(department))
+    scope_params = (department,) if department else ()
+    
+    rows = db.execute(overview_sql, (*scope_params, month_start, month_end, today, *scope_params,
+                                     today, month_start, month_end, month_start, month_end,
+                                     month_start[:7])).fetchall()
+    
+    summary = rows[0]
+    # 统计各部门平均日工时（使用与专员端相同的算法：总工时 ÷ 实际巡店日期数）
+    dept_stats = [{
+        'department': row['department'],
+        'work_days': row['work_days'],
+        'actual_visit_days': row['actual_visit_days'],
+        'total_hours': row['total_hours'],
+        'avg_daily_hours': row['avg_daily_hours'] or 0
+    } for row in rows[1:]]
+    
+    # 最新5条工时记录
+    recent_records = db.execute(recent_sql, scope_params).fetchall()
+    
+    return {
+        'totalUsers': summary['total_users'],
+        'todayRecords': summary['today_records'],
+        'monthRecords': summary['month_records'],
+        'totalHours': round(summary['total_hours'], 1),
+        'departmentStats': dept_stats,
+        'recentRecords': [{
+            'user_name': record['user_name'],
+            'work_date': record['work_date'],
+            'start_location': record['start_location'],
+            'end_location': record['end_location'],
+            'total_work_hours': record['total_work_hours'],
+            'created_at': record['created_at']
+        } for record in recent_records]
+    }
+
 # 管理者API端点
 @app.route('/api/admin/overview')
 def admin_overview():
-    """管理者概览统计API"""
+    """管理者概览统计API（组长只统计本部门）"""
     if 'user_id' not in session or session.get('role') not in ['admin', 'manager']:
         return jsonify({'success': False, 'message': '权限不足'}), 403
     
+    # 获取月份参数，默认为当前月份
+    selected_month = request.args.get('month') or datetime.now().strftime('%Y-%m')
     try:
-        # 获取月份参数，默认为当前月份
-        selected_month = request.args.get('month', datetime.now().strftime('%Y-%m'))
-        month_start = f"{selected_month}-01"
-        # 计算月末日期
-        if selected_month:
-            year, month = map(int, selected_month.split('-'))
-            if month == 12:
-                next_month = f"{year + 1}-01-01"
-            else:
-                next_month = f"{year}-{month + 1:02d}-01"
-            from datetime import datetime as dt
-            month_end = (dt.strptime(next_month, '%Y-%m-%d') - timedelta(days=1)).strftime('%Y-%m-%d')
-        else:
-            month_end = datetime.now().strftime('%Y-%m-%d')
-        
-        with get_db_connection() as db:
-            # 统计总用户数
-            total_users = db.execute('SELECT COUNT(*) FROM users').fetchone()[0]
-            
-            # 统计今日工时记录
-            today = datetime.now().strftime('%Y-%m-%d')
-            today_records = db.execute(
-                'SELECT COUNT(*) FROM timesheet_records WHERE work_date = ?', 
-                (today,)
-            ).fetchone()[0]
-            
-            # 统计选定月份工时记录
-            current_month_start = datetime.now().strftime('%Y-%m-01')
-            month_records = db.execute(
-                'SELECT COUNT(*) FROM timesheet_records WHERE work_date >= ? AND work_date <= ?', 
-                (month_start, month_end)
-            ).fetchone()[0]
-            
-            # 统计选定月份总工时
-            total_hours = db.execute(
-                'SELECT COALESCE(SUM(total_work_hours), 0) FROM timesheet_records WHERE work_date >= ? AND work_date <= ?', 
-                (month_start, month_end)
-            ).fetchone()[0]
-            
-            # 统计各部门平均日工时（使用与专员端相同的算法：总工时 ÷ 实际巡店日期数）
-            department_avg_hours = db.execute('''
-                SELECT 
-                    u.department,
-                    COUNT(DISTINCT t.work_date) as work_days,
-                    COALESCE(SUM(t.total_work_hours), 0) as total_hours,
-                    COALESCE(SUM(t.actual_visit_days), 0) as total_actual_visit_days,
-                    ROUND(COALESCE(SUM(t.total_work_hours), 0) / NULLIF(COALESCE(SUM(t.actual_visit_days), 0), 0), 2) as avg_daily_hours
-                FROM users u
-                LEFT JOIN timesheet_records t ON u.id = t.user_id AND t.work_date >= ? AND t.work_date <= ?
-                WHERE u.department IS NOT NULL AND u.department != ''
-                GROUP BY u.department
-                ORDER BY avg_daily_hours DESC
-            ''', (month_start, month_end)).fetchall()
-            
-            dept_stats = []
-            for dept in department_avg_hours:
-                dept_stats.append({
-                    'department': dept['department'],
-                    'work_days': dept['work_days'],
-                    'actual_visit_days': dept['total_actual_visit_days'],
-                    'total_hours': dept['total_hours'],
-                    'avg_daily_hours': dept['avg_daily_hours'] or 0
-                })
-            
-            # 获取最新5条工时记录
-            recent_records = db.execute('''
-                SELECT t.*, u.name as user_name 
-                FROM timesheet_records t 
-                JOIN users u ON t.user_id = u.id 
-                ORDER BY t.created_at DESC 
-                LIMIT 5
-            ''').fetchall()
-            
-            records_list = []
-            for record in recent_records:
-                records_list.append({
-                    'user_name': record['user_name'],
-                    'work_date': record['work_date'],
-                    'start_location': record['start_location'],
-                    'end_location': record['end_location'],
-                    'total_work_hours': record['total_work_hours'],
-                    'created_at': record['created_at']
-                })
-            
-            return jsonify({
-                'success': True,
-                'totalUsers': total_users,
-                'todayRecords': today_records,
-                'monthRecords': month_records,
-                'totalHours': round(total_hours, 1),
-                'departmentStats': dept_stats,
-                'recentRecords': records_list
-            })
-            
-    except Exception as e:
-        logger.error(f"加载管理者概览数据失败: {e}")
-        return jsonify({'success': False, 'message': '服务器错误'}), 500
+        month_start, month_end = month_range(selected_month)
+    except ValueError:
+        return jsonify({'success': False, 'message': '月份格式应为YYYY-MM'}), 400
+    
+    department = get_department_filter()
+    cache_key = (selected_month, department)
+    overview = admin_overview_cache.get(cache_key)
+    if overview is None:
+        try:
+            with get_db_connection() as db:
+                overview = query_admin_overview(db, month_start, month_end, department)
+        except Exception as e:
+            logger.error(f"加载管理者概览数据失败: {e}")
+            return jsonify({'success': False, 'message': '服务器错误'}), 500
+        admin_overview_cache.set(cache_key, overview)
+    
+    return jsonify({'success': True, **overview})
 
 @app.route('/api/admin/users')
 def admin_users():
@@ -5259,8 +5515,9 @@ def admin_delete_user():
             if user['username'] == 'admin':
                 return jsonify({'success': False, 'message': '不能删除管理员账号'}), 403
             
-            # 先删除用户的工时记录
+            # 先删除用户的工时记录及汇总数据
             db.execute('DELETE FROM timesheet_records WHERE user_id = ?', (user_id,))
+            remove_user_rollups(db, user_id)
             
             # 删除用户
             db.execute('DELETE FROM users WHERE id = ?', (user_id,))
@@ -5275,7 +5532,11 @@ def admin_delete_user():
 @app.route('/api/admin/records')
 @handle_errors
 def api_admin_records():
-    """管理者工时记录列表API"""
+    """
+    管理者工时记录列表API
+    按 (work_date, created_at, id) 倒序游标分页：page_size 指定每页条数，cursor 传上一页返回的 next_cursor
+    首页（不带cursor）额外返回符合条件的总条数
+    """
     if 'user_id' not in session or session.get('role') not in ['admin', 'manager']:
         return jsonify({'success': False, 'message': '权限不足'}), 403
     
@@ -5284,48 +5545,85 @@ def api_admin_records():
         end_date_str = request.args.get('end_date')
         user_id_filter = request.args.get('user_id')
         department_filter = request.args.get('department')
+        page_size = validate_and_clean_input(request.args, 'page_size', int, DEFAULT_PAGE_SIZE,
+                                             min_value=1, max_value=MAX_PAGE_SIZE)
+        cursor_token = request.args.get('cursor')
+        cursor = decode_page_cursor(cursor_token, 3)
+        if cursor_token and cursor is None:
+            return jsonify({'success': False, 'message': '分页参数无效'}), 400
+
+        conditions = []
+        params = []
+        if start_date_str:
+            conditions.append("t.work_date >= ?")
+            params.append(start_date_str)
+        if end_date_str:
+            conditions.append("t.work_date <= ?")
+            params.append(end_date_str)
+        if user_id_filter:
+            conditions.append("t.user_id = ?")
+            params.append(user_id_filter)
+        if department_filter:
+            conditions.append("u.department = ?")
+            params.append(department_filter)
+        
+        # 添加基于角色的部门过滤
+        current_department_filter = get_department_filter()
+        if current_department_filter:
+            conditions.append("u.department = ?")
+            params.append(current_department_filter)
+
+        where = ' AND '.join(conditions) or '1=1'
 
         with get_db_connection() as db:
-            query = """
-                SELECT t.*, u.name as user_name, u.department as user_department
-                FROM timesheet_records t
-                JOIN users u ON t.user_id = u.id
-                WHERE 1=1
-            """
-            params = []
-
-            if start_date_str:
-                query += " AND t.work_date >= ?"
-                params.append(start_date_str)
-            if end_date_str:
-                query += " AND t.work_date <= ?"
-                params.append(end_date_str)
-            if user_id_filter:
-                query += " AND u.id = ?"
-                params.append(user_id_filter)
-            if department_filter:
-                query += " AND u.department = ?"
-                params.append(department_filter)
-            
-            # 添加基于角色的部门过滤
-            current_department_filter = get_department_filter()
-            if current_department_filter:
-                query += " AND u.department = ?"
-                params.append(current_department_filter)
-
-            query += " ORDER BY t.work_date DESC, t.created_at DESC"
+            total = None
+            if cursor is None:
+                total = db.execute(f"""
+                    SELECT COUNT(*)
+                    FROM timesheet_records t
+                    JOIN users u ON t.user_id = u.id
+                    WHERE {where}
+                """, tuple(params)).fetchone()[0]
+
+            page_params = list(params)
+            if cursor is not None:
+                work_date, created_at, record_id = cursor
+                page_params += [work_date, work_date, created_at, created_at, record_id]
+
+            # 多取一条用于判断是否还有下一页
+            records = db.execute(admin_records_page_sql(where, cursor is not None),
+                                 tuple(page_params) + (page_size + 1,)).fetchall()
+
+        has_more = len(records) > page_size
+        records = records[:page_size]
+        records_list = [{
+            'id': record['id'],
+            'user_id': record['user_id'],
+            'user_name': record['user_name'] or '未知',
+            'user_department': record['user_department'] or '未设置',
+            'work_date': record['work_date'],
+            'start_location': record['start_location'],
+            'end_location': record['end_location'],
+            'round_trip_distance': record['round_trip_distance'],
+            'total_work_hours': record['total_work_hours'],
+            'created_at': record['created_at']
+        } for record in records]
+
+        next_cursor = None
+        if has_more:
+            last = records[-1]
+            next_cursor = encode_page_cursor((last['work_date'], last['cursor_created_at'], last['id']))
 
-            records = db.execute(query, tuple(params)).fetchall()
-            
-            records_list = []
-            for record in records:
-                record_dict = dict(record)
-                # 确保user_name和user_department存在，如果查询结果没有，则给默认值
-                record_dict['user_name'] = record_dict.get('user_name', '未知')
-                record_dict['user_department'] = record_dict.get('user_department', '未设置')
-                records_list.append(record_dict)
-            
-            return jsonify({'success': True, 'records': records_list})
+        result = {
+            'success': True,
+            'records': records_list,
+            'page_size': page_size,
+            'has_more': has_more,
+            'next_cursor': next_cursor
+        }
+        if total is not None:
+            result['total'] = total
+        return jsonify(result)
             
     except Exception as e:
         logger.error(f"加载管理者工时记录失败: {e}")
@@ -5346,12 +5644,13 @@ def admin_delete_record():
         
         with get_db_connection() as db:
             # 检查记录是否存在
-            record = db.execute('SELECT id FROM timesheet_records WHERE id = ?', (record_id,)).fetchone()
+            record = fetch_rollup_record(db, record_id)
             if not record:
                 return jsonify({'success': False, 'message': '记录不存在'}), 404
             
             # 删除记录
             db.execute('DELETE FROM timesheet_records WHERE id = ?', (record_id,))
+            apply_to_rollups(db, record, -1)
             db.commit()
             
             return jsonify({'success': True, 'message': '记录删除成功'})
@@ -5360,88 +5659,120 @@ def admin_delete_record():
         logger.error(f"删除工时记录失败: {e}")
         return jsonify({'success': False, 'message': '服务器错误'}), 500
 
+# Excel导出列：(记录字段, 表头, 单元格类型)
+EXPORT_XLSX_SPEC = [
+    ('id', 'ID', 'number'),
+    ('user_name', '专员姓名', 'text'),
+    ('user_department', '部门', 'text'),
+    ('work_date', '工作日期', 'date'),
+    ('business_trip_days', '出差天数', 'number'),
+    ('actual_visit_days', '实际巡店天数', 'number'),
+    ('audit_store_count', '审核门店数', 'number'),
+    ('training_store_count', '培训门店数', 'number'),
+    ('start_location', '起始门店', 'text'),
+    ('end_location', '终点门店', 'text'),
+    ('round_trip_distance', '单程距离(km)', 'number'),
+    ('transport_mode', '交通方式', 'text'),
+    ('schedule_number', '班次号', 'text'),
+    ('travel_hours', '巡途工时(H)', 'number'),
+    ('visit_hours', '巡店工时(H)', 'number'),
+    ('report_hours', '汇报工时(H)', 'number'),
+    ('total_work_hours', '合计工时(H)', 'number'),
+    ('notes', '备注', 'text'),
+    ('store_code', '门店编码', 'text'),
+    ('city', '城市', 'text'),
+    ('created_at', '录入时间', 'datetime'),
+]
+EXPORT_XLSX_FIELDS = [field for field, _, _ in EXPORT_XLSX_SPEC]
+EXPORT_XLSX_COLUMNS = [(title, kind) for _, title, kind in EXPORT_XLSX_SPEC]
+
+def build_admin_records_export(filters):
+    """
+    管理端工时记录导出，返回 (文件名, MIME类型, 字节块生成器)
+    filters: start_date/end_date/user_id/department，format=xlsx 导出Excel（全部字段，每个部门一个工作表），默认CSV；
+    scope_department 为部门经理只能导出的本部门（登记任务时由会话确定）
+    """
+    conditions = ''
+    params = []
+    
+    if filters.get('start_date'):
+        conditions += ' AND t.work_date >= ?'
+        params.append(filters['start_date'])
+    
+    if filters.get('end_date'):
+        conditions += ' AND t.work_date <= ?'
+        params.append(filters['end_date'])
+        
+    if filters.get('user_id'):
+        conditions += ' AND t.user_id = ?'
+        params.append(filters['user_id'])
+        
+    if filters.get('department'):
+        conditions += ' AND u.department = ?'
+        params.append(filters['department'])
+    
+    if filters.get('scope_department'):
+        conditions += ' AND u.department = ?'
+        params.append(filters['scope_department'])
+    
+    if filters.get('format') == 'xlsx':
+        # 按部门分组输出到各自的工作表
+        return (
+            f'工时记录_{datetime.now().strftime("%Y%m%d")}.xlsx',
+            XLSX_MIMETYPE,
+            iter_query_xlsx(
+                EXPORT_XLSX_COLUMNS,
+                f'''
+                    SELECT t.*, u.name as user_name, u.department as user_department
+                    FROM timesheet_records t
+                    JOIN users u ON t.user_id = u.id
+                    WHERE 1=1 {conditions}
+                    ORDER BY COALESCE(u.department, ''), t.work_date DESC, t.created_at DESC
+                ''',
+                params,
+                lambda record: [record[key] for key in EXPORT_XLSX_FIELDS],
+                sheet_key=lambda record: record['user_department'] or ''
+            )
+        )
+    
+    return (
+        f'工时记录_{datetime.now().strftime("%Y%m%d")}.csv',
+        'text/csv',
+        iter_query_csv(
+            ['ID', '专员姓名', '工作日期', '出发地点', '目标地点', 
+             '路程(km)', '总工时(h)', '录入时间'],
+            f'''
+                SELECT t.id, u.name as user_name, t.work_date, t.start_location, t.end_location,
+                       t.round_trip_distance, t.total_work_hours, t.created_at
+                FROM timesheet_records t 
+                JOIN users u ON t.user_id = u.id 
+                WHERE 1=1 {conditions}
+                ORDER BY t.work_date DESC, t.created_at DESC
+            ''',
+            params,
+            lambda record: [
+                record['id'],
+                record['user_name'],
+                record['work_date'],
+                record['start_location'] or '',
+                record['end_location'] or '',
+                record['round_trip_distance'] or 0,
+                record['total_work_hours'],
+                record['created_at']
+            ]
+        )
+    )
+
 @app.route('/api/admin/export_records')
 def admin_export_records():
-    """导出工时记录为Excel"""
+    """导出工时记录（旧地址，改为登记异步导出任务，见 /api/exports）"""
     if 'user_id' not in session or session.get('role') not in ['admin', 'manager']:
         return jsonify({'success': False, 'message': '权限不足'}), 403
     
-    try:
-        start_date = request.args.get('start_date', '')
-        end_date = request.args.get('end_date', '')
-        user_id = request.args.get('user_id', '')
-        department = request.args.get('department', '')
-        
-        with get_db_connection() as db:
-            query = '''
-                SELECT t.*, u.name as user_name, u.department as user_department 
-                FROM timesheet_records t 
-                JOIN users u ON t.user_id = u.id 
-                WHERE 1=1
-            '''
-            params = []
-            
-            if start_date:
-                query += ' AND t.work_date >= ?'
-                params.append(start_date)
-            
-            if end_date:
-                query += ' AND t.work_date <= ?'
-                params.append(end_date)
-                
-            if user_id:
-                query += ' AND t.user_id = ?'
-                params.append(user_id)
-                
-            if department:
-                query += ' AND u.department = ?'
-                params.append(department)
-            
-            query += ' ORDER BY t.work_date DESC, t.created_at DESC'
-            
-            records = db.execute(query, params).fetchall()
-            
-            # 简单的CSV导出（可以后续升级为Excel）
-            import csv
-            import io
-            
-            output = io.StringIO()
-            writer = csv.writer(output)
-            
-            # 写入表头
-            writer.writerow([
-                'ID', '专员姓名', '工作日期', '出发地点', '目标地点', 
-                '路程(km)', '总工时(h)', '录入时间'
-            ])
-            
-            # 写入数据
-            for record in records:
-                writer.writerow([
-                    record['id'],
-                    record['user_name'],
-                    record['work_date'],
-                    record['start_location'] or '',
-                    record['end_location'] or '',
-                    record['round_trip_distance'] or 0,
-                    record['total_work_hours'],
-                    record['created_at']
-                ])
-            
-            # 创建响应
-            from flask import Response
-            
-            output.seek(0)
-            return Response(
-                output.getvalue(),
-                mimetype='text/csv',
-                headers={
-                    'Content-Disposition': f'attachment; filename=工时记录_{datetime.now().strftime("%Y%m%d")}.csv'
-                }
-            )
-            
-    except Exception as e:
-        logger.error(f"导出工时记录失败: {e}")
-        return jsonify({'success': False, 'message': '服务器错误'}), 500
+    params = admin_export_params(request.args)
+    if params is None:
+        return jsonify({'success': False, 'message': '导出格式只支持csv或xlsx'}), 400
+    return legacy_export_response('admin_records', params)
 
 @app.route('/user')
 def user_dashboard():
@@ -5739,33 +6070,283 @@ def api_calculate_route():
     result = calculate_route(start_store, end_store, transport_mode, route_strategy, start_location, end_location)
     return jsonify(result)
 
+@app.route('/api/route_matrix', methods=['POST'])
+def api_route_matrix():
+    """批量路线API：按顺序传入一天的门店（编码或坐标），一次返回每段及合计距离/时长"""
+    data = request.get_json(silent=True) or {}
+    stops = data.get('stops') or []
+    transport_mode = data.get('transport_mode', 'driving')
+    
+    if not isinstance(stops, list) or len(stops) < 2:
+        return jsonify({'success': False, 'message': '至少需要两个站点'})
+    if len(stops) > ROUTE_MATRIX_MAX_STOPS:
+        return jsonify({'success': False, 'message': f'站点数量不能超过{ROUTE_MATRIX_MAX_STOPS}个'})
+    
+    return jsonify(calculate_route_matrix(stops, transport_mode))
+
+@app.route('/api/optimize_route', methods=['POST'])
+def api_optimize_route():
+    """巡店顺序优化API：传入一天的门店，返回总距离更短的访问顺序及节省的公里数"""
+    data = request.get_json(silent=True) or {}
+    stops = data.get('stops') or []
+    transport_mode = data.get('transport_mode', 'driving')
+    return_to_start = bool(data.get('return_to_start', False))
+
+    if not isinstance(stops, list) or len(stops) < 2:
+        return jsonify({'success': False, 'message': '至少需要两个站点'})
+    if len(stops) > ROUTE_MATRIX_MAX_STOPS:
+        return jsonify({'success': False, 'message': f'站点数量不能超过{ROUTE_MATRIX_MAX_STOPS}个'})
+
+    return jsonify(optimize_visit_order(stops, transport_mode, return_to_start))
+
+@app.route('/api/nearby_stores', methods=['GET', 'POST'])
+def api_nearby_stores():
+    """附近门店API：按门店编码或坐标查询最近的门店"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': '未登录'}), 401
+    
+    data = request.get_json(silent=True) or request.args
+    store_code = str(data.get('store_code', '') or '').strip()
+    location = str(data.get('location', '') or '').strip()
+    k = validate_and_clean_input(data, 'k', int, 5, min_value=1, max_value=50)
+    radius_km = validate_and_clean_input(data, 'radius_km', float, None, min_value=0.1, max_value=500)
+    
+    index = get_store_index()
+    origin_store = None
+    if store_code:
+        origin_store = index.get(store_code)
+        if not origin_store:
+            return jsonify({'success': False, 'message': f'未找到门店编码: {store_code}'})
+        longitude, latitude = origin_store['longitude'], origin_store['latitude']
+    else:
+        if location:
+            parts = location.split(',')
+            coordinates = parse_coordinates(*parts) if len(parts) == 2 else None
+        else:
+            coordinates = parse_coordinates(data.get('longitude'), data.get('latitude'))
+        if coordinates is None:
+            return jsonify({'success': False, 'message': '请提供门店编码或有效的经纬度（经度,纬度，需在中国境内）'}), 400
+        longitude, latitude = coordinates
+    
+    nearby = index.nearby(longitude, latitude, k=k, radius_km=radius_km,
+                          exclude_code=store_code or None)
+    stores = []
+    for distance, store in nearby:
+        location_obj = store_to_location(store, 0)
+        location_obj.pop('relevance_score')
+        location_obj['distance'] = round(distance, 3)  # 直线距离（公里）
+        stores.append(location_obj)
+    
+    return jsonify({
+        'success': True,
+        'origin': {
+            'store_code': store_code,
+            'name': origin_store['name'] if origin_store else '',
+            'location': f"{longitude},{latitude}"
+        },
+        'stores': stores
+    })
+
 @app.route('/api/my_timesheet', methods=['GET'])
 def api_get_my_timesheet():
-    """获取当前用户的工时记录"""
+    """
+    获取当前用户的工时记录
+    month=YYYY-MM 或 start_date/end_date 限定日期范围；按 (work_date, created_at, id) 升序游标分页，
+    page_size 指定每页条数，cursor 传上一页返回的 next_cursor
+    """
     if 'user_id' not in session:
         return jsonify({'success': False, 'message': '未登录'})
     
     try:
+        month = request.args.get('month')
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+        if month:
+            try:
+                start_date, end_date = month_range(month)
+            except ValueError:
+                return jsonify({'success': False, 'message': '月份格式应为YYYY-MM'}), 400
+        page_size = validate_and_clean_input(request.args, 'page_size', int, MAX_PAGE_SIZE,
+                                             min_value=1, max_value=MAX_PAGE_SIZE)
+        cursor_token = request.args.get('cursor')
+        cursor = decode_page_cursor(cursor_token, 3)
+        if cursor_token and cursor is None:
+            return jsonify({'success': False, 'message': '分页参数无效'}), 400
+        
+        query = my_timesheet_page_sql(bool(start_date), bool(end_date), cursor is not None)
+        params = [session['user_id']]
+        if start_date:
+            params.append(start_date)
+        if end_date:
+            params.append(end_date)
+        if cursor is not None:
+            work_date, created_at, record_id = cursor
+            params += [work_date, work_date, created_at, created_at, record_id]
+        params.append(page_size + 1)
+        
         with get_db_connection() as db:
-            records = db.execute('''
-                SELECT * FROM timesheet_records 
-                WHERE user_id = ? 
-                ORDER BY work_date ASC, created_at ASC
-            ''', (session['user_id'],)).fetchall()
+            records = db.execute(query, tuple(params)).fetchall()
         
-        records_list = []
-        for record in records:
-            record_dict = dict(record)
-            records_list.append(record_dict)
+        has_more = len(records) > page_size
+        records_list = [dict(zip(MY_TIMESHEET_COLUMNS, tuple(record))) for record in records[:page_size]]
+        next_cursor = None
+        if has_more:
+            last = records[page_size - 1]
+            next_cursor = encode_page_cursor((last['work_date'], last['cursor_created_at'], last['id']))
         
         return jsonify({
             'success': True,
-            'records': records_list
+            'records': records_list,
+            'start_date': start_date,
+            'end_date': end_date,
+            'has_more': has_more,
+            'next_cursor': next_cursor
         })
     except Exception as e:
         print(f"获取工时记录失败: {e}")
         return jsonify({'success': False, 'message': str(e)})
 
+@app.route('/api/my_timesheet/summary', methods=['GET'])
+def api_my_timesheet_summary():
+    """当前用户按月汇总的记录数和工时（用于记录页的月份选择）"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': '未登录'})
+    
+    try:
+        with get_db_connection() as db:
+            months = fetch_monthly_totals(db, session['user_id'])
+        
+        result = [{
+            'month': month,
+            'record_count': totals['record_count'],
+            'work_days': totals['work_days'],
+            'total_hours': round(totals['total_hours'], 2),
+            'total_distance': round(totals['total_distance'], 1)
+        } for month, totals in sorted(months.items(), reverse=True)]
+        
+        return jsonify({'success': True, 'months': result})
+    except Exception as e:
+        logger.error(f"获取月度汇总失败: {e}")
+        return jsonify({'success': False, 'message': '获取月度汇总失败'})
+
+@app.route('/api/my_stats', methods=['GET'])
+def api_my_stats():
+    """
+    月度统计API：month=YYYY-MM（默认本月）
+    管理员/组长可传 user_id 查看专员的统计（组长仅限本部门）
+    """
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': '未登录'})
+    
+    month = request.args.get('month') or datetime.now().strftime('%Y-%m')
+    try:
+        month_range(month)
+    except ValueError:
+        return jsonify({'success': False, 'message': '月份格式应为YYYY-MM'}), 400
+    target_user_id = session['user_id']
+    requested_user_id = validate_and_clean_input(request.args, 'user_id', int, None)
+    
+    try:
+        with get_db_connection() as db:
+            if requested_user_id and requested_user_id != session['user_id']:
+                if session.get('role') not in ['admin', 'manager']:
+                    return jsonify({'success': False, 'message': '权限不足'}), 403
+                target = db.execute('SELECT department FROM users WHERE id = ?',
+                                    (requested_user_id,)).fetchone()
+                if not target:
+                    return jsonify({'success': False, 'message': '用户不存在'}), 404
+                department_filter = get_department_filter()
+                if department_filter and target['department'] != department_filter:
+                    return jsonify({'success': False, 'message': '权限不足'}), 403
+                target_user_id = requested_user_id
+            
+            stats = get_monthly_statistics(db, target_user_id, month)
+    except Exception as e:
+        logger.error(f"获取月度统计失败: {e}")
+        return jsonify({'success': False, 'message': '获取月度统计失败'})
+    
+    stats['user_id'] = target_user_id
+    return jsonify({'success': True, 'stats': stats})
+
+# 新建工时记录写入的字段（顺序与 timesheet_record_from_payload 返回的字典一致）
+TIMESHEET_INSERT_COLUMNS = [
+    'user_id', 'work_date', 'business_trip_days', 'actual_visit_days',
+    'audit_store_count', 'training_store_count', 'start_location', 'end_location',
+    'round_trip_distance', 'transport_mode', 'schedule_number',
+    'travel_hours', 'visit_hours', 'report_hours', 'total_work_hours',
+    'notes', 'store_code', 'city'
+]
+TIMESHEET_INSERT_SQL = f'''
+    INSERT INTO timesheet_records ({', '.join(TIMESHEET_INSERT_COLUMNS)})
+    VALUES ({', '.join('?' for _ in TIMESHEET_INSERT_COLUMNS)})
+'''
+
+# 批量录入单次最多记录数
+TIMESHEET_BATCH_MAX = 100
+
+# 批量录入时逐项校验的数值字段（均不得为负数）
+TIMESHEET_NON_NEGATIVE_FIELDS = [
+    ('travel_hours', '路途工时'),
+    ('visit_hours', '巡店工时'),
+    ('report_hours', '报告工时'),
+    ('round_trip_distance', '往返距离'),
+]
+
+def timesheet_record_from_payload(data, user_id):
+    """把前端提交的工时数据转换为记录字段字典（路途工时按交通方式调整，合计工时重新计算）"""
+    # 安全转换数值，处理空字符串
+    def safe_float(value, default=0):
+        if value is None or value == '' or value == 'undefined':
+            return default
+        try:
+            return float(value)
+        except (ValueError, TypeError):
+            return default
+    
+    def safe_int(value, default=0):
+        if value is None or value == '' or value == 'undefined':
+            return default
+        try:
+            return int(value)
+        except (ValueError, TypeError):
+            return default
+    
+    # 计算总工时
+    travel_hours = safe_float(data.get('travelHours', 0))
+    transport_mode = data.get('transportMode', 'driving')
+    
+    # 根据交通方式调整路途工时
+    if transport_mode == 'train':
+        # 高铁：在用户输入基础上增加1小时
+        travel_hours = travel_hours + 1
+    elif transport_mode == 'airplane':
+        # 飞机：在用户输入基础上增加2小时
+        travel_hours = travel_hours + 2
+    
+    visit_hours = safe_float(data.get('visitHours', 0))
+    report_hours = safe_float(data.get('reportHours', 0))
+    
+    return {
+        'user_id': user_id,
+        'work_date': data.get('workDate'),
+        'business_trip_days': safe_int(data.get('businessTripDays', 1), 1),
+        'actual_visit_days': safe_int(data.get('actualVisitDays', 1), 1),
+        'audit_store_count': 1,  # audit_store_count 默认设为1
+        'training_store_count': 0,  # training_store_count 设为0
+        'start_location': data.get('startStore', ''),
+        'end_location': data.get('endStore', ''),
+        'round_trip_distance': safe_float(data.get('roundTripDistance', 0)),
+        'transport_mode': transport_mode,
+        'schedule_number': data.get('scheduleNumber', ''),
+        'travel_hours': travel_hours,
+        'visit_hours': visit_hours,
+        'report_hours': report_hours,
+        'total_work_hours': travel_hours + visit_hours + report_hours,
+        'notes': data.get('notes', ''),
+        'store_code': data.get('storeCode', ''),
+        'city': data.get('city', '')
+    }
+
 @app.route('/api/my_timesheet', methods=['POST'])
 def api_create_timesheet():
     """创建工时记录"""
@@ -5773,70 +6354,11 @@ def api_create_timesheet():
         return jsonify({'success': False, 'message': '未登录'})
     
     try:
-        data = request.get_json()
-        
-        # 安全转换数值，处理空字符串
-        def safe_float(value, default=0):
-            if value is None or value == '' or value == 'undefined':
-                return default
-            try:
-                return float(value)
-            except (ValueError, TypeError):
-                return default
-        
-        def safe_int(value, default=0):
-            if value is None or value == '' or value == 'undefined':
-                return default
-            try:
-                return int(value)
-            except (ValueError, TypeError):
-                return default
-        
-        # 计算总工时
-        travel_hours = safe_float(data.get('travelHours', 0))
-        transport_mode = data.get('transportMode', 'driving')
-        
-        # 根据交通方式调整路途工时
-        if transport_mode == 'train':
-            # 高铁：在用户输入基础上增加1小时
-            travel_hours = travel_hours + 1
-        elif transport_mode == 'airplane':
-            # 飞机：在用户输入基础上增加2小时
-            travel_hours = travel_hours + 2
-        
-        visit_hours = safe_float(data.get('visitHours', 0))
-        report_hours = safe_float(data.get('reportHours', 0))
-        total_work_hours = travel_hours + visit_hours + report_hours
+        record = timesheet_record_from_payload(request.get_json(), session['user_id'])
         
         with get_db_connection() as db:
-            db.execute('''
-                INSERT INTO timesheet_records (
-                    user_id, work_date, business_trip_days, actual_visit_days,
-                    audit_store_count, training_store_count, start_location, end_location,
-                    round_trip_distance, transport_mode, schedule_number,
-                    travel_hours, visit_hours, report_hours, total_work_hours,
-                    notes, store_code, city
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                session['user_id'],
-                data.get('workDate'),
-                safe_int(data.get('businessTripDays', 1), 1),
-                safe_int(data.get('actualVisitDays', 1), 1),
-                1,  # audit_store_count 默认设为1
-                0,  # training_store_count 设为0
-                data.get('startStore', ''),
-                data.get('endStore', ''),
-                safe_float(data.get('roundTripDistance', 0)),
-                data.get('transportMode', 'driving'),
-                data.get('scheduleNumber', ''),
-                travel_hours,
-                visit_hours,
-                report_hours,
-                total_work_hours,
-                data.get('notes', ''),
-                data.get('storeCode', ''),
-                data.get('city', '')
-            ))
+            db.execute(TIMESHEET_INSERT_SQL, [record[column] for column in TIMESHEET_INSERT_COLUMNS])
+            apply_to_rollups(db, record)
             
             db.commit()
         
@@ -5845,6 +6367,64 @@ def api_create_timesheet():
         print(f"创建工时记录失败: {e}")
         return jsonify({'success': False, 'message': str(e)})
 
+@app.route('/api/my_timesheet/batch', methods=['POST'])
+def api_create_timesheet_batch():
+    """
+    批量创建工时记录（月底补录）：{"records": [与单条创建相同的字段, ...]}
+    先逐条校验，任一条不合格则全部不写入并返回每条的校验结果，
+    全部合格时在一个事务内 executemany 写入
+    """
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': '未登录'})
+    
+    data = request.get_json(silent=True) or {}
+    items = data.get('records')
+    if not isinstance(items, list) or not items:
+        return jsonify({'success': False, 'message': 'records 必须是非空列表'}), 400
+    if len(items) > TIMESHEET_BATCH_MAX:
+        return jsonify({'success': False, 'message': f'单次最多提交{TIMESHEET_BATCH_MAX}条记录'}), 400
+    
+    records = []
+    results = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results.append({'index': index, 'success': False, 'message': '记录格式错误'})
+            continue
+        try:
+            datetime.strptime(str(item.get('workDate') or ''), '%Y-%m-%d')
+        except ValueError:
+            results.append({'index': index, 'success': False, 'message': '工作日期格式应为YYYY-MM-DD'})
+            continue
+        record = timesheet_record_from_payload(item, session['user_id'])
+        # 逐项检查，不能只看合计（如路途5、巡店-4的合计仍为正）；NaN/inf 也不通过
+        invalid = [label for field, label in TIMESHEET_NON_NEGATIVE_FIELDS
+                   if not 0 <= record[field] < float('inf')]
+        if invalid:
+            results.append({'index': index, 'success': False,
+                            'message': f"{'、'.join(invalid)}不能为负数或无效数值"})
+            continue
+        records.append(record)
+        results.append({'index': index, 'success': True, 'work_date': record['work_date'],
+                        'total_work_hours': round(record['total_work_hours'], 2)})
+    
+    if len(records) != len(items):
+        return jsonify({'success': False, 'message': '部分记录未通过校验，未保存任何记录',
+                        'results': results}), 400
+    
+    try:
+        with get_db_connection() as db:
+            db.executemany(TIMESHEET_INSERT_SQL,
+                           [[record[column] for column in TIMESHEET_INSERT_COLUMNS] for record in records])
+            for record in records:
+                apply_to_rollups(db, record)
+            db.commit()
+    except Exception as e:
+        logger.error(f"批量创建工时记录失败: {e}")
+        return jsonify({'success': False, 'message': '保存失败，未保存任何记录'}), 500
+    
+    return jsonify({'success': True, 'message': f'成功保存{len(records)}条工时记录',
+                    'saved': len(records), 'results': results})
+
 @app.route('/api/my_timesheet/<int:record_id>', methods=['PUT'])
 def api_update_timesheet(record_id):
     """更新工时记录"""
@@ -5879,12 +6459,9 @@ def api_update_timesheet(record_id):
         
         with get_db_connection() as db:
             # 检查记录是否存在且属于当前用户
-            existing_record = db.execute('''
-                SELECT user_id FROM timesheet_records 
-                WHERE id = ? AND user_id = ?
-            ''', (record_id, session['user_id'])).fetchone()
+            existing_record = fetch_rollup_record(db, record_id)
             
-            if not existing_record:
+            if not existing_record or existing_record['user_id'] != session['user_id']:
                 return jsonify({'success': False, 'message': '记录不存在或无权限修改'})
             
             # 更新记录
@@ -5925,6 +6502,9 @@ def api_update_timesheet(record_id):
                 record_id,
                 session['user_id']
             ))
+            # 汇总表先移出旧值再计入新值（日期可能已修改）
+            apply_to_rollups(db, existing_record, -1)
+            apply_to_rollups(db, fetch_rollup_record(db, record_id))
             
             db.commit()
         
@@ -5933,43 +6513,29 @@ def api_update_timesheet(record_id):
         print(f"更新工时记录失败: {e}")
         return jsonify({'success': False, 'message': str(e)})
 
-@app.route('/api/export_timesheet')
-def api_export_timesheet():
-    """导出工时记录为CSV（日期升序排列）"""
-    if 'user_id' not in session:
-        return redirect('/login')
-    
-    try:
-        import io
-        import csv
-        from datetime import datetime
-        
-        # 创建内存中的CSV文件
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # 设置列头
-        headers = [
-            '工作日期', '出差天数', '实际巡店天数', '审核门店数', 
-            '起始门店', '终点门店', '单程距离(km)', '交通方式',
-            '巡途工时(H)', '巡店工时(H)', '汇报工时(H)', '合计工时(H)',
-            '备注', '门店编码', '城市'
-        ]
-        
-        # 写入列头
-        writer.writerow(headers)
-        
-        # 获取用户记录（按日期升序排序，5号在最上方）
-        with get_db_connection() as db:
-            records = db.execute('''
-                SELECT * FROM timesheet_records 
+def build_my_timesheet_export(params):
+    """专员本人工时记录导出（按日期升序，5号在最上方），返回 (文件名, MIME类型, 字节块生成器)"""
+    return (
+        f'工时记录_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv',
+        'text/csv',
+        iter_query_csv(
+            [
+                '工作日期', '出差天数', '实际巡店天数', '审核门店数', 
+                '起始门店', '终点门店', '单程距离(km)', '交通方式',
+                '巡途工时(H)', '巡店工时(H)', '汇报工时(H)', '合计工时(H)',
+                '备注', '门店编码', '城市'
+            ],
+            '''
+                SELECT work_date, business_trip_days, actual_visit_days, audit_store_count,
+                       start_location, end_location, round_trip_distance, transport_mode,
+                       travel_hours, visit_hours, report_hours, total_work_hours,
+                       notes, store_code, city
+                FROM timesheet_records 
                 WHERE user_id = ? 
                 ORDER BY work_date ASC, created_at ASC
-            ''', (session['user_id'],)).fetchall()
-        
-        # 写入数据
-        for record in records:
-            writer.writerow([
+            ''',
+            (params['user_id'],),
+            lambda record: [
                 record['work_date'],
                 record['business_trip_days'],
                 record['actual_visit_days'],
@@ -5985,32 +6551,125 @@ def api_export_timesheet():
                 record['notes'] or '',
                 record['store_code'] or '',
                 record['city'] or ''
-            ])
-        
-        # 转换为字节
-        output.seek(0)
-        csv_data = output.getvalue()
-        output.close()
-        
-        # 生成文件名
-        current_time = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f'工时记录_{current_time}.csv'
-        
-        # 创建字节流
-        csv_bytes = io.BytesIO()
-        csv_bytes.write(csv_data.encode('utf-8-sig'))  # 使用BOM确保Excel正确显示中文
-        csv_bytes.seek(0)
-        
-        return send_file(
-            csv_bytes,
-            mimetype='text/csv',
-            as_attachment=True,
-            download_name=filename
+            ]
         )
-        
+    )
+
+@app.route('/api/export_timesheet')
+def api_export_timesheet():
+    """导出工时记录为CSV（旧地址，改为登记异步导出任务，见 /api/exports）"""
+    if 'user_id' not in session:
+        return redirect('/login')
+    
+    return legacy_export_response('my_timesheet', {'user_id': session['user_id']})
+
+# 异步导出任务：导出类型 -> 文件生成函数
+register_export('admin_records', build_admin_records_export)
+register_export('my_timesheet', build_my_timesheet_export)
+
+ADMIN_EXPORT_FILTERS = ('start_date', 'end_date', 'user_id', 'department', 'format')
+
+def export_job_allowed(job):
+    """当前用户能否查看/下载导出任务（只能访问自己登记的任务）"""
+    if job['kind'] == 'admin_records':
+        return (session.get('role') in ['admin', 'manager']
+                and job['params'].get('requested_by') == session.get('user_id'))
+    return job['params'].get('user_id') == session.get('user_id')
+
+def export_job_json(job):
+    return {
+        'id': job['id'],
+        'status': job['status'],
+        'filename': job['filename'],
+        'file_size': job['file_size'],
+        'error': job['error'],
+        'download_url': f"/api/exports/{job['id']}/download" if job['status'] == 'done' else None
+    }
+
+def admin_export_params(data):
+    """
+    管理端导出参数：只保留筛选条件和format，格式不支持时返回None
+    另外记录登记人和部门经理的部门范围，二者都参与任务去重，不同人的导出不会合并成同一个文件
+    """
+    params = {key: str(data[key]) for key in ADMIN_EXPORT_FILTERS if data.get(key)}
+    if params.get('format', 'csv') not in ('csv', 'xlsx'):
+        return None
+    params['requested_by'] = session['user_id']
+    scope_department = get_department_filter()
+    if scope_department:
+        params['scope_department'] = scope_department
+    return params
+
+def legacy_export_response(kind, params):
+    """
+    旧的同步导出地址：登记异步导出任务，导出不在请求worker中执行
+    已有可复用的完成文件时直接跳转下载，否则返回任务信息（202），由前端轮询 /api/exports/<id>
+    """
+    try:
+        job = enqueue_export(kind, params, owner_id=session['user_id'])
     except Exception as e:
-        print(f"导出工时记录失败: {e}")
-        return f"导出失败: {str(e)}", 500
+        logger.error(f"登记导出任务失败: {e}")
+        return jsonify({'success': False, 'message': '服务器错误'}), 500
+    if job['status'] == 'done':
+        return redirect(export_job_json(job)['download_url'])
+    return jsonify({'success': True, 'message': '导出任务已登记，请稍后查询任务状态并下载',
+                    'job': export_job_json(job),
+                    'status_url': f"/api/exports/{job['id']}"}), 202
+
+@app.route('/api/exports', methods=['POST'])
+def api_create_export():
+    """
+    登记异步导出任务：kind=admin_records（管理端，可带筛选条件和format）或 my_timesheet（本人记录）
+    返回任务ID，前端轮询 /api/exports/<id>，完成后下载
+    """
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': '未登录'}), 401
+    
+    data = request.get_json(silent=True) or {}
+    kind = data.get('kind')
+    if kind == 'admin_records':
+        if session.get('role') not in ['admin', 'manager']:
+            return jsonify({'success': False, 'message': '权限不足'}), 403
+        params = admin_export_params(data)
+        if params is None:
+            return jsonify({'success': False, 'message': '导出格式只支持csv或xlsx'}), 400
+    elif kind == 'my_timesheet':
+        params = {'user_id': session['user_id']}
+    else:
+        return jsonify({'success': False, 'message': '未知的导出类型'}), 400
+    
+    try:
+        job = enqueue_export(kind, params, owner_id=session['user_id'])
+    except Exception as e:
+        logger.error(f"登记导出任务失败: {e}")
+        return jsonify({'success': False, 'message': '服务器错误'}), 500
+    return jsonify({'success': True, 'job': export_job_json(job)})
+
+@app.route('/api/exports/<job_id>')
+def api_export_status(job_id):
+    """查询导出任务状态"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': '未登录'}), 401
+    
+    job = get_export_job(job_id)
+    if not job or not export_job_allowed(job):
+        return jsonify({'success': False, 'message': '导出任务不存在'}), 404
+    return jsonify({'success': True, 'job': export_job_json(job)})
+
+@app.route('/api/exports/<job_id>/download')
+def api_export_download(job_id):
+    """下载已完成的导出文件"""
+    if 'user_id' not in session:
+        return redirect('/login')
+    
+    job = get_export_job(job_id)
+    if not job or not export_job_allowed(job):
+        return jsonify({'success': False, 'message': '导出任务不存在'}), 404
+    path = export_job_path(job)
+    if job['status'] != 'done' or not os.path.exists(path):
+        return jsonify({'success': False, 'message': '导出文件不存在或已过期'}), 404
+    return send_file(os.path.abspath(path), mimetype=job['mimetype'], as_attachment=True,
+                     download_name=job['filename'])
 
 @app.route('/api/my_timesheet/<int:record_id>', methods=['DELETE'])
 def api_delete_timesheet(record_id):
@@ -6021,10 +6680,7 @@ def api_delete_timesheet(record_id):
     try:
         with get_db_connection() as db:
             # 检查记录是否属于当前用户
-            record = db.execute(
-                'SELECT user_id FROM timesheet_records WHERE id = ?',
-                (record_id,)
-            ).fetchone()
+            record = fetch_rollup_record(db, record_id)
             
             if not record:
                 return jsonify({'success': False, 'message': '记录不存在'})
@@ -6033,6 +6689,7 @@ def api_delete_timesheet(record_id):
                 return jsonify({'success': False, 'message': '无权限删除此记录'})
             
             db.execute('DELETE FROM timesheet_records WHERE id = ?', (record_id,))
+            apply_to_rollups(db, record, -1)
             db.commit()
         
         return jsonify({'success': True, 'message': '记录删除成功'})
@@ -6116,19 +6773,67 @@ def api_save_monthly_defaults():
 def api_tencent_usage_stats():
     """获取腾讯地图API使用统计"""
     usage_today = get_tencent_usage_today()
-    cache_size = len(tencent_search_cache)
+    cache_size = tencent_search_cache.size()
     
     return jsonify({
         'success': True,
         'today_usage': usage_today,
-        'daily_limit': 200,
-        'remaining': max(0, 200 - usage_today),
+        'daily_limit': TENCENT_DAILY_LIMIT,
+        'daytime_limit': TENCENT_DAYTIME_LIMIT,
+        'remaining': max(0, TENCENT_DAILY_LIMIT - usage_today),
         'cache_size': cache_size,
-        'cache_limit': 100,
-        'usage_percentage': round((usage_today / 200) * 100, 1),
-        'date': tencent_daily_usage['date']
+        'cache_limit': tencent_search_cache.maxsize,
+        'usage_percentage': round((usage_today / TENCENT_DAILY_LIMIT) * 100, 1),
+        'date': tencent_quota.today(),
+        'cache_stats': {
+            'tencent_search': tencent_search_cache.stats(),
+            'amap_search': amap_search_cache.stats(),
+            'route': route_cache.stats()
+        }
+    })
+
+@app.route('/api/admin/api_metrics')
+def api_admin_api_metrics():
+    """地图API请求延迟统计（按主机，当前worker）"""
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return jsonify({'success': False, 'message': '权限不足'}), 403
+    
+    return jsonify({
+        'success': True,
+        'worker_pid': os.getpid(),
+        'hosts': http_client.metrics()
     })
 
+@app.route('/api/admin/db_pool_stats')
+def api_admin_db_pool_stats():
+    """数据库连接池使用统计（当前worker）"""
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return jsonify({'success': False, 'message': '权限不足'}), 403
+    
+    return jsonify({
+        'success': True,
+        'worker_pid': os.getpid(),
+        'pool': get_pool_stats()
+    })
+
+@app.route('/api/admin/refresh_store_index', methods=['POST'])
+def api_refresh_store_index():
+    """重新加载本地门店索引（门店主数据更新后调用）"""
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return jsonify({'success': False, 'message': '权限不足'}), 403
+
+    try:
+        index = refresh_store_index()
+        return jsonify({
+            'success': True,
+            'message': f'门店索引已刷新，共 {len(index)} 家门店',
+            'store_count': len(index),
+            'source': index.source
+        })
+    except Exception as e:
+        logger.error(f"刷新门店索引失败: {e}")
+        return jsonify({'success': False, 'message': '刷新门店索引失败'}), 500
+
 if __name__ == '__main__':
     # 初始化数据库
     try:
@@ -6224,6 +6929,8 @@ def update_user_department():
             
             # 更新用户部门
             db.execute('UPDATE users SET department = ? WHERE id = ?', (new_department, user_id))
+            # 部门月度汇总按新的部门归属重新生成
+            rebuild_department_rollups(db)
             db.commit()
             
             return jsonify({'success': True, 'message': '用户部门更新成功'})
@@ -6247,6 +6954,7 @@ def batch_update_roles():
             return jsonify({'success': False, 'message': '没有要更新的数据'}), 400
         
         with get_db_connection() as db:
+            department_changed = False
             for update in updates:
                 user_id = update.get('user_id')
                 new_role = update.get('role')
@@ -6267,9 +6975,12 @@ def batch_update_roles():
                 if new_department:
                     db.execute('UPDATE users SET role = ?, department = ? WHERE id = ?', 
                              (new_role, new_department, user_id))
+                    department_changed = True
                 else:
                     db.execute('UPDATE users SET role = ? WHERE id = ?', (new_role, user_id))
             
+            if department_changed:
+                rebuild_department_rollups(db)
             db.commit()
             return jsonify({'success': True, 'message': f'批量更新{len(updates)}个用户权限成功'})
             
@@ -6318,6 +7029,46 @@ def get_department_stats():
         logger.error(f"获取部门统计失败: {e}")
         return jsonify({'success': False, 'message': f'获取数据失败: {str(e)}'}), 500
 
+@app.route('/api/admin/import_timesheet', methods=['POST'])
+def admin_import_timesheet():
+    """
+    导入工时记录（仅管理员）：上传CSV/XLSX文件（file），列与工时记录导出一致并包含专员姓名列
+    dry_run=1 时只校验不写入；返回导入数和拒绝原因
+    """
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return jsonify({'success': False, 'message': '只有管理员可以导入工时记录'}), 403
+    
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        return jsonify({'success': False, 'message': '请选择要导入的文件'}), 400
+    extension = os.path.splitext(upload.filename)[1].lower()
+    if extension not in ('.csv', '.xlsx'):
+        return jsonify({'success': False, 'message': '只支持CSV或XLSX文件'}), 400
+    dry_run = request.form.get('dry_run') in ('1', 'true')
+    
+    # 上传内容先落盘，再由导入模块流式读取
+    fd, path = tempfile.mkstemp(suffix=extension)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            upload.save(f)
+        stats = import_timesheet(path, dry_run=dry_run)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        logger.error(f"导入工时记录失败: {e}")
+        return jsonify({'success': False, 'message': '导入失败，未写入任何记录'}), 500
+    finally:
+        os.remove(path)
+    
+    if not dry_run and stats['imported']:
+        admin_overview_cache.clear()
+    return jsonify({
+        'success': True,
+        'message': f"{'校验' if dry_run else '导入'}完成：{stats['imported']}条{'可导入' if dry_run else '已导入'}，"
+                   f"{stats['rejected']}条被拒绝",
+        **stats
+    })
+
 # 临时数据清理端点（仅用于测试）
 @app.route('/api/admin/clear_test_data', methods=['POST'])
 def clear_test_data():
@@ -6329,6 +7080,7 @@ def clear_test_data():
         with get_db_connection() as db:
             # 删除所有工时记录
             db.execute('DELETE FROM timesheet_records')
+            clear_rollups(db)
             # 删除月度默认设置
             db.execute('DELETE FROM user_monthly_defaults WHERE user_id != 2')  # 保留admin的设置
             db.commit()
@@ -9,6 +9,7 @@ import sys
 sys.path.append('.')
 
 from database_config import get_db_connection
+from rollups import clear_rollups
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -20,6 +21,7 @@ def clear_timesheet_records():
         with get_db_connection() as db:
             # 删除所有工时记录
             db.execute('DELETE FROM timesheet_records')
+            clear_rollups(db)
             
             # 删除月度默认设置
             db.execute('DELETE FROM user_monthly_defaults')
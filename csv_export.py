@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+CSV流式导出
+按批读取查询结果，逐批编码为CSV字节块返回，导出全年全部门的数据时内存占用也保持不变，
+表头在查询数据前先输出，下载立即开始
+"""
+
+import io
+import os
+import csv
+import codecs
+import logging
+from urllib.parse import quote
+
+from flask import Response
+
+from database_config import get_db_connection
+from db_adapter import iter_batches
+
+logger = logging.getLogger(__name__)
+
+# 每批读取的记录数
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 1000))
+
+# UTF-8 BOM，确保Excel正确显示中文
+BOM = codecs.BOM_UTF8
+
+
+def attachment_headers(filename):
+    """下载文件名（支持中文，RFC 5987）"""
+    ascii_name = filename.encode('ascii', 'ignore').decode() or 'export.csv'
+    return {
+        'Content-Disposition': f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(filename)}",
+        'Cache-Control': 'no-store',
+    }
+
+
+def iter_csv(header, batches, row_builder):
+    """
+    生成CSV字节块：BOM和表头一块，之后每批记录一块
+    batches 产出行列表，row_builder 把一行记录转换为CSV字段列表
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        chunk = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+        return chunk
+
+    writer.writerow(header)
+    yield BOM + flush()
+    for rows in batches:
+        writer.writerows(row_builder(row) for row in rows)
+        yield flush()
+
+
+def iter_query_csv(header, sql, params, row_builder, batch_size=None):
+    """
+    按批读取查询结果并生成CSV字节块
+    数据库连接在生成第一块时才获取，生成结束时归还
+    """
+    batch_size = batch_size or EXPORT_BATCH_SIZE
+    with get_db_connection() as db:
+        yield from iter_csv(header, iter_batches(db, sql, params, batch_size), row_builder)
+
+
+def stream_response(filename, mimetype, chunks):
+    """把字节块生成器作为下载响应流式返回"""
+    def generate():
+        try:
+            yield from chunks
+        except Exception as e:
+            # 响应头已发出，只能记录日志并中止输出
+            logger.error(f"导出中断 {filename}: {e}")
+            raise
+
+    return Response(generate(), mimetype=mimetype, headers=attachment_headers(filename))
+
+
+def stream_query_csv(filename, header, sql, params, row_builder, batch_size=None):
+    """把查询结果以CSV流式返回"""
+    return stream_response(filename, 'text/csv', iter_query_csv(header, sql, params, row_builder, batch_size))
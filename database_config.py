@@ -2,197 +2,396 @@
 """
 数据库配置模块 - 支持SQLite和PostgreSQL
 根据环境变量自动选择数据库类型
+连接按worker复用：PostgreSQL使用线程安全连接池，SQLite每个线程复用一个连接
 """
 
 import os
+import time
 import sqlite3
+import threading
 from contextlib import contextmanager
 import logging
 
 try:
     import psycopg2
+    import psycopg2.pool
     PSYCOPG2_AVAILABLE = True
 except ImportError:
     PSYCOPG2_AVAILABLE = False
     psycopg2 = None
 
+from db_adapter import PostgresAdapter, register_text_types
+
 logger = logging.getLogger(__name__)
 
 # 数据库类型检测
 DATABASE_URL = os.environ.get('DATABASE_URL', '')
 USE_POSTGRESQL = (DATABASE_URL.startswith('postgres://') or DATABASE_URL.startswith('postgresql://')) and PSYCOPG2_AVAILABLE
 
+SQLITE_PATH = 'timesheet.db'
+
+# 连接池配置
+DB_POOL_MIN = int(os.environ.get('DB_POOL_MIN', 1))
+DB_POOL_MAX = int(os.environ.get('DB_POOL_MAX', 10))
+DB_CONN_MAX_LIFETIME = float(os.environ.get('DB_CONN_MAX_LIFETIME', 1800))   # 连接最长使用时间（秒），超过后重建
+DB_HEALTH_CHECK_IDLE = float(os.environ.get('DB_HEALTH_CHECK_IDLE', 30))     # 空闲超过该秒数的连接取出时先检查
+
+
+class PoolStats:
+    """连接复用统计"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {
+            'created': 0,
+            'reused': 0,
+            'recycled': 0,
+            'health_check_failures': 0,
+            'waits': 0,
+            'checkouts': 0,
+        }
+        self.in_use = 0
+        self.max_in_use = 0
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def checkout(self):
+        with self._lock:
+            self.counters['checkouts'] += 1
+            self.in_use += 1
+            self.max_in_use = max(self.max_in_use, self.in_use)
+
+    def checkin(self):
+        with self._lock:
+            self.in_use -= 1
+
+    def snapshot(self):
+        with self._lock:
+            data = dict(self.counters)
+            data['in_use'] = self.in_use
+            data['max_in_use'] = self.max_in_use
+        return data
+
+
+class NestedSQLiteConnection:
+    """
+    同一线程内嵌套取出的SQLite连接：内层的工作放在SAVEPOINT中
+    commit() 只释放保存点（并入外层事务，外层没有未提交的修改时即真正提交），
+    rollback() 只回滚到保存点，不会提交或丢弃外层未完成的事务
+    """
+
+    def __init__(self, conn, name):
+        self._conn = conn
+        self._name = name
+        self._open = False
+        self._begin()
+
+    def _begin(self):
+        self._conn.execute(f'SAVEPOINT {self._name}')
+        self._open = True
+
+    def commit(self):
+        if self._open:
+            self._conn.execute(f'RELEASE SAVEPOINT {self._name}')
+            self._open = False
+        self._begin()
+
+    def rollback(self):
+        if self._open:
+            self._conn.execute(f'ROLLBACK TO SAVEPOINT {self._name}')
+
+    def close_savepoint(self):
+        """内层退出：未提交的修改回滚到保存点后释放"""
+        if self._open:
+            self._conn.execute(f'ROLLBACK TO SAVEPOINT {self._name}')
+            self._conn.execute(f'RELEASE SAVEPOINT {self._name}')
+            self._open = False
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class SQLiteConnectionManager:
+    """
+    SQLite连接管理：每个线程复用一个连接，PRAGMA只在建立连接时执行一次
+    同一线程内嵌套使用时共享同一连接，但内层在SAVEPOINT中执行（见 NestedSQLiteConnection），
+    最外层退出时回滚未提交的事务
+    """
+
+    def __init__(self, path=SQLITE_PATH, max_lifetime=DB_CONN_MAX_LIFETIME):
+        self.path = path
+        self.max_lifetime = max_lifetime
+        self.stats = PoolStats()
+        self._local = threading.local()
+
+    def _connect(self, timeout):
+        conn = sqlite3.connect(self.path, timeout=timeout)
+        conn.row_factory = sqlite3.Row
+        # 设置WAL模式提高并发性能
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA cache_size=10000')
+        conn.execute('PRAGMA temp_store=memory')
+        self.stats.incr('created')
+        return conn
+
+    def _is_usable(self, conn, created_at, last_used):
+        now = time.time()
+        if now - created_at > self.max_lifetime:
+            self.stats.incr('recycled')
+            return False
+        if now - last_used > DB_HEALTH_CHECK_IDLE:
+            try:
+                conn.execute('SELECT 1').fetchone()
+            except sqlite3.Error:
+                self.stats.incr('health_check_failures')
+                return False
+        return True
+
+    def _discard(self):
+        conn = getattr(self._local, 'conn', None)
+        self._local.conn = None
+        if conn is not None:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+    def acquire(self, timeout):
+        local = self._local
+        if getattr(local, 'depth', 0) > 0:
+            local.depth += 1
+            return NestedSQLiteConnection(local.conn, f'nested_{local.depth}')
+
+        conn = getattr(local, 'conn', None)
+        if conn is not None and (local.pid != os.getpid()
+                                 or not self._is_usable(conn, local.created_at, local.last_used)):
+            self._discard()
+            conn = None
+
+        if conn is None:
+            conn = self._connect(timeout)
+            local.conn = conn
+            local.pid = os.getpid()
+            local.created_at = time.time()
+            local.timeout = timeout
+        else:
+            if timeout != local.timeout:
+                conn.execute(f'PRAGMA busy_timeout = {int(timeout * 1000)}')
+                local.timeout = timeout
+            self.stats.incr('reused')
+        local.depth = 1
+        self.stats.checkout()
+        return conn
+
+    def release(self, conn, broken=False):
+        local = self._local
+        local.depth -= 1
+        if local.depth > 0:
+            if not broken:
+                try:
+                    conn.close_savepoint()
+                except sqlite3.Error as e:
+                    logger.error(f"释放嵌套连接保存点失败: {e}")
+            return
+        self.stats.checkin()
+        local.last_used = time.time()
+        if broken:
+            self._discard()
+            return
+        try:
+            # 与关闭连接的行为保持一致：未提交的修改不保留
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard()
+
+    def close(self):
+        self._discard()
+
+    def pool_stats(self):
+        data = self.stats.snapshot()
+        data.update({'backend': 'sqlite', 'path': self.path, 'max_lifetime': self.max_lifetime})
+        return data
+
+
+class PostgresConnectionPool:
+    """
+    PostgreSQL连接池：基于psycopg2 ThreadedConnectionPool
+    连接用满时等待归还；取出时检查存活和最长使用时间；fork后的子进程自动重建连接池
+    """
+
+    def __init__(self, dsn=DATABASE_URL, minconn=DB_POOL_MIN, maxconn=DB_POOL_MAX,
+                 max_lifetime=DB_CONN_MAX_LIFETIME):
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.max_lifetime = max_lifetime
+        self.stats = PoolStats()
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pid = None
+        self._slots = None
+        self._created_at = {}
+        self._last_used = {}
+
+    def _get_pool(self):
+        if self._pool is None or self._pid != os.getpid():
+            with self._lock:
+                if self._pool is None or self._pid != os.getpid():
+                    # 父进程的连接不能在子进程中使用，直接丢弃旧连接池
+                    self._pool = psycopg2.pool.ThreadedConnectionPool(self.minconn, self.maxconn, self.dsn)
+                    self._pid = os.getpid()
+                    self._slots = threading.BoundedSemaphore(self.maxconn)
+                    self._created_at = {}
+                    self._last_used = {}
+        return self._pool
+
+    def _check(self, conn):
+        """检查取出的连接是否可用，不可用返回False"""
+        key = id(conn)
+        now = time.time()
+        created_at = self._created_at.get(key)
+        if created_at is None:
+            register_text_types(conn)
+            self._created_at[key] = now
+            self.stats.incr('created')
+            return True
+        if conn.closed or now - created_at > self.max_lifetime:
+            self.stats.incr('recycled')
+            return False
+        if now - self._last_used.get(key, now) > DB_HEALTH_CHECK_IDLE:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                conn.rollback()
+            except psycopg2.Error:
+                self.stats.incr('health_check_failures')
+                return False
+        self.stats.incr('reused')
+        return True
+
+    def _discard(self, pool, conn):
+        self._created_at.pop(id(conn), None)
+        self._last_used.pop(id(conn), None)
+        try:
+            pool.putconn(conn, close=True)
+        except Exception:
+            pass
+
+    def acquire(self, timeout):
+        pool = self._get_pool()
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            self.stats.incr('waits')
+            if not slots.acquire(timeout=timeout):
+                raise psycopg2.pool.PoolError(f'等待数据库连接超时（{timeout}秒，连接池上限{self.maxconn}）')
+        try:
+            for _ in range(self.maxconn + 1):
+                conn = pool.getconn()
+                if self._check(conn):
+                    conn.autocommit = False
+                    self.stats.checkout()
+                    return conn
+                self._discard(pool, conn)
+            raise psycopg2.pool.PoolError('无法获取可用的数据库连接')
+        except Exception:
+            slots.release()
+            raise
+
+    def release(self, conn, broken=False):
+        pool = self._pool
+        self.stats.checkin()
+        try:
+            if not broken and not conn.closed:
+                # 与关闭连接的行为保持一致：未提交的修改不保留
+                conn.rollback()
+        except psycopg2.Error:
+            broken = True
+        try:
+            if broken or conn.closed:
+                self._discard(pool, conn)
+            else:
+                self._last_used[id(conn)] = time.time()
+                pool.putconn(conn)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+
+    def pool_stats(self):
+        data = self.stats.snapshot()
+        pool = self._pool
+        data.update({
+            'backend': 'postgresql',
+            'min_size': self.minconn,
+            'max_size': self.maxconn,
+            'idle': len(getattr(pool, '_pool', [])) if pool else 0,
+            'max_lifetime': self.max_lifetime,
+        })
+        return data
+
+
+_connection_manager = None
+_connection_manager_lock = threading.Lock()
+
+
+def get_connection_manager():
+    """当前进程的连接管理器（按数据库类型创建）"""
+    global _connection_manager
+    if _connection_manager is None:
+        with _connection_manager_lock:
+            if _connection_manager is None:
+                if USE_POSTGRESQL and PSYCOPG2_AVAILABLE:
+                    _connection_manager = PostgresConnectionPool()
+                else:
+                    _connection_manager = SQLiteConnectionManager()
+    return _connection_manager
+
+
+def get_pool_stats():
+    """连接池使用统计"""
+    return get_connection_manager().pool_stats()
+
+
+def close_db_connections():
+    """关闭当前进程（SQLite为当前线程）持有的连接"""
+    if _connection_manager is not None:
+        _connection_manager.close()
+
+
 @contextmanager
 def get_db_connection(timeout=30):
     """
     数据库连接上下文管理器
-    自动检测并使用SQLite或PostgreSQL
+    自动检测并使用SQLite或PostgreSQL，连接从连接池取出、退出时归还
+    PostgreSQL连接经过方言适配，调用方式与sqlite3相同（? 占位符、row['col']）
     """
-    conn = None
+    manager = get_connection_manager()
+    conn = manager.acquire(timeout)
+    broken = False
     try:
-        if USE_POSTGRESQL and PSYCOPG2_AVAILABLE:
-            # PostgreSQL连接
-            conn = psycopg2.connect(DATABASE_URL)
-            conn.autocommit = False
-            yield conn
-        else:
-            # SQLite连接（默认）
-            conn = sqlite3.connect('timesheet.db', timeout=timeout)
-            conn.row_factory = sqlite3.Row
-            # 设置WAL模式提高并发性能
-            conn.execute('PRAGMA journal_mode=WAL')
-            conn.execute('PRAGMA synchronous=NORMAL')
-            conn.execute('PRAGMA cache_size=10000')
-            conn.execute('PRAGMA temp_store=memory')
-            yield conn
-            
+        yield PostgresAdapter(conn) if isinstance(manager, PostgresConnectionPool) else conn
     except Exception as e:
         logger.error(f"数据库错误: {e}")
-        if conn:
+        try:
             conn.rollback()
+        except Exception:
+            broken = True
         raise
     finally:
-        if conn:
-            conn.close()
+        manager.release(conn, broken)
 
 def init_database():
-    """初始化数据库表结构"""
-    
-    if USE_POSTGRESQL and PSYCOPG2_AVAILABLE:
-        init_postgresql()
-    else:
-        init_sqlite()
-
-def init_postgresql():
-    """初始化PostgreSQL数据库"""
-    
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        
-        # 创建用户表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id SERIAL PRIMARY KEY,
-                username VARCHAR(255) UNIQUE NOT NULL,
-                password VARCHAR(255) NOT NULL,
-                name VARCHAR(255) NOT NULL,
-                role VARCHAR(50) NOT NULL DEFAULT 'specialist',
-                department VARCHAR(255),
-                phone VARCHAR(20) DEFAULT '',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # 创建工时记录表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS timesheet_records (
-                id SERIAL PRIMARY KEY,
-                user_id INTEGER NOT NULL,
-                work_date DATE NOT NULL,
-                business_trip_days INTEGER DEFAULT 1,
-                actual_visit_days INTEGER DEFAULT 1,
-                audit_store_count INTEGER NOT NULL,
-                training_store_count INTEGER DEFAULT 0,
-                start_location TEXT,
-                end_location TEXT,
-                round_trip_distance REAL DEFAULT 0,
-                transport_mode VARCHAR(50) DEFAULT 'driving',
-                schedule_number VARCHAR(255),
-                travel_hours REAL DEFAULT 0,
-                visit_hours REAL DEFAULT 0.92,
-                report_hours REAL DEFAULT 0.13,
-                total_work_hours REAL DEFAULT 0,
-                notes TEXT,
-                store_code VARCHAR(255),
-                city VARCHAR(255),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        ''')
-        
-        # 检查并添加新字段（兼容现有数据库）
-        try:
-            # 检查users表是否有phone字段
-            cursor.execute("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name='users' AND column_name='phone'
-            """)
-            if not cursor.fetchone():
-                cursor.execute('ALTER TABLE users ADD COLUMN phone VARCHAR(20) DEFAULT \'\'')
-                logger.info("PostgreSQL: 添加用户表phone字段")
-            
-            # 检查timesheet_records表是否有store_code和city字段
-            cursor.execute("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name='timesheet_records' AND column_name='store_code'
-            """)
-            if not cursor.fetchone():
-                cursor.execute('ALTER TABLE timesheet_records ADD COLUMN store_code VARCHAR(255)')
-                logger.info("PostgreSQL: 添加store_code字段")
-                
-            cursor.execute("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name='timesheet_records' AND column_name='city'
-            """)
-            if not cursor.fetchone():
-                cursor.execute('ALTER TABLE timesheet_records ADD COLUMN city VARCHAR(255)')
-                logger.info("PostgreSQL: 添加city字段")
-                
-        except Exception as e:
-            logger.error(f"PostgreSQL添加新字段时出错: {e}")
-        
-        conn.commit()
-        logger.info("PostgreSQL数据库初始化完成")
-
-def init_sqlite():
-    """初始化SQLite数据库"""
-    
-    with get_db_connection() as db:
-        # 创建用户表
-        db.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password TEXT NOT NULL,
-                name TEXT NOT NULL,
-                role TEXT NOT NULL DEFAULT 'specialist',
-                department TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # 创建工时记录表
-        db.execute('''
-            CREATE TABLE IF NOT EXISTS timesheet_records (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                work_date DATE NOT NULL,
-                business_trip_days INTEGER DEFAULT 1,
-                actual_visit_days INTEGER DEFAULT 1,
-                audit_store_count INTEGER NOT NULL,
-                training_store_count INTEGER DEFAULT 0,
-                start_location TEXT,
-                end_location TEXT,
-                round_trip_distance REAL DEFAULT 0,
-                transport_mode TEXT DEFAULT 'driving',
-                schedule_number TEXT,
-                travel_hours REAL DEFAULT 0,
-                visit_hours REAL DEFAULT 0.92,
-                report_hours REAL DEFAULT 0.13,
-                total_work_hours REAL DEFAULT 0,
-                notes TEXT,
-                store_code TEXT,
-                city TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        ''')
-        
-        db.commit()
-        logger.info("SQLite数据库初始化完成")
+    """初始化数据库表结构（按版本执行未完成的迁移）"""
+    from migrations import migrate
+    migrate()
 
 def get_database_info():
     """获取当前数据库信息"""
@@ -29,8 +29,9 @@ def migrate_sqlite_to_postgresql():
         pg_conn = psycopg2.connect(DATABASE_URL)
         pg_cursor = pg_conn.cursor()
         
-        # 创建PostgreSQL表结构
-        create_postgres_tables(pg_cursor)
+        # 创建PostgreSQL表结构（按版本迁移到最新结构）
+        from migrations import migrate
+        migrate()
         
         # 迁移用户数据
         migrate_users(sqlite_conn, pg_cursor)
@@ -38,6 +39,10 @@ def migrate_sqlite_to_postgresql():
         # 迁移工时记录数据
         migrate_timesheet_records(sqlite_conn, pg_cursor)
         
+        # 按导入的记录重建工时汇总表
+        from rollups import rebuild_rollups
+        rebuild_rollups(pg_cursor)
+        
         # 提交事务
         pg_conn.commit()
         
@@ -53,52 +58,6 @@ def migrate_sqlite_to_postgresql():
         if 'pg_conn' in locals():
             pg_conn.close()
 
-def create_postgres_tables(cursor):
-    """创建PostgreSQL表结构"""
-    
-    # 创建用户表
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id SERIAL PRIMARY KEY,
-            username VARCHAR(255) UNIQUE NOT NULL,
-            password VARCHAR(255) NOT NULL,
-            name VARCHAR(255) NOT NULL,
-            role VARCHAR(50) NOT NULL DEFAULT 'specialist',
-            department VARCHAR(255),
-            phone VARCHAR(20) DEFAULT '',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # 创建工时记录表
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS timesheet_records (
-            id SERIAL PRIMARY KEY,
-            user_id INTEGER NOT NULL,
-            work_date DATE NOT NULL,
-            business_trip_days INTEGER DEFAULT 1,
-            actual_visit_days INTEGER DEFAULT 1,
-            audit_store_count INTEGER NOT NULL,
-            training_store_count INTEGER DEFAULT 0,
-            start_location TEXT,
-            end_location TEXT,
-            round_trip_distance REAL DEFAULT 0,
-            transport_mode VARCHAR(50) DEFAULT 'driving',
-            schedule_number VARCHAR(255),
-            travel_hours REAL DEFAULT 0,
-            visit_hours REAL DEFAULT 0.92,
-            report_hours REAL DEFAULT 0.13,
-            total_work_hours REAL DEFAULT 0,
-            notes TEXT,
-            store_code VARCHAR(255),
-            city VARCHAR(255),
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-    
-    print("📋 PostgreSQL表结构创建完成")
-
 def migrate_users(sqlite_conn, pg_cursor):
     """迁移用户数据"""
     users = sqlite_conn.execute('SELECT * FROM users').fetchall()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+数据库方言适配层
+应用代码统一按sqlite3的写法访问数据库（? 占位符、INSERT OR REPLACE/IGNORE、row['col']），
+使用PostgreSQL时由本模块把SQL翻译成PostgreSQL语法，并返回同样支持下标和字段名访问的行
+"""
+
+import re
+import uuid
+import logging
+from functools import lru_cache
+
+try:
+    import psycopg2
+    import psycopg2.extras
+    import psycopg2.extensions
+except ImportError:
+    psycopg2 = None
+
+logger = logging.getLogger(__name__)
+
+# INSERT OR REPLACE 翻译为 ON CONFLICT 时使用的冲突键（主键或唯一约束）
+UPSERT_CONFLICT_KEYS = {
+    'users': ('username',),
+    'stores': ('store_code',),
+    'route_cache': ('cache_key',),
+    'api_usage_daily': ('provider', 'usage_date'),
+    'user_monthly_defaults': ('user_id', 'year', 'month'),
+    'schema_version': ('component',),
+}
+
+_INSERT_OR_RE = re.compile(
+    r'^\s*INSERT\s+OR\s+(REPLACE|IGNORE)\s+INTO\s+(\w+)\s*\(([^)]*)\)', re.IGNORECASE
+)
+
+
+def _translate_placeholders(sql):
+    """? 改为 %s，字符串常量外的 % 转义为 %%"""
+    out = []
+    in_string = False
+    for ch in sql:
+        if ch == "'":
+            in_string = not in_string
+            out.append(ch)
+        elif in_string:
+            out.append('%%' if ch == '%' else ch)
+        elif ch == '?':
+            out.append('%s')
+        elif ch == '%':
+            out.append('%%')
+        else:
+            out.append(ch)
+    return ''.join(out)
+
+
+def _translate_upsert(sql):
+    """INSERT OR REPLACE/IGNORE 改为 INSERT ... ON CONFLICT"""
+    match = _INSERT_OR_RE.match(sql)
+    if not match:
+        return sql
+
+    action, table, column_list = match.group(1).upper(), match.group(2), match.group(3)
+    body = 'INSERT INTO ' + sql[match.start(2):].rstrip().rstrip(';')
+    if action == 'IGNORE':
+        return body + ' ON CONFLICT DO NOTHING'
+
+    keys = UPSERT_CONFLICT_KEYS.get(table.lower())
+    if not keys:
+        raise ValueError(f'表 {table} 未登记冲突键，无法翻译 INSERT OR REPLACE')
+    columns = [c.strip() for c in column_list.split(',') if c.strip()]
+    updates = [c for c in columns if c not in keys]
+    if not updates:
+        return body + f' ON CONFLICT ({", ".join(keys)}) DO NOTHING'
+    assignments = ', '.join(f'{c} = EXCLUDED.{c}' for c in updates)
+    return body + f' ON CONFLICT ({", ".join(keys)}) DO UPDATE SET {assignments}'
+
+
+@lru_cache(maxsize=512)
+def translate_sql(sql):
+    """把sqlite3写法的SQL翻译为PostgreSQL（psycopg2）写法"""
+    return _translate_placeholders(_translate_upsert(sql))
+
+
+def register_text_types(conn):
+    """
+    日期/时间字段按文本返回、数值按float返回，与SQLite保持一致
+    （应用代码按字符串处理 work_date/created_at，并直接把统计结果放进JSON）
+    """
+    extensions = psycopg2.extensions
+    date_type = extensions.new_type(extensions.DATE.values, 'DATE_AS_TEXT', lambda value, cursor: value)
+    timestamp_type = extensions.new_type(
+        extensions.PYDATETIME.values + extensions.PYDATETIMETZ.values, 'TIMESTAMP_AS_TEXT',
+        lambda value, cursor: value[:19] if value else value
+    )
+    numeric_type = extensions.new_type(
+        extensions.DECIMAL.values, 'NUMERIC_AS_FLOAT',
+        lambda value, cursor: float(value) if value is not None else None
+    )
+    for pg_type in (date_type, timestamp_type, numeric_type):
+        extensions.register_type(pg_type, conn)
+
+
+class PostgresAdapter:
+    """
+    包装psycopg2连接，提供与sqlite3.Connection一致的 execute/executemany，
+    返回的游标支持 fetchone/fetchall，行可按下标或字段名访问
+    cursor() 返回原始游标（使用 %s 占位符），供需要psycopg2专有功能的代码使用
+    """
+
+    def __init__(self, conn):
+        self.raw = conn
+
+    def execute(self, sql, params=()):
+        cursor = self.raw.cursor(cursor_factory=psycopg2.extras.DictCursor)
+        cursor.execute(translate_sql(sql), tuple(params or ()))
+        return cursor
+
+    def executemany(self, sql, seq_of_params):
+        cursor = self.raw.cursor(cursor_factory=psycopg2.extras.DictCursor)
+        cursor.executemany(translate_sql(sql), [tuple(p) for p in seq_of_params])
+        return cursor
+
+    def cursor(self, *args, **kwargs):
+        return self.raw.cursor(*args, **kwargs)
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+
+def iter_batches(db, sql, params=(), batch_size=1000):
+    """
+    按批读取查询结果，每次产出最多 batch_size 行
+    PostgreSQL使用服务端命名游标，SQLite游标本身按需读取，内存占用与结果总量无关
+    """
+    if isinstance(db, PostgresAdapter):
+        cursor = db.raw.cursor(name=f'batch_{uuid.uuid4().hex}', cursor_factory=psycopg2.extras.DictCursor)
+        cursor.itersize = batch_size
+        cursor.execute(translate_sql(sql), tuple(params or ()))
+    else:
+        cursor = db.execute(sql, params)
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cursor.close()
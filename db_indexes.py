@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+数据库二级索引定义
+为工时记录和用户表的高频查询建立索引（由 migrations.py 按版本创建），
+并提供基于EXPLAIN的检查，确认各接口的查询确实用到了索引
+
+用法:
+    python db_indexes.py    # 检查各接口查询计划是否用到索引
+"""
+
+import sys
+import logging
+
+from database_config import get_db_connection, init_database, USE_POSTGRESQL
+from rollups import admin_overview_sql
+from timesheet_queries import my_timesheet_page_sql, admin_records_page_sql
+
+logger = logging.getLogger(__name__)
+
+# 新增索引时在此登记，并在 migrations.py 中追加一个调用 create_indexes 的迁移
+# (索引名, 表名, 字段)
+INDEXES = [
+    # /api/my_timesheet、导出：按用户取记录并按日期、创建时间排序
+    ('idx_timesheet_user_date', 'timesheet_records', ('user_id', 'work_date', 'created_at')),
+    # api_admin_records、admin_export_records：按日期范围筛选，
+    # 并支持 api_admin_records 按 (work_date, created_at, id) 的游标分页
+    ('idx_timesheet_date_created', 'timesheet_records', ('work_date', 'created_at', 'id')),
+    # admin_overview：最新记录
+    ('idx_timesheet_created_at', 'timesheet_records', ('created_at',)),
+    # 按部门筛选和统计
+    ('idx_users_department', 'users', ('department',)),
+    # 注册时的手机号查重
+    ('idx_users_phone', 'users', ('phone',)),
+]
+
+ADMIN_OVERVIEW_SQL, ADMIN_RECENT_SQL = admin_overview_sql()
+ADMIN_DEPARTMENT_RECENT_SQL = admin_overview_sql(by_department=True)[1]
+
+# 各接口的代表性查询及期望使用的索引，用于 --check
+QUERY_CHECKS = [
+    # 列表接口的SQL与 app_clean 相同（timesheet_queries）
+    ('api_my_timesheet 按月', 'idx_timesheet_user_date', my_timesheet_page_sql(True, True),
+     (1, '2025-01-01', '2025-01-31', 501)),
+    ('api_my_timesheet 翻页', 'idx_timesheet_user_date', my_timesheet_page_sql(True, True, cursor=True),
+     (1, '2025-01-01', '2025-01-31', '2025-01-20', '2025-01-20',
+      '2025-01-20 10:00:00', '2025-01-20 10:00:00', 500, 501)),
+    # admin_overview 读汇总表，SQL与 app_clean.query_admin_overview 相同（rollups.admin_overview_sql）
+    ('admin_overview 概览和部门统计', 'idx_rollup_user_daily_date', ADMIN_OVERVIEW_SQL, (
+        '2025-01-01', '2025-01-31', '2025-01-15',
+        '2025-01-15', '2025-01-01', '2025-01-31', '2025-01-01', '2025-01-31', '2025-01')),
+    ('admin_overview 最新记录', 'idx_timesheet_created_at', ADMIN_RECENT_SQL, ()),
+    ('admin_overview 部门最新记录', 'idx_timesheet_user_date', ADMIN_DEPARTMENT_RECENT_SQL, ('一组',)),
+    ('api_admin_records', 'idx_timesheet_date_created',
+     admin_records_page_sql('t.work_date >= ? AND t.work_date <= ?'), ('2025-01-01', '2025-01-31', 51)),
+    ('api_admin_records 翻页', 'idx_timesheet_date_created',
+     admin_records_page_sql('t.work_date >= ? AND t.work_date <= ?', cursor=True),
+     ('2025-01-01', '2025-01-31', '2025-01-20', '2025-01-20',
+      '2025-01-20 10:00:00', '2025-01-20 10:00:00', 500, 51)),
+    ('register 手机号查重', 'idx_users_phone', '''
+        SELECT id FROM users WHERE phone = ?
+    ''', ('13800000000',)),
+]
+
+
+def _sql(sql):
+    """PostgreSQL使用 %s 占位符"""
+    return sql.replace('?', '%s') if USE_POSTGRESQL else sql
+
+
+def create_indexes(cursor):
+    """创建全部索引（已存在的跳过），由 migrations.py 中的迁移调用"""
+    for name, table, columns in INDEXES:
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({", ".join(columns)})')
+
+
+def explain(conn, sql, params):
+    """返回查询计划文本（每步一行）"""
+    cursor = conn.cursor()
+    if USE_POSTGRESQL:
+        cursor.execute('EXPLAIN ' + _sql(sql), params)
+        return [row[0] for row in cursor.fetchall()]
+    cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+    return [row[-1] for row in cursor.fetchall()]
+
+
+def check_index_usage(conn):
+    """
+    检查各接口查询是否使用了期望的索引
+    注意：PostgreSQL在表很小时会优先选择顺序扫描，应在有真实数据量的库上检查
+    """
+    results = []
+    for endpoint, index_name, sql, params in QUERY_CHECKS:
+        plan = explain(conn, sql, params)
+        results.append({
+            'endpoint': endpoint,
+            'index': index_name,
+            'uses_index': any(index_name in step for step in plan),
+            'plan': plan,
+        })
+    return results
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    init_database()
+
+    with get_db_connection() as conn:
+        results = check_index_usage(conn)
+
+    failed = 0
+    for result in results:
+        mark = '✅' if result['uses_index'] else '❌'
+        print(f"{mark} {result['endpoint']} -> {result['index']}")
+        if not result['uses_index']:
+            failed += 1
+            for step in result['plan']:
+                print(f"     {step}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
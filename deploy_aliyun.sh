@@ -63,18 +63,18 @@ fi
 info "初始化数据库..."
 python aliyun_database_setup.py
 
-# 6. 导入数据（如果存在导入文件）
-if ls railway_data_import_*.sql 1> /dev/null 2>&1; then
+# 6. 导入数据（如果存在备份目录）
+if [ -f backups/manifest.json ]; then
     info "导入Railway数据..."
     source .env
-    psql "$DATABASE_URL" -f railway_data_import_*.sql
+    python incremental_backup.py --restore --dir backups --yes
     info "数据导入完成"
 else
     warn "未找到数据导入文件，跳过数据导入"
 fi
 
 # 7. 验证数据迁移
-if ls railway_data_export_*.json 1> /dev/null 2>&1; then
+if [ -f backups/manifest.json ] || ls railway_data_export_*.json 1> /dev/null 2>&1; then
     info "验证数据迁移..."
     python verify_migration.py
 else
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+异步导出任务
+导出请求只登记任务并立即返回，由后台线程池把文件写到 EXPORT_DIR，
+前端轮询任务状态，完成后再下载，导出不再占用gunicorn请求worker。
+
+任务记录保存在 export_jobs 表，多个worker进程共享；相同导出类型和参数的任务在有效期内只生成一次，
+过期的任务及文件在登记新任务时清理。
+登记任务的进程定期更新其排队中/执行中任务的 heartbeat_at，进程退出后心跳停止，
+任务在 EXPORT_HEARTBEAT_TIMEOUT 后即视为失败，前端不必等待很久
+"""
+
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from database_config import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+EXPORT_DIR = os.environ.get('EXPORT_DIR', 'exports')
+EXPORT_MAX_WORKERS = int(os.environ.get('EXPORT_MAX_WORKERS', 2))
+EXPORT_JOB_TTL = int(os.environ.get('EXPORT_JOB_TTL', 24 * 3600))          # 导出文件保留时间（秒）
+EXPORT_HEARTBEAT_INTERVAL = int(os.environ.get('EXPORT_HEARTBEAT_INTERVAL', 15))   # 心跳间隔（秒）
+EXPORT_HEARTBEAT_TIMEOUT = int(os.environ.get('EXPORT_HEARTBEAT_TIMEOUT', 90))     # 超过该时间没有心跳视为失败（进程被回收等）
+EXPORT_DEDUP_WINDOW = int(os.environ.get('EXPORT_DEDUP_WINDOW', 5 * 60))   # 已完成的导出在该时间内可被相同请求复用
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+JOB_COLUMNS = ('id, kind, params, dedup_key, status, filename, mimetype, file_size, error, '
+               'owner_id, created_at, started_at, finished_at, expires_at, heartbeat_at')
+
+# 导出类型 -> builder(params)，返回 (文件名, MIME类型, 字节块迭代器)
+_builders = {}
+
+_executor = ThreadPoolExecutor(max_workers=EXPORT_MAX_WORKERS, thread_name_prefix='export')
+
+# 本进程中排队/执行中的任务ID，由心跳线程定期更新 heartbeat_at
+_active = set()
+_active_lock = threading.Lock()
+_heartbeat_pid = None
+
+
+def register_export(kind, builder):
+    """登记导出类型"""
+    _builders[kind] = builder
+
+
+def dedup_key(kind, params):
+    payload = json.dumps([kind, params], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def job_path(job):
+    """导出文件路径（按任务ID命名，不使用用户提供的文件名）"""
+    extension = os.path.splitext(job['filename'] or '')[1]
+    return os.path.join(EXPORT_DIR, f"{job['id']}{extension}")
+
+
+def _is_stale(job, now):
+    """排队/执行中但心跳已停止的任务（所在进程已退出）"""
+    heartbeat = job['heartbeat_at'] or job['created_at']
+    return job['status'] in (STATUS_QUEUED, STATUS_RUNNING) and now - heartbeat > EXPORT_HEARTBEAT_TIMEOUT
+
+
+def _heartbeat_loop():
+    while True:
+        time.sleep(EXPORT_HEARTBEAT_INTERVAL)
+        with _active_lock:
+            job_ids = list(_active)
+        if not job_ids:
+            continue
+        try:
+            with get_db_connection() as db:
+                db.execute(f"UPDATE export_jobs SET heartbeat_at = ? WHERE id IN ({', '.join('?' for _ in job_ids)})",
+                           (time.time(), *job_ids))
+                db.commit()
+        except Exception as e:
+            logger.warning(f"更新导出任务心跳失败: {e}")
+
+
+def _track(job_id):
+    """登记本进程负责的任务，必要时启动心跳线程（fork出的子进程需要重新启动）"""
+    global _heartbeat_pid
+    with _active_lock:
+        _active.add(job_id)
+        if _heartbeat_pid != os.getpid():
+            _heartbeat_pid = os.getpid()
+            threading.Thread(target=_heartbeat_loop, name='export-heartbeat', daemon=True).start()
+
+
+def get_job(job_id):
+    """读取任务，不存在返回None"""
+    with get_db_connection() as db:
+        row = db.execute(f'SELECT {JOB_COLUMNS} FROM export_jobs WHERE id = ?', (job_id,)).fetchone()
+    if not row:
+        return None
+    job = dict(zip([c.strip() for c in JOB_COLUMNS.split(',')], row))
+    job['params'] = json.loads(job['params'])
+    if _is_stale(job, time.time()):
+        job['status'] = STATUS_FAILED
+        job['error'] = '导出中断，请重新导出'
+    return job
+
+
+def cleanup_expired(db, now=None):
+    """删除过期或超时的任务及其文件"""
+    now = now or time.time()
+    rows = db.execute('''
+        SELECT id, filename FROM export_jobs
+        WHERE expires_at < ? OR (status IN (?, ?) AND COALESCE(heartbeat_at, created_at) < ?)
+    ''', (now, STATUS_QUEUED, STATUS_RUNNING, now - EXPORT_HEARTBEAT_TIMEOUT)).fetchall()
+    for row in rows:
+        path = job_path({'id': row[0], 'filename': row[1]})
+        for candidate in (path, path + '.part'):
+            try:
+                os.remove(candidate)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"删除导出文件失败 {candidate}: {e}")
+        db.execute('DELETE FROM export_jobs WHERE id = ?', (row[0],))
+    return len(rows)
+
+
+def enqueue(kind, params, owner_id=None):
+    """
+    登记导出任务并提交到后台线程池，返回任务
+    参数相同且排队中、执行中或刚完成的任务直接复用
+    """
+    if kind not in _builders:
+        raise ValueError(f'未知的导出类型: {kind}')
+
+    key = dedup_key(kind, params)
+    now = time.time()
+    job_id = uuid.uuid4().hex
+    with get_db_connection() as db:
+        cleanup_expired(db, now)
+        # 失败或完成较久的任务不再复用（数据可能已变化），dedup_key 改为任务ID，文件保留到过期
+        db.execute('''
+            UPDATE export_jobs SET dedup_key = id
+            WHERE dedup_key = ? AND (status = ? OR (status = ? AND finished_at < ?))
+        ''', (key, STATUS_FAILED, STATUS_DONE, now - EXPORT_DEDUP_WINDOW))
+        # dedup_key 唯一，多个worker同时登记相同任务时只有一个插入成功
+        db.execute('''
+            INSERT OR IGNORE INTO export_jobs
+                (id, kind, params, dedup_key, status, owner_id, created_at, expires_at, heartbeat_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (job_id, kind, json.dumps(params, ensure_ascii=False), key, STATUS_QUEUED,
+              owner_id, now, now + EXPORT_JOB_TTL, now))
+        db.commit()
+        existing = db.execute('SELECT id FROM export_jobs WHERE dedup_key = ?', (key,)).fetchone()
+
+    if existing[0] == job_id:
+        _track(job_id)
+        _executor.submit(_run, job_id)
+        logger.info(f"导出任务已登记 {job_id} ({kind})")
+    return get_job(existing[0])
+
+
+def _update(job_id, **fields):
+    assignments = ', '.join(f'{name} = ?' for name in fields)
+    with get_db_connection() as db:
+        db.execute(f'UPDATE export_jobs SET {assignments} WHERE id = ?', (*fields.values(), job_id))
+        db.commit()
+
+
+def _run(job_id):
+    """后台线程：生成导出文件，先写临时文件再改名，避免下载到不完整的文件"""
+    try:
+        _export(job_id)
+    finally:
+        with _active_lock:
+            _active.discard(job_id)
+
+
+def _export(job_id):
+    job = get_job(job_id)
+    if not job or job['status'] != STATUS_QUEUED:
+        return
+
+    path = tmp_path = None
+    try:
+        filename, mimetype, chunks = _builders[job['kind']](job['params'])
+        _update(job_id, status=STATUS_RUNNING, started_at=time.time(), filename=filename, mimetype=mimetype)
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        path = job_path({'id': job_id, 'filename': filename})
+        tmp_path = path + '.part'
+        with open(tmp_path, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(tmp_path, path)
+        finished = time.time()
+        _update(job_id, status=STATUS_DONE, file_size=os.path.getsize(path), finished_at=finished,
+                expires_at=finished + EXPORT_JOB_TTL)
+        logger.info(f"导出任务完成 {job_id}: {filename} ({os.path.getsize(path)} 字节)")
+    except Exception as e:
+        logger.error(f"导出任务失败 {job_id}: {e}")
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        _update(job_id, status=STATUS_FAILED, error=str(e)[:500], finished_at=time.time())
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+HTTP客户端模块
+所有地图API请求共用一个带连接池的Session（按主机复用keep-alive连接），
+失败重试采用带抖动的指数退避，并按主机统计请求延迟
+"""
+
+import os
+import time
+import random
+import logging
+import threading
+from collections import deque
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# 连接池和超时配置
+HTTP_POOL_CONNECTIONS = int(os.environ.get('HTTP_POOL_CONNECTIONS', 4))   # 缓存的主机连接池数量
+HTTP_POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', 10))          # 每个主机的最大连接数
+HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 3.05))
+
+# 重试退避：第n次重试前等待 [0, min(上限, 基数*2^n)] 之间的随机时间
+RETRY_BACKOFF_BASE = float(os.environ.get('HTTP_RETRY_BACKOFF_BASE', 0.2))
+RETRY_BACKOFF_MAX = float(os.environ.get('HTTP_RETRY_BACKOFF_MAX', 2.0))
+
+# 每个主机保留最近多少次请求的延迟用于计算分位数
+LATENCY_WINDOW = 200
+
+
+class HostMetrics:
+    """单个主机的请求统计（地图API线程池中的多个线程同时更新，读写都加锁）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.recent = deque(maxlen=LATENCY_WINDOW)
+
+    def record(self, elapsed_ms, ok):
+        with self._lock:
+            self.requests += 1
+            if not ok:
+                self.errors += 1
+            self.total_ms += elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+            self.recent.append(elapsed_ms)
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def snapshot(self):
+        with self._lock:
+            recent = sorted(self.recent)
+            requests_count, errors, retries = self.requests, self.errors, self.retries
+            total_ms, max_ms = self.total_ms, self.max_ms
+
+        def percentile(p):
+            if not recent:
+                return 0
+            return round(recent[min(len(recent) - 1, int(len(recent) * p))], 1)
+
+        return {
+            'requests': requests_count,
+            'errors': errors,
+            'retries': retries,
+            'avg_ms': round(total_ms / requests_count, 1) if requests_count else 0,
+            'p50_ms': percentile(0.5),
+            'p95_ms': percentile(0.95),
+            'max_ms': round(max_ms, 1),
+        }
+
+
+class HTTPClient:
+    """带连接池、重试和延迟统计的HTTP客户端"""
+
+    def __init__(self, pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE,
+                 connect_timeout=HTTP_CONNECT_TIMEOUT):
+        self.connect_timeout = connect_timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _host_metrics(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            metrics = self._metrics.get(host)
+            if metrics is None:
+                metrics = self._metrics[host] = HostMetrics()
+            return metrics
+
+    @staticmethod
+    def backoff(attempt):
+        """第attempt次失败后的等待时间（秒）"""
+        return random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * (2 ** attempt)))
+
+    def get(self, url, params=None, timeout=15, max_retries=3):
+        """GET请求，超时或连接失败时按退避策略重试，最后一次失败抛出异常"""
+        metrics = self._host_metrics(url)
+        for attempt in range(max_retries):
+            started = time.perf_counter()
+            try:
+                logger.info(f"API请求 (尝试 {attempt + 1}/{max_retries}): {url}")
+                response = self.session.get(url, params=params, timeout=(self.connect_timeout, timeout))
+                response.raise_for_status()
+                metrics.record((time.perf_counter() - started) * 1000, True)
+                return response
+            except requests.exceptions.RequestException as e:
+                metrics.record((time.perf_counter() - started) * 1000, False)
+                if isinstance(e, requests.exceptions.Timeout):
+                    logger.warning(f"请求超时 (尝试 {attempt + 1}/{max_retries}): {url}")
+                else:
+                    logger.error(f"请求失败 (尝试 {attempt + 1}/{max_retries}): {e}")
+                if attempt == max_retries - 1:
+                    raise
+                metrics.record_retry()
+                time.sleep(self.backoff(attempt))
+
+    def metrics(self):
+        """按主机返回请求统计"""
+        with self._lock:
+            items = list(self._metrics.items())
+        return {host: m.snapshot() for host, m in items}
+
+
+http_client = HTTPClient()
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+增量备份与恢复
+首次备份（或 --full）导出全部用户、工时记录和月度默认设置，之后每次只导出 updated_at 不早于上次高水位的记录
+（新增记录的 updated_at 为插入时间），以及 backup_tombstones 中的删除记录，备份耗时与期间的变更量成正比。
+每次备份写一个gzip压缩的NDJSON分段，manifest.json 记录分段列表和高水位。
+
+恢复时依次重放最近一次全量备份及其后的增量分段，每个分段一个事务（清空旧数据与全量分段一起提交），
+增量记录按键覆盖，最后重建工时汇总表
+
+用法:
+    python incremental_backup.py [--dir backups] [--full]          # 备份，定时任务每晚执行
+    python incremental_backup.py --restore [--dir backups] --yes   # 用备份覆盖当前数据库
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import logging
+import argparse
+from decimal import Decimal
+from datetime import datetime, date, timedelta
+
+from database_config import get_db_connection, init_database, USE_POSTGRESQL
+from db_adapter import iter_batches
+from rollups import rebuild_rollups
+
+logger = logging.getLogger(__name__)
+
+BACKUP_DIR = os.environ.get('BACKUP_DIR', 'backups')
+BACKUP_BATCH_SIZE = int(os.environ.get('BACKUP_BATCH_SIZE', 1000))
+# 增量备份从上次高水位往前回看的秒数：updated_at 只精确到秒，备份时未提交的事务提交后时间戳也早于高水位
+BACKUP_OVERLAP = int(os.environ.get('BACKUP_OVERLAP', 10 * 60))
+# 删除记录保留时间（秒），上次备份早于该时间时自动改为全量备份
+BACKUP_TOMBSTONE_TTL = int(os.environ.get('BACKUP_TOMBSTONE_TTL', 30 * 24 * 3600))
+
+# 备份的表 -> 恢复时覆盖记录使用的键，按插入顺序排列（被引用的表在前）
+BACKUP_TABLES = {
+    'users': ('id',),
+    'user_monthly_defaults': ('user_id', 'year', 'month'),
+    'timesheet_records': ('id',),
+}
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _db_now(db):
+    """数据库当前时间，与 updated_at/deleted_at 使用同一时钟"""
+    sql = 'SELECT LOCALTIMESTAMP' if USE_POSTGRESQL else 'SELECT CURRENT_TIMESTAMP'
+    return str(db.execute(sql).fetchone()[0])[:19]
+
+
+def _shift(timestamp, seconds):
+    return (datetime.fromisoformat(timestamp) + timedelta(seconds=seconds)).strftime(TIMESTAMP_FORMAT)
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat(sep=' ') if isinstance(value, datetime) else value.isoformat()
+    return str(value)
+
+
+def load_manifest(directory=BACKUP_DIR):
+    """读取备份清单，目录中还没有备份时返回空清单"""
+    path = os.path.join(directory, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {'version': MANIFEST_VERSION, 'high_water': None, 'segments': []}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _save_manifest(directory, manifest):
+    path = os.path.join(directory, MANIFEST_NAME)
+    with open(path + '.part', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(path + '.part', path)
+
+
+def _iter_segment_lines(db, since, stats, batch_size):
+    """
+    生成分段内容（每批记录一块文本）
+    先输出删除记录（引用方的表在前），再输出新增/修改的记录（被引用的表在前）
+    """
+    if since is not None:
+        sql = 'SELECT table_name, row_key FROM backup_tombstones WHERE deleted_at >= ? AND table_name = ? ORDER BY id'
+        for table in reversed(list(BACKUP_TABLES)):
+            for rows in iter_batches(db, sql, (since, table), batch_size):
+                stats['deleted'] += len(rows)
+                yield ''.join(
+                    json.dumps({'table': table, 'delete': json.loads(row[1])}) + '\n' for row in rows
+                )
+
+    for table in BACKUP_TABLES:
+        if since is None:
+            sql, params = f'SELECT * FROM {table}', ()
+        else:
+            sql, params = f'SELECT * FROM {table} WHERE updated_at >= ?', (since,)
+        for rows in iter_batches(db, sql, params, batch_size):
+            stats['rows'][table] += len(rows)
+            yield ''.join(
+                json.dumps({'table': table, 'row': dict(row)}, ensure_ascii=False, default=_json_default) + '\n'
+                for row in rows
+            )
+
+
+def run_backup(directory=BACKUP_DIR, full=False, batch_size=BACKUP_BATCH_SIZE):
+    """
+    执行一次备份，返回本次分段信息；增量备份没有变更时不生成分段，返回None
+    没有全量备份或上次备份早于删除记录保留时间时自动执行全量备份
+    """
+    started = time.time()
+    os.makedirs(directory, exist_ok=True)
+    manifest = load_manifest(directory)
+
+    with get_db_connection() as db:
+        # 各表在同一个快照中读取，分段内的引用关系一致（恢复时外键检查才能通过）
+        db.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ' if USE_POSTGRESQL else 'BEGIN')
+        # 先取高水位再读数据，读取期间的修改留给下一次备份
+        high_water = _db_now(db)
+        previous = manifest['high_water']
+        if not full and previous is None:
+            full = True
+        elif not full and previous < _shift(high_water, -BACKUP_TOMBSTONE_TTL):
+            logger.warning(f"上次备份时间 {previous} 早于删除记录保留期限，改为全量备份")
+            full = True
+        since = None if full else _shift(previous, -BACKUP_OVERLAP)
+
+        kind = 'full' if full else 'delta'
+        stamp = high_water.replace('-', '').replace(':', '').replace(' ', '_')
+        filename = f"{len(manifest['segments']) + 1:06d}_{kind}_{stamp}.ndjson.gz"
+        path = os.path.join(directory, filename)
+        stats = {'rows': {table: 0 for table in BACKUP_TABLES}, 'deleted': 0}
+        with gzip.open(path + '.part', 'wt', encoding='utf-8') as f:
+            for chunk in _iter_segment_lines(db, since, stats, batch_size):
+                f.write(chunk)
+        db.commit()
+
+        db.execute('DELETE FROM backup_tombstones WHERE deleted_at < ?',
+                   (_shift(high_water, -BACKUP_TOMBSTONE_TTL),))
+        db.commit()
+
+    segment = None
+    if full or stats['deleted'] or any(stats['rows'].values()):
+        os.replace(path + '.part', path)
+        segment = {
+            'file': filename,
+            'type': kind,
+            'since': since,
+            'high_water': high_water,
+            'rows': stats['rows'],
+            'deleted': stats['deleted'],
+            'bytes': os.path.getsize(path),
+            'elapsed': round(time.time() - started, 2),
+        }
+        manifest['segments'].append(segment)
+    else:
+        os.remove(path + '.part')
+    manifest['high_water'] = high_water
+    _save_manifest(directory, manifest)
+
+    logger.info(f"{'全量' if full else '增量'}备份完成: {segment or '无变更'}")
+    return segment
+
+
+def restore_chain(manifest):
+    """恢复需要重放的分段：最近一次全量备份及其后的增量"""
+    segments = manifest['segments']
+    for index in range(len(segments) - 1, -1, -1):
+        if segments[index]['type'] == 'full':
+            return segments[index:]
+    raise ValueError('备份目录中没有全量备份')
+
+
+def _iter_segment(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _table_columns(db, table):
+    cursor = db.execute(f'SELECT * FROM {table} LIMIT 0')
+    return [column[0] for column in cursor.description]
+
+
+def _delete_keys(db, table, keys):
+    columns = BACKUP_TABLES[table]
+    if USE_POSTGRESQL:
+        from psycopg2.extras import execute_values
+        matches = ' AND '.join(f't.{c} = k.{c}' for c in columns)
+        execute_values(db.cursor(), f'DELETE FROM {table} t USING (VALUES %s) AS k ({", ".join(columns)}) '
+                                    f'WHERE {matches}', keys, page_size=len(keys))
+    else:
+        condition = ' AND '.join(f'{c} = ?' for c in columns)
+        db.executemany(f'DELETE FROM {table} WHERE {condition}', keys)
+
+
+def _write_rows(db, table, columns, rows, upsert):
+    """插入记录；upsert 时按 BACKUP_TABLES 的键覆盖已有记录（不删除，避免触发外键检查）"""
+    conflict = ''
+    if upsert:
+        keys = BACKUP_TABLES[table]
+        updates = [c for c in columns if c not in keys]
+        assignments = ', '.join(f'{c} = excluded.{c}' for c in updates)
+        # 内容相同的记录（回看窗口内重复导出）不更新，避免 updated_at 触发器改写时间
+        current = ', '.join(f'{table}.{c}' for c in updates)
+        incoming = ', '.join(f'excluded.{c}' for c in updates)
+        distinct = 'IS DISTINCT FROM' if USE_POSTGRESQL else 'IS NOT'
+        conflict = (f' ON CONFLICT ({", ".join(keys)}) DO UPDATE SET {assignments}'
+                    f' WHERE ({current}) {distinct} ({incoming})')
+    if USE_POSTGRESQL:
+        from psycopg2.extras import execute_values
+        execute_values(db.cursor(), f'INSERT INTO {table} ({", ".join(columns)}) VALUES %s{conflict}',
+                       rows, page_size=len(rows))
+    else:
+        placeholders = ', '.join('?' for _ in columns)
+        db.executemany(f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({placeholders}){conflict}', rows)
+
+
+def _apply_batch(db, table, entries, target_columns, upsert):
+    """写入一批同一张表的操作：删除记录按键删除，其余记录按键覆盖（全量分段直接插入）"""
+    if 'delete' in entries[0]:
+        _delete_keys(db, table, [tuple(entry['delete']) for entry in entries])
+        return
+
+    # 只写入目标库存在的字段，字段不同的记录分开写
+    groups = {}
+    for entry in entries:
+        row = entry['row']
+        columns = tuple(c for c in target_columns if c in row)
+        groups.setdefault(columns, []).append(tuple(row[c] for c in columns))
+    for columns, values in groups.items():
+        _write_rows(db, table, columns, values, upsert)
+
+
+def _defer_foreign_keys(db):
+    """
+    当前事务内外键检查推迟到提交时（引用 users 的外键由迁移11设为 DEFERRABLE），
+    分段内同一事务中的中间状态不会触发外键错误
+    """
+    db.execute('SET CONSTRAINTS ALL DEFERRED' if USE_POSTGRESQL else 'PRAGMA defer_foreign_keys = ON')
+
+
+def restore_backup(directory=BACKUP_DIR, batch_size=BACKUP_BATCH_SIZE):
+    """
+    用备份覆盖当前数据库中的用户、月度默认设置和工时记录，返回各表恢复后的记录数
+    每个分段在一个事务内分批写入：清空旧数据与全量分段一起提交，任一分段失败时数据库停留在上一个分段完成后的状态
+    """
+    chain = restore_chain(load_manifest(directory))
+    started = time.time()
+
+    with get_db_connection() as db:
+        target_columns = {table: _table_columns(db, table) for table in BACKUP_TABLES}
+
+        for index, segment in enumerate(chain):
+            logger.info(f"重放备份分段 {segment['file']}")
+            _defer_foreign_keys(db)
+            if index == 0:
+                for table in reversed(list(BACKUP_TABLES)):
+                    db.execute(f'DELETE FROM {table}')
+            upsert = segment['type'] != 'full'
+            pending = []
+
+            def flush():
+                if pending:
+                    table = pending[0]['table']
+                    _apply_batch(db, table, pending, target_columns[table], upsert)
+                    pending.clear()
+
+            for entry in _iter_segment(os.path.join(directory, segment['file'])):
+                if pending and (len(pending) >= batch_size or entry['table'] != pending[0]['table']
+                                or ('delete' in entry) != ('delete' in pending[0])):
+                    flush()
+                pending.append(entry)
+            flush()
+            db.commit()
+
+        if USE_POSTGRESQL:
+            for table in BACKUP_TABLES:
+                db.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                           f"COALESCE(MAX(id), 0) + 1, false) FROM {table}")
+        rebuild_rollups(db)
+        # 恢复过程中产生的删除记录不属于恢复后的数据
+        db.execute('DELETE FROM backup_tombstones')
+        db.commit()
+        counts = {table: db.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0] for table in BACKUP_TABLES}
+
+    logger.info(f"恢复完成，重放 {len(chain)} 个分段，用时 {time.time() - started:.2f}s: {counts}")
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='增量备份与恢复')
+    parser.add_argument('--dir', default=BACKUP_DIR, help='备份目录')
+    parser.add_argument('--full', action='store_true', help='执行全量备份')
+    parser.add_argument('--restore', action='store_true', help='用备份覆盖当前数据库')
+    parser.add_argument('--yes', action='store_true', help='确认恢复（会清空当前的用户和工时数据）')
+    parser.add_argument('--batch-size', type=int, default=BACKUP_BATCH_SIZE, help='每批读取/写入的记录数')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    init_database()
+
+    if args.restore:
+        if not args.yes:
+            print("⚠️  恢复会清空当前数据库中的用户、月度默认设置和工时记录，确认请加 --yes")
+            return 1
+        print(f"🔄 开始从 {args.dir} 恢复...")
+        try:
+            counts = restore_backup(args.dir, args.batch_size)
+        except Exception as e:
+            print(f"❌ 恢复失败: {e}")
+            return 1
+        print("✅ 恢复完成")
+        print(f"👥 用户: {counts['users']}")
+        print(f"📊 工时记录: {counts['timesheet_records']}")
+        print(f"⚙️  默认设置: {counts['user_monthly_defaults']}")
+        return 0
+
+    print(f"🔄 开始{'全量' if args.full else ''}备份到 {args.dir}...")
+    try:
+        segment = run_backup(args.dir, full=args.full, batch_size=args.batch_size)
+    except Exception as e:
+        print(f"❌ 备份失败: {e}")
+        return 1
+    if segment is None:
+        print("✅ 上次备份以来没有变更")
+        return 0
+    print(f"✅ {'全量' if segment['type'] == 'full' else '增量'}备份完成，用时 {segment['elapsed']} 秒")
+    print(f"📄 分段文件: {os.path.join(args.dir, segment['file'])} ({segment['bytes']} 字节)")
+    print(f"👥 用户: {segment['rows']['users']}")
+    print(f"📊 工时记录: {segment['rows']['timesheet_records']}")
+    print(f"⚙️  默认设置: {segment['rows']['user_monthly_defaults']}")
+    print(f"🗑️  删除: {segment['deleted']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -7,6 +7,7 @@
 import os
 import hashlib
 from database_config import get_db_connection, init_database
+from rollups import rebuild_rollups
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -99,6 +100,7 @@ def create_sample_timesheet_records():
                 ''', (user_id, work_date, trip_days, visit_days, store_count, start_loc, 
                      end_loc, distance, transport, travel_h, visit_h, report_h, total_hours, notes))
             
+            rebuild_rollups(db)
             db.commit()
             
             total_records = db.execute('SELECT COUNT(*) FROM timesheet_records').fetchone()[0]
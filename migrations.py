@@ -0,0 +1,620 @@
+#!/usr/bin/env python3
+"""
+数据库结构版本迁移
+所有表结构变更按顺序登记在 MIGRATIONS 中，每个迁移都是幂等的，同时支持SQLite和PostgreSQL。
+当前版本记录在 schema_version 表，启动时只需读取一次版本号，已是最新版本则不执行任何DDL。
+
+新增表、字段或索引时：在 MIGRATIONS 末尾追加一个迁移函数，不要修改已发布的迁移。
+
+用法:
+    python migrations.py            # 执行未完成的迁移
+    python migrations.py --status   # 查看当前版本
+"""
+
+import sys
+import logging
+from datetime import datetime
+
+from database_config import get_db_connection, USE_POSTGRESQL
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_COMPONENT = 'schema'
+
+
+def _dialect():
+    return 'postgresql' if USE_POSTGRESQL else 'sqlite'
+
+
+def _sql(sql):
+    """PostgreSQL使用 %s 占位符"""
+    return sql.replace('?', '%s') if USE_POSTGRESQL else sql
+
+
+def _add_column(cursor, table, column, definition):
+    """添加字段（已存在则跳过）"""
+    if USE_POSTGRESQL:
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {definition}')
+        return
+    cursor.execute(f'PRAGMA table_info({table})')
+    if column not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+        logger.info(f"SQLite: 添加{table}.{column}字段")
+
+
+# ---------------------------------------------------------------------------
+# 迁移定义
+# ---------------------------------------------------------------------------
+
+BASE_TABLES = {
+    'postgresql': [
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            username VARCHAR(255) UNIQUE NOT NULL,
+            password VARCHAR(255) NOT NULL,
+            name VARCHAR(255) NOT NULL,
+            role VARCHAR(50) NOT NULL DEFAULT 'specialist',
+            department VARCHAR(255),
+            phone VARCHAR(20) DEFAULT '',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS timesheet_records (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            work_date DATE NOT NULL,
+            business_trip_days INTEGER DEFAULT 1,
+            actual_visit_days INTEGER DEFAULT 1,
+            audit_store_count INTEGER NOT NULL,
+            training_store_count INTEGER DEFAULT 0,
+            start_location TEXT,
+            end_location TEXT,
+            round_trip_distance REAL DEFAULT 0,
+            transport_mode VARCHAR(50) DEFAULT 'driving',
+            schedule_number VARCHAR(255),
+            travel_hours REAL DEFAULT 0,
+            visit_hours REAL DEFAULT 0.92,
+            report_hours REAL DEFAULT 0.13,
+            total_work_hours REAL DEFAULT 0,
+            notes TEXT,
+            store_code VARCHAR(255),
+            city VARCHAR(255),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS user_monthly_defaults (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            year INTEGER NOT NULL,
+            month INTEGER NOT NULL,
+            business_trip_days INTEGER DEFAULT 1,
+            actual_visit_days INTEGER DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            UNIQUE(user_id, year, month)
+        )
+        ''',
+    ],
+    'sqlite': [
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            name TEXT NOT NULL,
+            role TEXT NOT NULL DEFAULT 'specialist',
+            department TEXT,
+            phone TEXT DEFAULT '',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS timesheet_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            work_date DATE NOT NULL,
+            business_trip_days INTEGER DEFAULT 1,
+            actual_visit_days INTEGER DEFAULT 1,
+            audit_store_count INTEGER NOT NULL,
+            training_store_count INTEGER DEFAULT 0,
+            start_location TEXT,
+            end_location TEXT,
+            round_trip_distance REAL DEFAULT 0,
+            transport_mode TEXT DEFAULT 'driving',
+            schedule_number TEXT,
+            travel_hours REAL DEFAULT 0,
+            visit_hours REAL DEFAULT 0.92,
+            report_hours REAL DEFAULT 0.13,
+            total_work_hours REAL DEFAULT 0,
+            notes TEXT,
+            store_code TEXT,
+            city TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS user_monthly_defaults (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            year INTEGER NOT NULL,
+            month INTEGER NOT NULL,
+            business_trip_days INTEGER DEFAULT 1,
+            actual_visit_days INTEGER DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            UNIQUE(user_id, year, month)
+        )
+        ''',
+    ],
+}
+
+SUPPORT_TABLES = {
+    'postgresql': [
+        '''
+        CREATE TABLE IF NOT EXISTS stores (
+            store_code VARCHAR(64) PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            city VARCHAR(255),
+            longitude DOUBLE PRECISION NOT NULL,
+            latitude DOUBLE PRECISION NOT NULL,
+            address TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS route_cache (
+            cache_key VARCHAR(255) PRIMARY KEY,
+            origin VARCHAR(64) NOT NULL,
+            destination VARCHAR(64) NOT NULL,
+            mode VARCHAR(20) NOT NULL,
+            strategy VARCHAR(20),
+            result TEXT NOT NULL,
+            cached_at DOUBLE PRECISION NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS api_usage_daily (
+            provider VARCHAR(50) NOT NULL,
+            usage_date DATE NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (provider, usage_date)
+        )
+        ''',
+    ],
+    'sqlite': [
+        '''
+        CREATE TABLE IF NOT EXISTS stores (
+            store_code TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            city TEXT,
+            longitude REAL NOT NULL,
+            latitude REAL NOT NULL,
+            address TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS route_cache (
+            cache_key TEXT PRIMARY KEY,
+            origin TEXT NOT NULL,
+            destination TEXT NOT NULL,
+            mode TEXT NOT NULL,
+            strategy TEXT,
+            result TEXT NOT NULL,
+            cached_at REAL NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS api_usage_daily (
+            provider TEXT NOT NULL,
+            usage_date DATE NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (provider, usage_date)
+        )
+        ''',
+    ],
+}
+
+
+def m001_base_tables(cursor):
+    """用户、工时记录、月度默认值表"""
+    for statement in BASE_TABLES[_dialect()]:
+        cursor.execute(statement)
+
+
+def m002_legacy_columns(cursor):
+    """旧库补充字段（原 upgrade_production_db.py）"""
+    phone_type = "VARCHAR(20) DEFAULT ''" if USE_POSTGRESQL else "TEXT DEFAULT ''"
+    text_type = 'VARCHAR(255)' if USE_POSTGRESQL else 'TEXT'
+    _add_column(cursor, 'users', 'phone', phone_type)
+    _add_column(cursor, 'timesheet_records', 'store_code', text_type)
+    _add_column(cursor, 'timesheet_records', 'city', text_type)
+
+
+def m003_support_tables(cursor):
+    """门店主数据、路线缓存、API配额表"""
+    for statement in SUPPORT_TABLES[_dialect()]:
+        cursor.execute(statement)
+
+
+def m004_secondary_indexes(cursor):
+    """工时记录和用户表的二级索引"""
+    from db_indexes import create_indexes
+    create_indexes(cursor)
+
+
+def m005_unify_roles(cursor):
+    """旧的主管角色统一为管理员（原 fix_role_system.py）"""
+    cursor.execute("UPDATE users SET role = 'admin' WHERE role IN ('supervisor', '主管')")
+
+
+def m006_postgres_compat_functions(cursor):
+    """
+    PostgreSQL补充 round(double precision, integer)，与SQLite的ROUND(x, 2)行为一致
+    （该重载建在public下会影响其他使用者，已由 m013 删除，查询改为 ROUND(CAST(x AS NUMERIC), n)）
+    """
+    if not USE_POSTGRESQL:
+        return
+    cursor.execute('''
+        CREATE OR REPLACE FUNCTION round(double precision, integer) RETURNS numeric
+        AS $$ SELECT round($1::numeric, $2) $$ LANGUAGE SQL IMMUTABLE
+    ''')
+
+
+def m007_records_keyset_index(cursor):
+    """记录列表游标分页索引 (work_date, created_at, id)，替代单列 work_date 索引"""
+    from db_indexes import create_indexes
+    create_indexes(cursor)
+    cursor.execute('DROP INDEX IF EXISTS idx_timesheet_work_date')
+
+
+ROLLUP_TABLES = {
+    'postgresql': [
+        '''
+        CREATE TABLE IF NOT EXISTS rollup_user_daily (
+            user_id INTEGER NOT NULL,
+            work_date DATE NOT NULL,
+            record_count INTEGER NOT NULL DEFAULT 0,
+            total_hours DOUBLE PRECISION NOT NULL DEFAULT 0,
+            actual_visit_days INTEGER NOT NULL DEFAULT 0,
+            total_stores INTEGER NOT NULL DEFAULT 0,
+            total_distance DOUBLE PRECISION NOT NULL DEFAULT 0,
+            travel_hours DOUBLE PRECISION NOT NULL DEFAULT 0,
+            visit_hours DOUBLE PRECISION NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, work_date)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS rollup_department_monthly (
+            department VARCHAR(255) NOT NULL,
+            month VARCHAR(7) NOT NULL,
+            record_count INTEGER NOT NULL DEFAULT 0,
+            total_hours DOUBLE PRECISION NOT NULL DEFAULT 0,
+            actual_visit_days INTEGER NOT NULL DEFAULT 0,
+            work_days INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (department, month)
+        )
+        ''',
+    ],
+    'sqlite': [
+        '''
+        CREATE TABLE IF NOT EXISTS rollup_user_daily (
+            user_id INTEGER NOT NULL,
+            work_date DATE NOT NULL,
+            record_count INTEGER NOT NULL DEFAULT 0,
+            total_hours REAL NOT NULL DEFAULT 0,
+            actual_visit_days INTEGER NOT NULL DEFAULT 0,
+            total_stores INTEGER NOT NULL DEFAULT 0,
+            total_distance REAL NOT NULL DEFAULT 0,
+            travel_hours REAL NOT NULL DEFAULT 0,
+            visit_hours REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, work_date)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS rollup_department_monthly (
+            department TEXT NOT NULL,
+            month TEXT NOT NULL,
+            record_count INTEGER NOT NULL DEFAULT 0,
+            total_hours REAL NOT NULL DEFAULT 0,
+            actual_visit_days INTEGER NOT NULL DEFAULT 0,
+            work_days INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (department, month)
+        )
+        ''',
+    ],
+}
+
+
+def m008_rollup_tables(cursor):
+    """专员日汇总、部门月汇总表，并从现有工时记录回填"""
+    from rollups import rebuild_rollups
+    for statement in ROLLUP_TABLES[_dialect()]:
+        cursor.execute(statement)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_rollup_user_daily_date ON rollup_user_daily (work_date)')
+    rebuild_rollups(cursor)
+
+
+def m009_export_jobs(cursor):
+    """异步导出任务表，dedup_key 唯一用于合并相同参数的导出"""
+    text_type = 'VARCHAR(255)' if USE_POSTGRESQL else 'TEXT'
+    real_type = 'DOUBLE PRECISION' if USE_POSTGRESQL else 'REAL'
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS export_jobs (
+            id {text_type} PRIMARY KEY,
+            kind {text_type} NOT NULL,
+            params TEXT NOT NULL,
+            dedup_key {text_type} NOT NULL UNIQUE,
+            status {text_type} NOT NULL,
+            filename {text_type},
+            mimetype {text_type},
+            file_size INTEGER,
+            error TEXT,
+            owner_id INTEGER,
+            created_at {real_type} NOT NULL,
+            started_at {real_type},
+            finished_at {real_type},
+            expires_at {real_type} NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_export_jobs_expires_at ON export_jobs (expires_at)')
+
+
+POSTGRES_BACKUP_FUNCTIONS = [
+    '''
+    CREATE OR REPLACE FUNCTION backup_touch_updated_at() RETURNS trigger AS $$
+    BEGIN
+        IF NEW.updated_at IS NOT DISTINCT FROM OLD.updated_at THEN
+            NEW.updated_at := LOCALTIMESTAMP;
+        END IF;
+        RETURN NEW;
+    END $$ LANGUAGE plpgsql
+    ''',
+    '''
+    CREATE OR REPLACE FUNCTION backup_record_deletion() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO backup_tombstones (table_name, row_key)
+        SELECT TG_TABLE_NAME, jsonb_agg(to_jsonb(OLD) -> k.name ORDER BY k.ord)::text
+        FROM unnest(TG_ARGV) WITH ORDINALITY AS k(name, ord);
+        RETURN OLD;
+    END $$ LANGUAGE plpgsql
+    ''',
+]
+
+
+def m010_backup_tracking(cursor):
+    """
+    增量备份：users/timesheet_records 增加 updated_at（用 created_at 回填），
+    更新时由触发器刷新 updated_at，删除时由触发器写入 backup_tombstones
+    """
+    # 表名 -> 主键字段；迁移发布后不再变化，不引用 incremental_backup.BACKUP_TABLES（该常量可能增加表）
+    backup_tables = {
+        'users': ('id',),
+        'user_monthly_defaults': ('user_id', 'year', 'month'),
+        'timesheet_records': ('id',),
+    }
+
+    if USE_POSTGRESQL:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS backup_tombstones (
+                id SERIAL PRIMARY KEY,
+                table_name VARCHAR(64) NOT NULL,
+                row_key TEXT NOT NULL,
+                deleted_at TIMESTAMP DEFAULT LOCALTIMESTAMP
+            )
+        ''')
+        for statement in POSTGRES_BACKUP_FUNCTIONS:
+            cursor.execute(statement)
+    else:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS backup_tombstones (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                table_name TEXT NOT NULL,
+                row_key TEXT NOT NULL,
+                deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_backup_tombstones_deleted_at ON backup_tombstones (deleted_at)')
+
+    for table, keys in backup_tables.items():
+        # SQLite 不允许 ADD COLUMN 使用非常量默认值，新增记录的 updated_at 由插入触发器填写
+        _add_column(cursor, table, 'updated_at', 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP' if USE_POSTGRESQL else 'TIMESTAMP')
+        # 原有 updated_at 的表只补空值；新增字段按 created_at 回填（PostgreSQL 添加字段时填入的是当前时间）
+        where = ' WHERE updated_at IS NULL' if table == 'user_monthly_defaults' else ''
+        cursor.execute(f'UPDATE {table} SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP){where}')
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_updated_at ON {table} (updated_at)')
+
+        if USE_POSTGRESQL:
+            cursor.execute(f'DROP TRIGGER IF EXISTS trg_{table}_updated_at ON {table}')
+            cursor.execute(f'''
+                CREATE TRIGGER trg_{table}_updated_at BEFORE UPDATE ON {table}
+                FOR EACH ROW EXECUTE PROCEDURE backup_touch_updated_at()
+            ''')
+            cursor.execute(f'DROP TRIGGER IF EXISTS trg_{table}_deleted ON {table}')
+            cursor.execute(f'''
+                CREATE TRIGGER trg_{table}_deleted AFTER DELETE ON {table}
+                FOR EACH ROW EXECUTE PROCEDURE backup_record_deletion({', '.join(f"'{k}'" for k in keys)})
+            ''')
+        else:
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_inserted AFTER INSERT ON {table}
+                FOR EACH ROW WHEN NEW.updated_at IS NULL
+                BEGIN
+                    UPDATE {table} SET updated_at = CURRENT_TIMESTAMP WHERE rowid = NEW.rowid;
+                END
+            ''')
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_updated_at AFTER UPDATE ON {table}
+                FOR EACH ROW WHEN NEW.updated_at IS OLD.updated_at
+                BEGIN
+                    UPDATE {table} SET updated_at = CURRENT_TIMESTAMP WHERE rowid = NEW.rowid;
+                END
+            ''')
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_deleted AFTER DELETE ON {table}
+                FOR EACH ROW
+                BEGIN
+                    INSERT INTO backup_tombstones (table_name, row_key)
+                    VALUES ('{table}', json_array({', '.join(f'OLD.{k}' for k in keys)}));
+                END
+            ''')
+
+
+def m011_deferrable_user_foreign_keys(cursor):
+    """
+    PostgreSQL: 引用 users 的外键改为 DEFERRABLE INITIALLY IMMEDIATE，
+    应用行为不变，备份恢复时可在事务内 SET CONSTRAINTS ALL DEFERRED（SQLite无需处理）
+    """
+    if not USE_POSTGRESQL:
+        return
+    cursor.execute('''
+        SELECT conrelid::regclass::text, conname FROM pg_constraint
+        WHERE contype = 'f' AND confrelid = 'users'::regclass AND NOT condeferrable
+    ''')
+    for table, constraint in cursor.fetchall():
+        cursor.execute(f'ALTER TABLE {table} ALTER CONSTRAINT {constraint} DEFERRABLE INITIALLY IMMEDIATE')
+
+
+def m012_export_job_heartbeat(cursor):
+    """导出任务心跳时间：所在进程定期更新，停止更新即视为进程已退出"""
+    _add_column(cursor, 'export_jobs', 'heartbeat_at', 'DOUBLE PRECISION' if USE_POSTGRESQL else 'REAL')
+
+
+def m013_drop_round_overload(cursor):
+    """PostgreSQL: 删除 m006 在public下创建的 round(double precision, integer)，查询中改用 CAST(x AS NUMERIC)"""
+    if not USE_POSTGRESQL:
+        return
+    cursor.execute('DROP FUNCTION IF EXISTS round(double precision, integer)')
+
+
+# (版本号, 说明, 迁移函数)，版本号必须连续递增
+MIGRATIONS = [
+    (1, '基础表', m001_base_tables),
+    (2, '旧库补充字段', m002_legacy_columns),
+    (3, '门店/路线缓存/API配额表', m003_support_tables),
+    (4, '二级索引', m004_secondary_indexes),
+    (5, '统一角色名称', m005_unify_roles),
+    (6, 'PostgreSQL兼容函数', m006_postgres_compat_functions),
+    (7, '记录分页索引', m007_records_keyset_index),
+    (8, '工时汇总表', m008_rollup_tables),
+    (9, '异步导出任务表', m009_export_jobs),
+    (10, '增量备份跟踪字段和触发器', m010_backup_tracking),
+    (11, '用户外键可延迟检查', m011_deferrable_user_foreign_keys),
+    (12, '导出任务心跳字段', m012_export_job_heartbeat),
+    (13, '删除round重载函数', m013_drop_round_overload),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+# ---------------------------------------------------------------------------
+# 执行引擎
+# ---------------------------------------------------------------------------
+
+def _ensure_version_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            component VARCHAR(50) PRIMARY KEY,
+            version INTEGER NOT NULL,
+            updated_at VARCHAR(32)
+        )
+    ''')
+
+
+def _set_version(cursor, version):
+    cursor.execute(_sql('DELETE FROM schema_version WHERE component = ?'), (SCHEMA_COMPONENT,))
+    cursor.execute(
+        _sql('INSERT INTO schema_version (component, version, updated_at) VALUES (?, ?, ?)'),
+        (SCHEMA_COMPONENT, version, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+    )
+
+
+def get_schema_version(conn):
+    """读取当前结构版本，schema_version表不存在时返回0"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(_sql('SELECT version FROM schema_version WHERE component = ?'), (SCHEMA_COMPONENT,))
+        row = cursor.fetchone()
+        return row[0] if row else 0
+    except Exception:
+        # PostgreSQL出错后事务不可用，需要回滚
+        conn.rollback()
+        return 0
+
+
+def _lock(cursor):
+    """加迁移锁，避免多个worker同时启动时重复执行"""
+    if USE_POSTGRESQL:
+        cursor.execute('SELECT pg_advisory_xact_lock(20250101)')
+    else:
+        cursor.execute('BEGIN IMMEDIATE')
+
+
+def migrate(target=None):
+    """
+    执行未完成的迁移，返回 (原版本, 新版本)
+    已是最新版本时只执行一次版本查询
+    """
+    target = LATEST_VERSION if target is None else target
+    with get_db_connection() as conn:
+        current = get_schema_version(conn)
+        if current >= target:
+            return current, current
+
+        cursor = conn.cursor()
+        try:
+            _lock(cursor)
+            _ensure_version_table(cursor)
+            # 拿到锁后重新读取，其他worker可能已经完成迁移
+            current = get_schema_version(conn)
+            start = current
+            for version, description, func in MIGRATIONS:
+                if version <= current or version > target:
+                    continue
+                logger.info(f"执行数据库迁移 {version}: {description}")
+                func(cursor)
+                _set_version(cursor, version)
+                current = version
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    if current != start:
+        logger.info(f"数据库结构已升级: 版本 {start} -> {current}")
+    return start, current
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    if '--status' in sys.argv:
+        with get_db_connection() as conn:
+            current = get_schema_version(conn)
+        print(f"📋 当前版本: {current}，最新版本: {LATEST_VERSION}")
+        for version, description, _ in MIGRATIONS:
+            mark = '✅' if version <= current else '⏳'
+            print(f"  {mark} {version:03d} {description}")
+        return 0
+
+    try:
+        start, current = migrate()
+    except Exception as e:
+        print(f"❌ 迁移失败: {e}")
+        return 1
+    if start == current:
+        print(f"✅ 数据库已是最新版本 ({current})")
+    else:
+        print(f"✅ 数据库已从版本 {start} 升级到 {current}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -7,6 +7,7 @@ import json
 import sys
 import os
 from database_config import get_db_connection
+from rollups import rebuild_rollups
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -134,6 +135,9 @@ def main():
             records_restored = restore_timesheet_records(db, backup_data['timesheet_records'])
             logger.info(f"恢复了 {records_restored} 条工时记录")
             
+            # 重建工时汇总表
+            rebuild_rollups(db)
+            
             # 提交事务
             db.commit()
             
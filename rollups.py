@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+工时汇总表（物化统计）
+rollup_user_daily：每个专员每天的记录数、工时、巡店天数等累计值
+rollup_department_monthly：每个部门每月的记录数、工时、巡店天数、巡店日期数
+工时记录增删改时在同一事务内调用 apply_to_rollups 增量维护；
+直接改库的脚本执行后用 `python rollups.py --rebuild` 重新生成
+
+用法:
+    python rollups.py --rebuild    # 从工时记录全量重建汇总表
+"""
+
+import sys
+import logging
+
+from database_config import get_db_connection, init_database, USE_POSTGRESQL
+
+logger = logging.getLogger(__name__)
+
+# 工时记录字段 -> rollup_user_daily 字段
+USER_DAILY_FIELDS = [
+    ('total_work_hours', 'total_hours'),
+    ('actual_visit_days', 'actual_visit_days'),
+    ('audit_store_count', 'total_stores'),
+    ('round_trip_distance', 'total_distance'),
+    ('travel_hours', 'travel_hours'),
+    ('visit_hours', 'visit_hours'),
+]
+
+# 维护汇总表需要的工时记录字段
+RECORD_COLUMNS = 'user_id, work_date, ' + ', '.join(source for source, _ in USER_DAILY_FIELDS)
+
+# work_date 取年月（SQLite存文本，PostgreSQL为DATE类型）
+MONTH_EXPR = "to_char({col}, 'YYYY-MM')" if USE_POSTGRESQL else "substr({col}, 1, 7)"
+
+
+def fetch_rollup_record(db, record_id):
+    """读取维护汇总表所需的记录字段，不存在返回None"""
+    return db.execute(
+        f'SELECT {RECORD_COLUMNS} FROM timesheet_records WHERE id = ?', (record_id,)
+    ).fetchone()
+
+
+def apply_to_rollups(db, record, sign=1):
+    """
+    把一条工时记录计入（sign=1）或移出（sign=-1）汇总表
+    record 需包含 user_id、work_date 及 USER_DAILY_FIELDS 中的记录字段
+    """
+    user_id = record['user_id']
+    work_date = str(record['work_date'])
+    month = work_date[:7]
+    values = [(record[source] or 0) * sign for source, _ in USER_DAILY_FIELDS]
+
+    user = db.execute('SELECT department FROM users WHERE id = ?', (user_id,)).fetchone()
+    department = user[0] if user else None
+    if department:
+        # 先锁定部门月汇总行（空UPDATE加行锁），同部门同月的并发写入在此串行；
+        # 否则READ COMMITTED下两个事务看不到对方未提交的专员日汇总，巡店日期数会重复加减
+        db.execute(
+            'INSERT OR IGNORE INTO rollup_department_monthly (department, month) VALUES (?, ?)',
+            (department, month)
+        )
+        db.execute(
+            'UPDATE rollup_department_monthly SET work_days = work_days WHERE department = ? AND month = ?',
+            (department, month)
+        )
+
+    # 先插入零值行再累加，同一专员同一天的并发写入由该行的行锁串行化
+    db.execute(
+        'INSERT OR IGNORE INTO rollup_user_daily (user_id, work_date) VALUES (?, ?)',
+        (user_id, work_date)
+    )
+    assignments = ', '.join(f'{target} = {target} + ?' for _, target in USER_DAILY_FIELDS)
+    db.execute(
+        f'UPDATE rollup_user_daily SET record_count = record_count + ?, {assignments} '
+        'WHERE user_id = ? AND work_date = ?',
+        (sign, *values, user_id, work_date)
+    )
+    after = db.execute(
+        'SELECT record_count FROM rollup_user_daily WHERE user_id = ? AND work_date = ?',
+        (user_id, work_date)
+    ).fetchone()[0]
+    before = after - sign
+    if after <= 0:
+        db.execute('DELETE FROM rollup_user_daily WHERE user_id = ? AND work_date = ?', (user_id, work_date))
+
+    if not department:
+        return
+
+    # 该专员当天从无到有（或从有到无）时，检查同部门其他人当天是否有记录，决定部门巡店日期数是否变化
+    # （已持有部门月汇总行锁，其他同部门事务的修改此时已提交）
+    day_delta = 0
+    if (before <= 0) != (after <= 0):
+        other = db.execute('''
+            SELECT 1 FROM rollup_user_daily r
+            JOIN users u ON u.id = r.user_id
+            WHERE u.department = ? AND r.work_date = ? AND r.user_id != ?
+            LIMIT 1
+        ''', (department, work_date, user_id)).fetchone()
+        if not other:
+            day_delta = 1 if after > 0 else -1
+
+    db.execute('''
+        UPDATE rollup_department_monthly SET
+            record_count = record_count + ?,
+            total_hours = total_hours + ?,
+            actual_visit_days = actual_visit_days + ?,
+            work_days = work_days + ?
+        WHERE department = ? AND month = ?
+    ''', (sign, values[0], values[1], day_delta, department, month))
+
+
+def rebuild_department_rollups(db):
+    """由 rollup_user_daily 重建部门月度汇总（用户部门变更或删除用户后调用）"""
+    db.execute('DELETE FROM rollup_department_monthly')
+    db.execute(f'''
+        INSERT INTO rollup_department_monthly
+            (department, month, record_count, total_hours, actual_visit_days, work_days)
+        SELECT u.department, {MONTH_EXPR.format(col='r.work_date')},
+               SUM(r.record_count), SUM(r.total_hours), SUM(r.actual_visit_days),
+               COUNT(DISTINCT r.work_date)
+        FROM rollup_user_daily r
+        JOIN users u ON u.id = r.user_id
+        WHERE u.department IS NOT NULL AND u.department != ''
+        GROUP BY u.department, {MONTH_EXPR.format(col='r.work_date')}
+    ''')
+
+
+def rebuild_rollups(db):
+    """从工时记录全量重建所有汇总表"""
+    targets = ', '.join(target for _, target in USER_DAILY_FIELDS)
+    sums = ', '.join(f'COALESCE(SUM({source}), 0)' for source, _ in USER_DAILY_FIELDS)
+    db.execute('DELETE FROM rollup_user_daily')
+    db.execute(f'''
+        INSERT INTO rollup_user_daily (user_id, work_date, record_count, {targets})
+        SELECT user_id, work_date, COUNT(*), {sums}
+        FROM timesheet_records
+        GROUP BY user_id, work_date
+    ''')
+    rebuild_department_rollups(db)
+
+
+def remove_user_rollups(db, user_id):
+    """删除用户前清理其汇总数据"""
+    db.execute('DELETE FROM rollup_user_daily WHERE user_id = ?', (user_id,))
+    rebuild_department_rollups(db)
+
+
+def clear_rollups(db):
+    """清空汇总表（清空全部工时记录时调用）"""
+    db.execute('DELETE FROM rollup_user_daily')
+    db.execute('DELETE FROM rollup_department_monthly')
+
+
+def admin_overview_sql(by_department=False):
+    """
+    管理端概览查询（汇总表），返回 (概览汇总和各部门行SQL, 最新5条记录SQL)
+    by_department 为True时两条SQL都多一个部门参数；db_indexes 用同样的SQL检查查询计划
+    """
+    user_scope = 'WHERE department = ?' if by_department else ''
+    department_scope = 'AND department = ?' if by_department else ''
+    overview_sql = f'''
+        WITH scoped_users AS (
+            SELECT id FROM users {user_scope}
+        ),
+        daily AS (
+            SELECT r.work_date, r.record_count, r.total_hours
+            FROM rollup_user_daily r
+            WHERE r.user_id IN (SELECT id FROM scoped_users)
+              AND ((r.work_date >= ? AND r.work_date <= ?) OR r.work_date = ?)
+        ),
+        departments AS (
+            SELECT DISTINCT department FROM users
+            WHERE department IS NOT NULL AND department != '' {department_scope}
+        )
+        SELECT 'summary' as kind,
+               NULL as department,
+               (SELECT COUNT(*) FROM scoped_users) as total_users,
+               COALESCE(SUM(CASE WHEN work_date = ? THEN record_count ELSE 0 END), 0) as today_records,
+               COALESCE(SUM(CASE WHEN work_date >= ? AND work_date <= ? THEN record_count ELSE 0 END), 0) as month_records,
+               COALESCE(SUM(CASE WHEN work_date >= ? AND work_date <= ? THEN total_hours ELSE 0 END), 0) as total_hours,
+               NULL as work_days,
+               NULL as actual_visit_days,
+               NULL as avg_daily_hours
+        FROM daily
+        UNION ALL
+        SELECT 'department',
+               d.department,
+               NULL,
+               NULL,
+               COALESCE(r.record_count, 0),
+               COALESCE(r.total_hours, 0),
+               COALESCE(r.work_days, 0),
+               COALESCE(r.actual_visit_days, 0),
+               ROUND(CAST(r.total_hours / NULLIF(r.actual_visit_days, 0) AS NUMERIC), 2)
+        FROM departments d
+        LEFT JOIN rollup_department_monthly r ON r.department = d.department AND r.month = ?
+        ORDER BY kind DESC, avg_daily_hours DESC
+    '''
+    recent_sql = f'''
+        SELECT t.work_date, t.start_location, t.end_location, t.total_work_hours, t.created_at,
+               u.name as user_name
+        FROM timesheet_records t
+        JOIN users u ON t.user_id = u.id
+        {'WHERE u.department = ?' if by_department else ''}
+        ORDER BY t.created_at DESC
+        LIMIT 5
+    '''
+    return overview_sql, recent_sql
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    if '--rebuild' not in sys.argv:
+        print(__doc__)
+        return 0
+
+    init_database()
+    with get_db_connection() as db:
+        rebuild_rollups(db)
+        db.commit()
+        days = db.execute('SELECT COUNT(*) FROM rollup_user_daily').fetchone()[0]
+        months = db.execute('SELECT COUNT(*) FROM rollup_department_monthly').fetchone()[0]
+    print(f"✅ 汇总表已重建：{days} 条专员日汇总，{months} 条部门月汇总")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
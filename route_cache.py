@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+路线距离缓存模块
+以（起点坐标, 终点坐标, 路线类型, 策略）为键缓存高德路径规划结果，
+数据库表 route_cache 在所有gunicorn worker和重启之间共享，进程内LRU作为前置缓存
+"""
+
+import os
+import json
+import time
+import logging
+
+from database_config import get_db_connection
+from shared_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# 缓存有效期（天）和进程内LRU容量，可通过环境变量调整
+ROUTE_CACHE_TTL = float(os.environ.get('ROUTE_CACHE_TTL_DAYS', 30)) * 86400
+ROUTE_CACHE_MEMORY_SIZE = int(os.environ.get('ROUTE_CACHE_MEMORY_SIZE', 2000))
+
+# 每写入多少次清理一次过期记录
+PURGE_EVERY = 500
+
+# 批量读取时每条SQL最多携带的键数（SQLite默认最多999个参数）
+GET_MANY_CHUNK = 500
+
+
+def normalize_location(coord_str, precision=5):
+    """坐标规范化为 '经度,纬度'，保留5位小数（约1米），避免同一门店因精度不同而未命中"""
+    try:
+        lng, lat = (float(x) for x in str(coord_str).strip().split(','))
+    except (TypeError, ValueError):
+        return str(coord_str or '').strip()
+    return f"{lng:.{precision}f},{lat:.{precision}f}"
+
+
+def make_cache_key(origin, destination, mode, strategy=''):
+    return f"{mode}|{strategy}|{normalize_location(origin)}|{normalize_location(destination)}"
+
+
+class RouteCache:
+    """进程内LRU + 数据库持久化的两级路线缓存"""
+
+    def __init__(self, ttl=ROUTE_CACHE_TTL, memory_size=ROUTE_CACHE_MEMORY_SIZE):
+        self.ttl = ttl
+        self._memory = LRUCache(memory_size, ttl)
+        self._writes = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def get(self, origin, destination, mode, strategy=''):
+        """读取缓存，未命中或已过期返回None"""
+        key = make_cache_key(origin, destination, mode, strategy)
+        value = self._memory.get(key)
+        if value is not None:
+            return value
+
+        try:
+            with get_db_connection() as db:
+                row = db.execute(
+                    'SELECT result, cached_at FROM route_cache WHERE cache_key = ?', (key,)
+                ).fetchone()
+        except Exception as e:
+            logger.warning(f"读取路线缓存失败: {e}")
+            row = None
+
+        remaining = self.ttl - (time.time() - float(row[1])) if row else 0
+        if remaining > 0:
+            value = json.loads(row[0])
+            self._memory.set(key, value, ttl=remaining)
+            self.db_hits += 1
+            return value
+
+        self.misses += 1
+        return None
+
+    def get_many(self, pairs, mode, strategy=''):
+        """
+        批量读取缓存：pairs 为 [(起点, 终点)]，返回 {(起点, 终点): 结果}，未命中或已过期的不在结果中
+        进程内LRU未命中的键用 WHERE cache_key IN (...) 一次查询，避免逐对访问数据库
+        """
+        found = {}
+        pending = {}
+        for origin, destination in pairs:
+            key = make_cache_key(origin, destination, mode, strategy)
+            value = self._memory.get(key)
+            if value is not None:
+                found[(origin, destination)] = value
+            else:
+                pending.setdefault(key, []).append((origin, destination))
+        if not pending:
+            return found
+
+        rows = []
+        keys = list(pending)
+        try:
+            with get_db_connection() as db:
+                for start in range(0, len(keys), GET_MANY_CHUNK):
+                    chunk = keys[start:start + GET_MANY_CHUNK]
+                    rows.extend(db.execute(
+                        f"SELECT cache_key, result, cached_at FROM route_cache "
+                        f"WHERE cache_key IN ({', '.join('?' for _ in chunk)})", chunk
+                    ).fetchall())
+        except Exception as e:
+            logger.warning(f"批量读取路线缓存失败: {e}")
+
+        now = time.time()
+        for key, result, cached_at in rows:
+            remaining = self.ttl - (now - float(cached_at))
+            if remaining <= 0:
+                continue
+            value = json.loads(result)
+            self._memory.set(key, value, ttl=remaining)
+            for pair in pending.pop(key):
+                found[pair] = value
+                self.db_hits += 1
+        self.misses += sum(len(pairs) for pairs in pending.values())
+        return found
+
+    def set(self, origin, destination, mode, strategy, value):
+        """写入缓存（内存和数据库）"""
+        key = make_cache_key(origin, destination, mode, strategy)
+        now = time.time()
+        self._memory.set(key, value)
+
+        try:
+            with get_db_connection() as db:
+                db.execute('''
+                    INSERT OR REPLACE INTO route_cache
+                    (cache_key, origin, destination, mode, strategy, result, cached_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (key, normalize_location(origin), normalize_location(destination),
+                      mode, strategy, json.dumps(value, ensure_ascii=False), now))
+
+                self._writes += 1
+                if self._writes % PURGE_EVERY == 0:
+                    db.execute('DELETE FROM route_cache WHERE cached_at < ?', (now - self.ttl,))
+                db.commit()
+        except Exception as e:
+            logger.warning(f"写入路线缓存失败: {e}")
+
+    def stats(self):
+        memory = self._memory.stats()
+        total = memory['hits'] + self.db_hits + self.misses
+        return {
+            'memory_size': memory['size'],
+            'memory_limit': memory['limit'],
+            'ttl_days': round(self.ttl / 86400, 2),
+            'memory_hits': memory['hits'],
+            'db_hits': self.db_hits,
+            'misses': self.misses,
+            'hit_rate': round((memory['hits'] + self.db_hits) / total, 3) if total else 0,
+        }
+
+
+route_cache = RouteCache()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+巡店顺序优化模块
+根据门店之间的距离矩阵计算一天内较优的巡店顺序：
+站点较少时使用动态规划求精确解，较多时使用最近邻 + 2-opt 启发式
+"""
+
+from spatial_index import haversine_distance
+
+# 直线距离换算为道路距离的经验系数（无缓存路线时使用）
+ROAD_DETOUR_FACTOR = 1.3
+
+# 不超过该站点数时使用精确动态规划（状态数 2^n * n）
+EXACT_MAX_STOPS = 10
+
+
+def build_distance_matrix(points, lookup=None):
+    """
+    构建距离矩阵（公里）
+    points 为 [(经度, 纬度)]；lookup(i, j) 可返回已缓存的真实道路距离，返回None时用直线距离估算
+    返回 (矩阵, 使用真实距离的路段数)
+    """
+    n = len(points)
+    matrix = [[0.0] * n for _ in range(n)]
+    real_legs = 0
+    for i in range(n):
+        for j in range(n):
+            if i == j:
+                continue
+            distance = lookup(i, j) if lookup else None
+            if distance is None:
+                lng1, lat1 = points[i]
+                lng2, lat2 = points[j]
+                distance = haversine_distance(lat1, lng1, lat2, lng2) * ROAD_DETOUR_FACTOR
+            else:
+                real_legs += 1
+            matrix[i][j] = distance
+    return matrix, real_legs
+
+
+def route_length(matrix, order, return_to_start=False):
+    """按顺序访问的总距离"""
+    total = sum(matrix[a][b] for a, b in zip(order, order[1:]))
+    if return_to_start and len(order) > 1:
+        total += matrix[order[-1]][order[0]]
+    return total
+
+
+def solve_exact(matrix, return_to_start=False):
+    """Held-Karp动态规划，起点固定为0，返回最优访问顺序"""
+    n = len(matrix)
+    if n <= 2:
+        return list(range(n))
+
+    full = (1 << n) - 1
+    INF = float('inf')
+    # dp[mask][j]: 从0出发、访问过mask中所有站点、停在j的最短距离
+    dp = [[INF] * n for _ in range(1 << n)]
+    parent = [[-1] * n for _ in range(1 << n)]
+    dp[1][0] = 0.0
+    for mask in range(1, 1 << n, 2):  # 只考虑包含起点的状态
+        row = dp[mask]
+        for j in range(n):
+            cost = row[j]
+            if cost == INF or not (mask >> j) & 1:
+                continue
+            for k in range(1, n):
+                if (mask >> k) & 1:
+                    continue
+                next_mask = mask | (1 << k)
+                new_cost = cost + matrix[j][k]
+                if new_cost < dp[next_mask][k]:
+                    dp[next_mask][k] = new_cost
+                    parent[next_mask][k] = j
+
+    last = min(range(1, n), key=lambda j: dp[full][j] + (matrix[j][0] if return_to_start else 0))
+    order = []
+    mask = full
+    while last != -1:
+        order.append(last)
+        prev = parent[mask][last]
+        mask ^= 1 << last
+        last = prev
+    return order[::-1]
+
+
+def nearest_neighbour(matrix):
+    """最近邻构造初始顺序，起点固定为0"""
+    n = len(matrix)
+    order = [0]
+    remaining = set(range(1, n))
+    while remaining:
+        current = order[-1]
+        nxt = min(remaining, key=lambda k: matrix[current][k])
+        order.append(nxt)
+        remaining.remove(nxt)
+    return order
+
+
+def two_opt(matrix, order, return_to_start=False):
+    """2-opt局部优化：反转区间直到无法继续缩短（起点保持不动）"""
+    best = list(order)
+    best_length = route_length(matrix, best, return_to_start)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, len(best) - 1):
+            for j in range(i + 1, len(best)):
+                candidate = best[:i] + best[i:j + 1][::-1] + best[j + 1:]
+                length = route_length(matrix, candidate, return_to_start)
+                if length < best_length - 1e-9:
+                    best, best_length = candidate, length
+                    improved = True
+    return best
+
+
+def optimize_order(matrix, return_to_start=False):
+    """
+    计算较优访问顺序（起点固定为第一个站点）
+    返回 (顺序, 使用的方法)
+    """
+    if len(matrix) <= EXACT_MAX_STOPS:
+        return solve_exact(matrix, return_to_start), 'exact'
+    order = nearest_neighbour(matrix)
+    return two_opt(matrix, order, return_to_start), 'nearest_neighbour+2opt'
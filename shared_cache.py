@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+共享缓存模块
+进程内LRU+TTL缓存，以及可跨gunicorn worker共享的持久化存储（SQLite文件），
+用于缓存腾讯/高德地图的搜索结果，重启后依然有效
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# 缓存后端配置：sqlite（默认，跨进程共享）或 memory（仅当前进程）
+API_CACHE_BACKEND = os.environ.get('API_CACHE_BACKEND', 'sqlite')
+API_CACHE_PATH = os.environ.get('API_CACHE_PATH', 'api_cache.db')
+
+# 每个进程每写入多少次检查一次容量并淘汰
+EVICT_EVERY = 50
+
+
+class LRUCache:
+    """线程安全的进程内LRU缓存，条目超过ttl秒视为过期"""
+
+    def __init__(self, maxsize=1000, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (过期时间, 值)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                if entry[0] is None or entry[0] > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'limit': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 3) if total else 0,
+        }
+
+
+class MemoryCacheStore:
+    """进程内存储（不跨进程共享），用于单进程运行或测试"""
+
+    def __init__(self):
+        self._namespaces = {}
+        self._lock = threading.Lock()
+
+    def _cache(self, namespace, maxsize=None):
+        with self._lock:
+            cache = self._namespaces.get(namespace)
+            if cache is None:
+                cache = self._namespaces[namespace] = LRUCache(maxsize or 1000)
+            elif maxsize:
+                cache.maxsize = maxsize
+            return cache
+
+    def get(self, namespace, key):
+        return self._cache(namespace).get(key)
+
+    def set(self, namespace, key, value, ttl=None, maxsize=None):
+        self._cache(namespace, maxsize).set(key, value, ttl)
+
+    def size(self, namespace):
+        return len(self._cache(namespace))
+
+    def clear(self, namespace):
+        self._cache(namespace).clear()
+
+
+class SQLiteCacheStore:
+    """
+    SQLite文件存储，同一主机上的所有worker共享
+    容量按最近访问时间近似淘汰（每个进程每EVICT_EVERY次写入检查一次）
+    """
+
+    # 最近访问时间的刷新间隔，避免每次读取都产生写操作
+    TOUCH_INTERVAL = 60
+
+    def __init__(self, path=API_CACHE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        pid = getattr(self._local, 'pid', None)
+        if conn is None or pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    expires_at REAL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )
+            ''')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_cache_entries_access
+                ON cache_entries (namespace, last_access)
+            ''')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, namespace, key):
+        conn = self._conn()
+        row = conn.execute(
+            'SELECT value, expires_at, last_access FROM cache_entries WHERE namespace = ? AND key = ?',
+            (namespace, key)
+        ).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if row[1] is not None and row[1] <= now:
+            conn.execute('DELETE FROM cache_entries WHERE namespace = ? AND key = ?', (namespace, key))
+            return None
+        if now - row[2] > self.TOUCH_INTERVAL:
+            conn.execute(
+                'UPDATE cache_entries SET last_access = ? WHERE namespace = ? AND key = ?',
+                (now, namespace, key)
+            )
+        return json.loads(row[0])
+
+    def set(self, namespace, key, value, ttl=None, maxsize=None):
+        conn = self._conn()
+        now = time.time()
+        conn.execute(
+            'INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at, last_access) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (namespace, key, json.dumps(value, ensure_ascii=False), now + ttl if ttl else None, now)
+        )
+        self._writes += 1
+        if maxsize and self._writes % EVICT_EVERY == 0:
+            self.evict(namespace, maxsize)
+
+    def evict(self, namespace, maxsize):
+        """删除过期条目，并按最近访问时间淘汰超出容量的条目"""
+        conn = self._conn()
+        conn.execute(
+            'DELETE FROM cache_entries WHERE namespace = ? AND expires_at IS NOT NULL AND expires_at <= ?',
+            (namespace, time.time())
+        )
+        excess = self.size(namespace) - maxsize
+        if excess > 0:
+            conn.execute('''
+                DELETE FROM cache_entries WHERE namespace = ? AND key IN (
+                    SELECT key FROM cache_entries WHERE namespace = ?
+                    ORDER BY last_access ASC LIMIT ?
+                )
+            ''', (namespace, namespace, excess))
+
+    def size(self, namespace):
+        return self._conn().execute(
+            'SELECT COUNT(*) FROM cache_entries WHERE namespace = ?', (namespace,)
+        ).fetchone()[0]
+
+    def clear(self, namespace):
+        self._conn().execute('DELETE FROM cache_entries WHERE namespace = ?', (namespace,))
+
+
+def create_store(backend=API_CACHE_BACKEND):
+    if backend == 'memory':
+        return MemoryCacheStore()
+    return SQLiteCacheStore()
+
+
+_default_store = None
+
+
+def get_default_store():
+    global _default_store
+    if _default_store is None:
+        _default_store = create_store()
+    return _default_store
+
+
+class SharedCache:
+    """
+    两级缓存：进程内LRU在前，共享存储在后
+    共享存储不可用时自动退化为仅进程内缓存，不影响业务请求
+    """
+
+    def __init__(self, namespace, maxsize=1000, ttl=86400, local_size=200, store=None):
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._local = LRUCache(min(local_size, maxsize), ttl)
+        self._store = store
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = get_default_store()
+        return self._store
+
+    def get(self, key, default=None):
+        value = self._local.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        try:
+            value = self.store.get(self.namespace, key)
+        except Exception as e:
+            logger.warning(f"读取共享缓存失败({self.namespace}): {e}")
+            value = None
+        if value is not None:
+            self._local.set(key, value)
+            self.hits += 1
+            self.shared_hits += 1
+            return value
+        self.misses += 1
+        return default
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        self._local.set(key, value, ttl)
+        try:
+            self.store.set(self.namespace, key, value, ttl=ttl, maxsize=self.maxsize)
+        except Exception as e:
+            logger.warning(f"写入共享缓存失败({self.namespace}): {e}")
+
+    def size(self):
+        try:
+            return self.store.size(self.namespace)
+        except Exception:
+            return len(self._local)
+
+    def clear(self):
+        self._local.clear()
+        try:
+            self.store.clear(self.namespace)
+        except Exception as e:
+            logger.warning(f"清空共享缓存失败({self.namespace}): {e}")
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'namespace': self.namespace,
+            'size': self.size(),
+            'limit': self.maxsize,
+            'ttl_seconds': self.ttl,
+            'hits': self.hits,
+            'shared_hits': self.shared_hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 3) if total else 0,
+            'worker_pid': os.getpid(),
+        }
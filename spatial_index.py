@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+空间索引模块
+基于经纬度网格的最近邻/半径查询，用于"附近门店"等场景
+"""
+
+import math
+import heapq
+
+EARTH_RADIUS_KM = 6371
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180  # 约111.19公里
+
+
+def haversine_distance(lat1, lon1, lat2, lon2):
+    """计算两点间的直线距离（公里）"""
+    R = EARTH_RADIUS_KM  # 地球半径（公里）
+
+    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+
+    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
+    c = 2 * math.asin(math.sqrt(a))
+
+    return R * c
+
+
+class GridIndex:
+    """
+    等经纬度网格索引
+    每个网格约 cell_size 度见方（默认0.05度，约5公里），查询时由近及远逐圈扫描
+    """
+
+    def __init__(self, points=None, cell_size=0.05):
+        self.cell_size = cell_size
+        self._cells = {}
+        self._count = 0
+        self._min_row = self._max_row = self._min_col = self._max_col = 0
+        for lat, lng, item in points or []:
+            self.add(lat, lng, item)
+
+    def __len__(self):
+        return self._count
+
+    def _cell(self, lat, lng):
+        return int(math.floor(lat / self.cell_size)), int(math.floor(lng / self.cell_size))
+
+    def add(self, lat, lng, item):
+        row, col = self._cell(lat, lng)
+        if self._count == 0:
+            self._min_row = self._max_row = row
+            self._min_col = self._max_col = col
+        else:
+            self._min_row = min(self._min_row, row)
+            self._max_row = max(self._max_row, row)
+            self._min_col = min(self._min_col, col)
+            self._max_col = max(self._max_col, col)
+        self._cells.setdefault((row, col), []).append((lat, lng, item))
+        self._count += 1
+
+    def _ring(self, row, col, r):
+        """返回与中心网格切比雪夫距离恰为r的一圈网格中的点（只扫描有数据的网格范围）"""
+        cells = self._cells
+        if r == 0:
+            yield from cells.get((row, col), ())
+            return
+        min_row, max_row, min_col, max_col = self._min_row, self._max_row, self._min_col, self._max_col
+        cols = range(max(col - r, min_col), min(col + r, max_col) + 1)
+        for rr in (row - r, row + r):
+            if min_row <= rr <= max_row:
+                for c in cols:
+                    yield from cells.get((rr, c), ())
+        rows = range(max(row - r + 1, min_row), min(row + r - 1, max_row) + 1)
+        for cc in (col - r, col + r):
+            if min_col <= cc <= max_col:
+                for rr in rows:
+                    yield from cells.get((rr, cc), ())
+
+    def _ring_gap_km(self, lat, r):
+        """已扫描0..r圈后，未扫描区域与查询点的最小可能距离（保守估计）"""
+        if r <= 0:
+            return 0.0
+        # 未扫描的点纬度不会超出有数据的网格范围
+        grid_lat = max(abs(self._min_row * self.cell_size), abs((self._max_row + 1) * self.cell_size))
+        far_lat = min(89.9, abs(lat) + (r + 1) * self.cell_size, max(abs(lat), grid_lat))
+        lat_gap = r * self.cell_size * KM_PER_DEGREE
+        lng_gap = r * self.cell_size * KM_PER_DEGREE * math.cos(math.radians(far_lat))
+        return 0.99 * min(lat_gap, lng_gap)
+
+    def _max_ring(self, row, col):
+        return max(row - self._min_row, self._max_row - row,
+                   col - self._min_col, self._max_col - col, 0)
+
+    def _min_ring(self, row, col):
+        """查询点到有数据的网格范围的圈数，更近的圈都是空的"""
+        return max(self._min_row - row, row - self._max_row,
+                   self._min_col - col, col - self._max_col, 0)
+
+    def nearest(self, lat, lng, k=5, max_km=None, exclude=None):
+        """
+        查询距离最近的k个点
+        返回 [(距离km, item)]，按距离升序；exclude 为需要排除的item判定函数
+        逐圈扫描到 max_km 或有数据的网格边缘为止，坐标不是有限数时返回空列表
+        """
+        if self._count == 0 or k <= 0 or not (math.isfinite(lat) and math.isfinite(lng)):
+            return []
+        row, col = self._cell(lat, lng)
+        max_ring = self._max_ring(row, col)
+        heap = []  # 最大堆（距离取负），保留当前最近的k个
+        r = self._min_ring(row, col)
+        if max_km is not None and self._ring_gap_km(lat, r - 1) > max_km:
+            return []
+        while r <= max_ring:
+            for p_lat, p_lng, item in self._ring(row, col, r):
+                if exclude is not None and exclude(item):
+                    continue
+                dist = haversine_distance(lat, lng, p_lat, p_lng)
+                if max_km is not None and dist > max_km:
+                    continue
+                if len(heap) < k:
+                    heapq.heappush(heap, (-dist, id(item), item))
+                elif dist < -heap[0][0]:
+                    heapq.heapreplace(heap, (-dist, id(item), item))
+            gap = self._ring_gap_km(lat, r)
+            if max_km is not None and gap > max_km:
+                break
+            if len(heap) >= k and -heap[0][0] <= gap:
+                break
+            r += 1
+        return sorted(((-d, item) for d, _, item in heap), key=lambda x: x[0])
+
+    def within(self, lat, lng, radius_km, limit=None, exclude=None):
+        """查询半径radius_km内的所有点，返回 [(距离km, item)]，按距离升序"""
+        if self._count == 0 or radius_km <= 0 or not (math.isfinite(lat) and math.isfinite(lng)):
+            return []
+        row, col = self._cell(lat, lng)
+        far_lat = min(89.9, abs(lat) + radius_km / KM_PER_DEGREE)
+        lat_cells = int(math.ceil(radius_km / (self.cell_size * KM_PER_DEGREE)))
+        lng_cells = int(math.ceil(
+            radius_km / (self.cell_size * KM_PER_DEGREE * max(math.cos(math.radians(far_lat)), 0.01))
+        ))
+        results = []
+        cells = self._cells
+        # 扫描范围限制在有数据的网格范围内
+        for rr in range(max(row - lat_cells, self._min_row), min(row + lat_cells, self._max_row) + 1):
+            for cc in range(max(col - lng_cells, self._min_col), min(col + lng_cells, self._max_col) + 1):
+                for p_lat, p_lng, item in cells.get((rr, cc), ()):
+                    if exclude is not None and exclude(item):
+                        continue
+                    dist = haversine_distance(lat, lng, p_lat, p_lng)
+                    if dist <= radius_km:
+                        results.append((dist, item))
+        results.sort(key=lambda x: x[0])
+        return results[:limit] if limit else results
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+门店主数据导入脚本
+流式读取 门店信息导入模板.xlsx，校验坐标后分批写入 stores 表（支持SQLite和PostgreSQL）
+使用方法：python store_importer.py [xlsx路径] [--batch-size 2000]
+"""
+
+import sys
+import time
+import logging
+import argparse
+
+from database_config import get_db_connection, init_database, USE_POSTGRESQL
+from store_index import STORE_MASTER_XLSX, XLSX_COLUMNS, make_store
+from xlsx_reader import iter_xlsx_rows
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 2000
+
+STORE_FIELDS = ('store_code', 'name', 'city', 'longitude', 'latitude', 'address')
+
+SQLITE_UPSERT = '''
+    INSERT INTO stores (store_code, name, city, longitude, latitude, address, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT(store_code) DO UPDATE SET
+        name = excluded.name,
+        city = excluded.city,
+        longitude = excluded.longitude,
+        latitude = excluded.latitude,
+        address = excluded.address,
+        updated_at = CURRENT_TIMESTAMP
+'''
+
+POSTGRES_UPSERT = '''
+    INSERT INTO stores (store_code, name, city, longitude, latitude, address, updated_at)
+    VALUES %s
+    ON CONFLICT (store_code) DO UPDATE SET
+        name = EXCLUDED.name,
+        city = EXCLUDED.city,
+        longitude = EXCLUDED.longitude,
+        latitude = EXCLUDED.latitude,
+        address = EXCLUDED.address,
+        updated_at = CURRENT_TIMESTAMP
+'''
+
+
+def _load_existing(cursor):
+    """读取已有门店的字段快照，用于区分新增/更新/未变化"""
+    cursor.execute('SELECT store_code, name, city, longitude, latitude, address FROM stores')
+    existing = {}
+    for row in cursor.fetchall():
+        row = tuple(row)
+        existing[row[0]] = (row[1], row[2] or '', float(row[3]), float(row[4]), row[5] or '')
+    return existing
+
+
+def _write_batch(cursor, batch):
+    if not batch:
+        return
+    if USE_POSTGRESQL:
+        from psycopg2.extras import execute_values
+        execute_values(cursor, POSTGRES_UPSERT, batch,
+                       template='(%s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)',
+                       page_size=len(batch))
+    else:
+        cursor.executemany(SQLITE_UPSERT, batch)
+
+
+def import_stores(path=STORE_MASTER_XLSX, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    导入门店主数据
+    返回统计信息：inserted / updated / unchanged / rejected 以及拒绝原因示例
+    """
+    started = time.time()
+    stats = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'rejected': 0, 'errors': []}
+
+    rows = iter_xlsx_rows(path)
+    try:
+        headers = [h.strip() for h in next(rows)]
+    except StopIteration:
+        return stats
+
+    missing = [title for title in XLSX_COLUMNS.values() if title not in headers]
+    if missing:
+        raise ValueError(f"表格缺少必要列: {', '.join(missing)}")
+    positions = [headers.index(XLSX_COLUMNS[field]) for field in STORE_FIELDS]
+
+    def reject(row_number, reason):
+        stats['rejected'] += 1
+        if len(stats['errors']) < 20:
+            stats['errors'].append({'row': row_number, 'reason': reason})
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        existing = _load_existing(cursor)
+        seen = set()
+        batch = []
+
+        for row_number, row in enumerate(rows, start=2):
+            values = [row[i] if i < len(row) else '' for i in positions]
+            if not any(str(v).strip() for v in values):
+                continue
+
+            store = make_store(*values)
+            if store is None:
+                reject(row_number, '名称为空或经纬度无效')
+                continue
+            code = store['store_code']
+            if not code:
+                reject(row_number, '门店编码为空')
+                continue
+            if code in seen:
+                reject(row_number, f'门店编码重复: {code}')
+                continue
+            seen.add(code)
+
+            snapshot = (store['name'], store['city'], store['longitude'],
+                        store['latitude'], store['address'])
+            previous = existing.get(code)
+            if previous == snapshot:
+                stats['unchanged'] += 1
+                continue
+            stats['updated' if previous else 'inserted'] += 1
+
+            batch.append(tuple(store[field] for field in STORE_FIELDS))
+            if len(batch) >= batch_size:
+                _write_batch(cursor, batch)
+                batch = []
+
+        _write_batch(cursor, batch)
+        conn.commit()
+
+    stats['elapsed'] = round(time.time() - started, 2)
+    logger.info(
+        f"门店导入完成: 新增{stats['inserted']} 更新{stats['updated']} "
+        f"未变化{stats['unchanged']} 拒绝{stats['rejected']} 用时{stats['elapsed']}s"
+    )
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='导入门店主数据到 stores 表')
+    parser.add_argument('path', nargs='?', default=STORE_MASTER_XLSX, help='门店信息xlsx文件路径')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='每批写入行数')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    init_database()
+
+    print(f"🔄 开始导入门店数据: {args.path}")
+    try:
+        stats = import_stores(args.path, batch_size=args.batch_size)
+    except Exception as e:
+        print(f"❌ 导入失败: {e}")
+        return 1
+
+    print(f"✅ 导入完成，用时 {stats.get('elapsed', 0)} 秒")
+    print(f"➕ 新增: {stats['inserted']}")
+    print(f"✏️  更新: {stats['updated']}")
+    print(f"⏸️  未变化: {stats['unchanged']}")
+    print(f"⚠️  拒绝: {stats['rejected']}")
+    for error in stats['errors']:
+        print(f"   第{error['row']}行: {error['reason']}")
+    print("💡 运行中的服务需调用 /api/admin/refresh_store_index 重新加载门店索引")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
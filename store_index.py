@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+门店本地索引模块
+从门店主数据（门店信息导入模板.xlsx 或 stores 表）构建进程内索引，
+支持门店编码、名称精确/前缀/模糊匹配，避免每次搜索都调用高德/腾讯地图API
+"""
+
+import os
+import re
+import bisect
+import logging
+import threading
+
+from spatial_index import GridIndex
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STORE_MASTER_XLSX = os.environ.get(
+    'STORE_MASTER_XLSX', os.path.join(BASE_DIR, '门店信息导入模板.xlsx')
+)
+
+# 门店主数据表头
+XLSX_COLUMNS = {
+    'store_code': '门店编码',
+    'name': '门店名称',
+    'city': '门店城市',
+    'longitude': '经度',
+    'latitude': '纬度',
+    'address': '地址',
+}
+
+# 门店坐标的合理范围（中国境内的经度、纬度）
+LONGITUDE_RANGE = (73, 136)
+LATITUDE_RANGE = (3, 54)
+
+# 附近门店查询未指定半径时的最大搜索距离（公里）
+NEARBY_MAX_KM = 500
+
+# 本地结果达到该分数即视为"好结果"，不再请求地图API
+LOCAL_HIT_SCORE = 80.0
+
+# 用户输入中常带的品牌前缀，门店主数据中的名称不含品牌
+BRAND_PREFIXES = ['古茗']
+
+_STRIP_RE = re.compile(r'[\s()（）\-_·,，。.]+')
+
+
+def normalize_text(text):
+    """统一大小写并去掉空白和常见标点"""
+    return _STRIP_RE.sub('', str(text or '')).lower()
+
+
+def normalize_query(keyword):
+    """规范化搜索关键词：去掉品牌前缀、空白和标点"""
+    query = normalize_text(keyword)
+    for brand in BRAND_PREFIXES:
+        if query.startswith(brand) and len(query) > len(brand):
+            query = query[len(brand):]
+    return query
+
+
+def normalize_city(city):
+    """城市名规范化（'淮安市' 与 '淮安' 视为相同）"""
+    city = normalize_text(city)
+    if city.endswith('市') and len(city) > 2:
+        city = city[:-1]
+    return city
+
+
+def _bigrams(text):
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class StoreIndex:
+    """门店内存索引（构建后只读，替换整个实例实现刷新）"""
+
+    def __init__(self, stores=None, source=''):
+        self.source = source
+        self.stores = []          # [{store_code, name, city, longitude, latitude, address}]
+        self._norm_names = []     # 与stores对齐的规范化名称
+        self._norm_cities = []
+        self._by_code = {}
+        self._by_name = {}
+        self._sorted_names = []   # [(规范化名称, 门店下标)]，用于前缀查找
+        self._postings = {}       # 二元组 -> 门店下标集合
+        self._grid = GridIndex()  # 门店坐标网格，用于附近门店查询
+        for store in stores or []:
+            self._add(store)
+        self._sorted_names.sort()
+
+    def _add(self, store):
+        idx = len(self.stores)
+        self.stores.append(store)
+        norm_name = normalize_query(store['name'])
+        self._norm_names.append(norm_name)
+        self._norm_cities.append(normalize_city(store.get('city')))
+        if store.get('store_code'):
+            self._by_code[str(store['store_code'])] = idx
+        self._by_name.setdefault(norm_name, []).append(idx)
+        self._sorted_names.append((norm_name, idx))
+        for gram in _bigrams(norm_name):
+            self._postings.setdefault(gram, set()).add(idx)
+        self._grid.add(store['latitude'], store['longitude'], store)
+
+    def __len__(self):
+        return len(self.stores)
+
+    def get(self, store_code):
+        """按门店编码获取门店"""
+        idx = self._by_code.get(str(store_code).strip())
+        return self.stores[idx] if idx is not None else None
+
+    def _prefix_matches(self, query):
+        start = bisect.bisect_left(self._sorted_names, (query, -1))
+        for name, idx in self._sorted_names[start:]:
+            if not name.startswith(query):
+                break
+            yield idx
+
+    def _substring_matches(self, query):
+        grams = _bigrams(query)
+        postings = [self._postings.get(g) for g in grams]
+        if not postings or any(p is None for p in postings):
+            return set()
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for p in postings[1:]:
+            candidates &= p
+            if not candidates:
+                return candidates
+        return {idx for idx in candidates if query in self._norm_names[idx]}
+
+    def _fuzzy_matches(self, query):
+        """按二元组重合度（Dice系数）打分，返回 {下标: 系数}"""
+        grams = _bigrams(query)
+        counts = {}
+        for g in grams:
+            for idx in self._postings.get(g, ()):
+                counts[idx] = counts.get(idx, 0) + 1
+        scored = {}
+        for idx, common in counts.items():
+            dice = 2.0 * common / (len(grams) + len(_bigrams(self._norm_names[idx])))
+            if dice >= 0.5:
+                scored[idx] = dice
+        return scored
+
+    def search(self, keyword, city=None, limit=8):
+        """
+        搜索门店，返回按相关性排序的 [(分数, 门店)]
+        分数与 calculate_relevance_score 同一量级：编码/名称精确 >= 150，前缀 120，包含 100，模糊 < 100
+        """
+        raw = str(keyword or '').strip()
+        query = normalize_query(raw)
+        if len(query) < 2:
+            return []
+
+        scores = {}
+
+        def hit(idx, score):
+            if score > scores.get(idx, 0):
+                scores[idx] = score
+
+        if raw in self._by_code:
+            hit(self._by_code[raw], 200.0)
+
+        for variant in {query, query.rstrip('店')}:
+            for idx in self._by_name.get(variant, ()):
+                hit(idx, 150.0)
+            for idx in self._by_name.get(variant + '店', ()):
+                hit(idx, 150.0)
+
+        for idx in self._prefix_matches(query):
+            hit(idx, 120.0)
+
+        for idx in self._substring_matches(query):
+            hit(idx, 100.0)
+
+        if not scores:
+            for idx, dice in self._fuzzy_matches(query).items():
+                hit(idx, round(100.0 * dice, 2))
+
+        city_key = normalize_city(city) if city else ''
+        results = []
+        for idx, score in scores.items():
+            if city_key and not self._norm_cities[idx].startswith(city_key):
+                continue
+            # 名称越短越接近关键词本身，作为同分时的次级排序
+            results.append((score, -len(self._norm_names[idx]), idx))
+        results.sort(reverse=True)
+        return [(score, self.stores[idx]) for score, _, idx in results[:limit]]
+
+    def nearby(self, longitude, latitude, k=5, radius_km=None, exclude_code=None):
+        """
+        查询坐标附近的门店，返回 [(距离km, 门店)]
+        指定radius_km时返回半径内的门店（最多k个），否则返回最近的k个
+        """
+        exclude = None
+        if exclude_code:
+            exclude_code = str(exclude_code)
+            exclude = lambda store: store.get('store_code') == exclude_code
+        if radius_km:
+            return self._grid.within(latitude, longitude, radius_km, limit=k, exclude=exclude)
+        return self._grid.nearest(latitude, longitude, k=k, max_km=NEARBY_MAX_KM, exclude=exclude)
+
+
+def store_to_location(store, score):
+    """将门店转换为与地图API搜索结果一致的结构"""
+    city = store.get('city') or ''
+    address = store.get('address') or ''
+    return {
+        'name': store['name'],
+        'address': address or city,
+        'full_address': f"{city} {address}".strip(),
+        'location': f"{store['longitude']},{store['latitude']}",
+        'cityname': city,
+        'adname': '',
+        'pname': '',
+        'store_code': store.get('store_code', ''),
+        'relevance_score': score,
+        'source': 'local',
+    }
+
+
+def _parse_coordinate(value, low, high):
+    try:
+        number = float(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+    return number if low <= number <= high else None
+
+
+def parse_coordinates(longitude, latitude):
+    """解析并校验经纬度（有限数且在门店坐标范围内），返回 (经度, 纬度)，无效时返回None"""
+    lng = _parse_coordinate(longitude, *LONGITUDE_RANGE)
+    lat = _parse_coordinate(latitude, *LATITUDE_RANGE)
+    if lng is None or lat is None:
+        return None
+    return lng, lat
+
+
+def make_store(store_code, name, city, longitude, latitude, address=''):
+    """校验并构造门店记录，坐标无效时返回None"""
+    name = str(name or '').strip()
+    coordinates = parse_coordinates(longitude, latitude)
+    if not name or coordinates is None:
+        return None
+    lng, lat = coordinates
+    return {
+        'store_code': str(store_code or '').strip(),
+        'name': name,
+        'city': str(city or '').strip(),
+        'longitude': lng,
+        'latitude': lat,
+        'address': str(address or '').strip(),
+    }
+
+
+def load_stores_from_xlsx(path=STORE_MASTER_XLSX):
+    """从门店主数据表格读取门店列表"""
+    from xlsx_reader import iter_xlsx_dicts
+
+    stores = []
+    for row in iter_xlsx_dicts(path):
+        store = make_store(*(row.get(XLSX_COLUMNS[key], '') for key in
+                             ('store_code', 'name', 'city', 'longitude', 'latitude', 'address')))
+        if store:
+            stores.append(store)
+    return stores
+
+
+def load_stores_from_db():
+    """从 stores 表读取门店列表"""
+    from database_config import get_db_connection
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT store_code, name, city, longitude, latitude, address FROM stores'
+        )
+        rows = cursor.fetchall()
+    return [s for s in (make_store(*tuple(row)) for row in rows) if s]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def build_store_index():
+    """优先从数据库构建索引，表为空或不可用时读取表格文件"""
+    try:
+        stores = load_stores_from_db()
+        if stores:
+            logger.info(f"门店索引: 从数据库加载 {len(stores)} 家门店")
+            return StoreIndex(stores, source='database')
+    except Exception as e:
+        logger.warning(f"从数据库加载门店失败，改用表格文件: {e}")
+
+    if os.path.exists(STORE_MASTER_XLSX):
+        try:
+            stores = load_stores_from_xlsx()
+            logger.info(f"门店索引: 从表格加载 {len(stores)} 家门店")
+            return StoreIndex(stores, source='xlsx')
+        except Exception as e:
+            logger.error(f"读取门店表格失败: {e}")
+    else:
+        logger.warning(f"门店主数据文件不存在: {STORE_MASTER_XLSX}")
+    return StoreIndex([], source='empty')
+
+
+def get_store_index():
+    """获取门店索引（首次调用时加载）"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = build_store_index()
+    return _index
+
+
+def refresh_store_index():
+    """重新加载门店索引，加载完成后原子替换"""
+    global _index
+    new_index = build_store_index()
+    with _index_lock:
+        _index = new_index
+    return new_index
+
+
+def search_local_stores(keyword, city=None, limit=8):
+    """在本地门店索引中搜索，返回地图搜索结果格式的列表"""
+    return [store_to_location(store, score)
+            for score, store in get_store_index().search(keyword, city=city, limit=limit)]
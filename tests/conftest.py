@@ -0,0 +1,64 @@
+"""
+测试公共配置
+测试在临时目录中的SQLite数据库上运行（忽略 DATABASE_URL），每个用例开始前清空业务表
+运行: python -m pytest tests
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.pop('DATABASE_URL', None)
+# SQLite数据库路径是相对路径，切换到临时目录避免改动项目中的 timesheet.db
+os.chdir(tempfile.mkdtemp(prefix='timesheet-tests-'))
+
+from database_config import get_db_connection, init_database  # noqa: E402
+
+DATA_TABLES = (
+    'timesheet_records', 'user_monthly_defaults', 'users',
+    'rollup_user_daily', 'rollup_department_monthly', 'backup_tombstones', 'route_cache', 'api_usage_daily',
+    'export_jobs',
+)
+
+
+@pytest.fixture
+def clean_db():
+    """清空业务表，返回 add_user(id, department, role) 用于插入测试用户"""
+    init_database()
+    with get_db_connection() as db:
+        for table in DATA_TABLES:
+            db.execute(f'DELETE FROM {table}')
+        db.commit()
+
+    def add_user(user_id, department='一组', role='specialist'):
+        with get_db_connection() as db:
+            db.execute(
+                'INSERT INTO users (id, username, password, name, role, department) VALUES (?, ?, ?, ?, ?, ?)',
+                (user_id, f'u{user_id}', 'x', f'用户{user_id}', role, department)
+            )
+            db.commit()
+
+    return add_user
+
+
+@pytest.fixture
+def login():
+    """login(user_id, role, department) 返回已登录的测试客户端"""
+    from app_clean import app
+    app.config['TESTING'] = True
+
+    def make_client(user_id, role='specialist', department='一组'):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = user_id
+            session['role'] = role
+            session['username'] = f'u{user_id}'
+            session['name'] = f'用户{user_id}'
+            session['department'] = department
+        return client
+
+    return make_client
@@ -0,0 +1,127 @@
+import time
+import random
+from datetime import datetime
+
+import pytest
+
+from database_config import get_db_connection
+from rollups import rebuild_rollups
+
+MONTH = '2025-03'
+
+
+@pytest.fixture
+def overview_cache():
+    from app_clean import admin_overview_cache
+    admin_overview_cache.clear()
+    yield admin_overview_cache
+    admin_overview_cache.clear()
+
+
+def seed_records(clean_db):
+    """三个专员分属两个部门，另有一条今天的记录和一条其他月份的记录；返回插入的记录"""
+    clean_db(1)
+    clean_db(2)
+    clean_db(3, department='二组')
+    clean_db(9, department='', role='admin')
+    rng = random.Random(7)
+    records = [{
+        'user_id': rng.choice([1, 2, 3]),
+        'work_date': f'{MONTH}-{rng.randint(1, 20):02d}',
+        'actual_visit_days': rng.choice([0, 1, 1, 2]),
+        'total_work_hours': rng.randint(1, 40) / 4,
+        'start_location': f'起点{i}',
+        'created_at': f'2025-04-01 08:{i:02d}:00',
+    } for i in range(40)]
+    records.append(dict(records[0], work_date=datetime.now().strftime('%Y-%m-%d'), created_at='2025-04-02 09:00:00'))
+    records.append(dict(records[1], work_date='2025-04-01', created_at='2025-04-02 09:01:00'))
+
+    columns = list(records[0])
+    with get_db_connection() as db:
+        db.executemany(
+            f"INSERT INTO timesheet_records ({', '.join(columns)}, audit_store_count) "
+            f"VALUES ({', '.join('?' for _ in columns)}, 1)",
+            [tuple(r[c] for c in columns) for r in records]
+        )
+        rebuild_rollups(db)
+        db.commit()
+    return records
+
+
+def expected_overview(records, users, departments):
+    """直接由工时记录计算概览（与汇总表无关），作为对照"""
+    today = datetime.now().strftime('%Y-%m-%d')
+    scoped = [r for r in records if r['user_id'] in users]
+    month = [r for r in scoped if r['work_date'].startswith(MONTH)]
+    dept_stats = {}
+    for department, members in departments.items():
+        rows = [r for r in records if r['user_id'] in members and r['work_date'].startswith(MONTH)]
+        visit_days = sum(r['actual_visit_days'] for r in rows)
+        hours = sum(r['total_work_hours'] for r in rows)
+        dept_stats[department] = {
+            'department': department,
+            'work_days': len({r['work_date'] for r in rows}),
+            'actual_visit_days': visit_days,
+            'total_hours': pytest.approx(hours),
+            'avg_daily_hours': pytest.approx(round(hours / visit_days, 2) if visit_days else 0),
+        }
+    recent = sorted(scoped, key=lambda r: r['created_at'], reverse=True)[:5]
+    return {
+        'totalUsers': len(users),
+        'todayRecords': sum(r['work_date'] == today for r in scoped),
+        'monthRecords': len(month),
+        'totalHours': pytest.approx(round(sum(r['total_work_hours'] for r in month), 1)),
+        'departmentStats': dept_stats,
+        'recentRecords': [(f"用户{r['user_id']}", r['start_location']) for r in recent],
+    }
+
+
+def fetch_overview(client, month=MONTH):
+    data = client.get(f'/api/admin/overview?month={month}').get_json()
+    assert data['success']
+    return {
+        **{k: data[k] for k in ('totalUsers', 'todayRecords', 'monthRecords', 'totalHours')},
+        'departmentStats': {d['department']: d for d in data['departmentStats']},
+        'recentRecords': [(r['user_name'], r['start_location']) for r in data['recentRecords']],
+    }
+
+
+def test_admin_overview_matches_records(clean_db, login, overview_cache):
+    records = seed_records(clean_db)
+    overview = fetch_overview(login(9, role='admin', department=''))
+    assert overview == expected_overview(records, {1, 2, 3, 9}, {'一组': {1, 2}, '二组': {3}})
+
+
+def test_manager_overview_only_covers_own_department(clean_db, login, overview_cache):
+    records = seed_records(clean_db)
+    first = fetch_overview(login(1, role='manager', department='一组'))
+    assert first == expected_overview(records, {1, 2}, {'一组': {1, 2}})
+    # 同一月份另一个部门的组长不会拿到一组的缓存结果
+    second = fetch_overview(login(3, role='manager', department='二组'))
+    assert second == expected_overview(records, {3}, {'二组': {3}})
+
+    assert login(1).get(f'/api/admin/overview?month={MONTH}').status_code == 403
+
+
+def test_overview_is_cached_per_month_and_department(clean_db, login, overview_cache, monkeypatch):
+    seed_records(clean_db)
+    admin = login(9, role='admin', department='')
+    before = fetch_overview(admin)
+
+    body = {'workDate': f'{MONTH}-25', 'transportMode': 'driving',
+            'travelHours': 1.0, 'visitHours': 0.92, 'reportHours': 0.13}
+    assert login(2).post('/api/my_timesheet', json=body).get_json()['success']
+
+    # TTL内同一 (月份, 部门) 直接返回缓存
+    assert fetch_overview(admin) == before
+    # 其他月份、其他部门各自缓存，立即看到新记录
+    assert fetch_overview(admin, '2025-04')['monthRecords'] == 1
+    manager = fetch_overview(login(1, role='manager', department='一组'))
+    assert manager['departmentStats']['一组']['work_days'] == before['departmentStats']['一组']['work_days'] + 1
+
+    # 过期后重新查询
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + overview_cache.ttl + 1)
+    after = fetch_overview(admin)
+    assert after['monthRecords'] == before['monthRecords'] + 1
+    assert after['recentRecords'][0][0] == '用户2'
@@ -0,0 +1,47 @@
+import csv
+import io
+
+from csv_export import BOM, attachment_headers, iter_csv, iter_query_csv
+from database_config import get_db_connection
+
+
+def test_bom_once_and_special_characters_escaped(clean_db):
+    clean_db(1)
+    notes = ['逗号,分隔', '引号"内容"', '换行\n第二行', '普通备注', "单引号'和%"]
+    with get_db_connection() as db:
+        db.executemany(
+            'INSERT INTO timesheet_records (user_id, work_date, audit_store_count, notes) VALUES (?, ?, 1, ?)',
+            [(1, f'2025-03-0{i + 1}', note) for i, note in enumerate(notes)]
+        )
+        db.commit()
+
+    chunks = list(iter_query_csv(['日期', '备注'], 'SELECT work_date, notes FROM timesheet_records ORDER BY work_date',
+                                 (), lambda row: [row['work_date'], row['notes']], batch_size=2))
+    # 表头一块，5条记录按每批2条分3块
+    assert len(chunks) == 4
+    data = b''.join(chunks)
+    assert data.startswith(BOM) and data.count(BOM) == 1
+    rows = list(csv.reader(io.StringIO(data[len(BOM):].decode('utf-8'), newline='')))
+    assert rows[0] == ['日期', '备注']
+    assert [row[1] for row in rows[1:]] == notes
+
+
+def test_first_batch_streams_before_query_finishes():
+    produced = []
+
+    def batches():
+        for i in range(3):
+            produced.append(i)
+            yield [(i,)]
+
+    chunks = iter_csv(['n'], batches(), lambda row: list(row))
+    assert next(chunks) == BOM + b'n\r\n'
+    assert produced == []
+    assert next(chunks) == b'0\r\n'
+    assert produced == [0]
+
+
+def test_attachment_headers_keep_chinese_filename():
+    headers = attachment_headers('工时记录_20250301.csv')
+    assert 'filename="_20250301.csv"' in headers['Content-Disposition']
+    assert "filename*=UTF-8''%E5%B7%A5%E6%97%B6%E8%AE%B0%E5%BD%95_20250301.csv" in headers['Content-Disposition']
@@ -0,0 +1,51 @@
+import sqlite3
+
+import pytest
+
+from database_config import SQLITE_PATH, get_db_connection
+
+
+def committed_usernames():
+    conn = sqlite3.connect(SQLITE_PATH)
+    try:
+        return {row[0] for row in conn.execute('SELECT username FROM users')}
+    finally:
+        conn.close()
+
+
+def insert_user(db, user_id):
+    db.execute('INSERT INTO users (id, username, password, name) VALUES (?, ?, ?, ?)',
+               (user_id, f'u{user_id}', 'x', f'用户{user_id}'))
+
+
+def test_nested_commit_does_not_commit_outer_transaction(clean_db):
+    with get_db_connection() as outer:
+        insert_user(outer, 1)
+        with get_db_connection() as inner:
+            insert_user(inner, 2)
+            inner.commit()
+        assert committed_usernames() == set()
+        outer.commit()
+    assert committed_usernames() == {'u1', 'u2'}
+
+
+def test_nested_error_keeps_outer_work(clean_db):
+    with get_db_connection() as outer:
+        insert_user(outer, 1)
+        with pytest.raises(sqlite3.IntegrityError):
+            with get_db_connection() as inner:
+                insert_user(inner, 2)
+                insert_user(inner, 2)
+        with get_db_connection() as inner:
+            # 未提交就退出的内层修改被丢弃
+            insert_user(inner, 3)
+        outer.commit()
+    assert committed_usernames() == {'u1'}
+
+
+def test_nested_commit_without_outer_changes_is_durable(clean_db):
+    with get_db_connection():
+        with get_db_connection() as inner:
+            insert_user(inner, 1)
+            inner.commit()
+        assert committed_usernames() == {'u1'}
@@ -0,0 +1,62 @@
+import pytest
+
+from database_config import get_db_connection
+from db_adapter import translate_sql
+
+
+def test_placeholders_and_percent_signs():
+    assert translate_sql('SELECT * FROM users WHERE id = ? AND name LIKE ?') == \
+        'SELECT * FROM users WHERE id = %s AND name LIKE %s'
+    # 字符串常量中的 ? 不是占位符，% 在常量内外都要转义
+    assert translate_sql("SELECT '?', '10%' FROM t WHERE a % 2 = ?") == \
+        "SELECT '?', '10%%' FROM t WHERE a %% 2 = %s"
+
+
+def test_insert_or_replace_becomes_upsert():
+    assert translate_sql('INSERT OR REPLACE INTO route_cache (cache_key, result, cached_at) VALUES (?, ?, ?)') == (
+        'INSERT INTO route_cache (cache_key, result, cached_at) VALUES (%s, %s, %s) '
+        'ON CONFLICT (cache_key) DO UPDATE SET result = EXCLUDED.result, cached_at = EXCLUDED.cached_at'
+    )
+    assert translate_sql('''
+        insert or replace into api_usage_daily (provider, usage_date, count) VALUES (?, ?, ?);
+    ''') == (
+        'INSERT INTO api_usage_daily (provider, usage_date, count) VALUES (%s, %s, %s) '
+        'ON CONFLICT (provider, usage_date) DO UPDATE SET count = EXCLUDED.count'
+    )
+    # 只有冲突键字段时没有可更新的字段
+    assert translate_sql('INSERT OR REPLACE INTO schema_version (component) VALUES (?)') == \
+        'INSERT INTO schema_version (component) VALUES (%s) ON CONFLICT (component) DO NOTHING'
+
+
+def test_insert_or_ignore_becomes_do_nothing():
+    assert translate_sql('INSERT OR IGNORE INTO anything (a, b) VALUES (?, ?)') == \
+        'INSERT INTO anything (a, b) VALUES (%s, %s) ON CONFLICT DO NOTHING'
+
+
+def test_insert_or_replace_requires_registered_keys():
+    with pytest.raises(ValueError):
+        translate_sql('INSERT OR REPLACE INTO unknown_table (a) VALUES (?)')
+
+
+def test_page_cursor_keeps_sub_second_order(clean_db, login):
+    clean_db(1)
+    with get_db_connection() as db:
+        # 同一天、同一秒内录入的多条记录
+        db.executemany(
+            'INSERT INTO timesheet_records (user_id, work_date, audit_store_count, total_work_hours, created_at) '
+            'VALUES (?, ?, 1, ?, ?)',
+            [(1, '2025-03-01', i, f'2025-03-01 10:00:00.{i:06d}') for i in (5, 1, 3, 2, 4)]
+        )
+        db.commit()
+
+    for url, client in (('/api/my_timesheet?page_size=2', login(1)),
+                        ('/api/admin/records?page_size=2', login(2, role='admin'))):
+        seen = []
+        cursor = None
+        while True:
+            body = client.get(url + (f'&cursor={cursor}' if cursor else '')).get_json()
+            seen += [r['total_work_hours'] for r in body['records']]
+            cursor = body['next_cursor']
+            if not cursor:
+                break
+        assert sorted(seen) == [1, 2, 3, 4, 5], url
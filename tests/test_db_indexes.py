@@ -0,0 +1,8 @@
+from database_config import get_db_connection
+from db_indexes import check_index_usage
+
+
+def test_endpoint_queries_use_expected_indexes(clean_db):
+    with get_db_connection() as db:
+        results = check_index_usage(db)
+    assert [r['endpoint'] for r in results if not r['uses_index']] == []
@@ -0,0 +1,76 @@
+import time
+
+import export_jobs
+from database_config import get_db_connection
+
+
+def wait_for_job(client, job_id):
+    for _ in range(100):
+        job = client.get(f'/api/exports/{job_id}').get_json()['job']
+        if job['status'] not in ('queued', 'running'):
+            return job
+        time.sleep(0.05)
+    raise AssertionError('导出任务未完成')
+
+
+def test_legacy_export_route_enqueues_job(clean_db, login):
+    clean_db(1)
+    client = login(1)
+    assert client.post('/api/my_timesheet', json={'workDate': '2025-03-01', 'visitHours': 1}).get_json()['success']
+
+    response = client.get('/api/export_timesheet')
+    # 导出很快时登记后即已完成，直接跳转下载
+    assert response.status_code in (202, 302)
+    if response.status_code == 202:
+        job = wait_for_job(client, response.get_json()['job']['id'])
+    else:
+        job = wait_for_job(client, response.headers['Location'].split('/')[-2])
+    assert job['status'] == 'done'
+    assert '2025-03-01' in client.get(job['download_url']).get_data().decode('utf-8-sig')
+
+    # 刚完成的相同导出直接跳转下载
+    response = client.get('/api/export_timesheet')
+    assert response.status_code == 302 and response.headers['Location'].endswith(job['download_url'])
+
+
+def test_job_without_heartbeat_is_reported_failed(clean_db):
+    now = time.time()
+    with get_db_connection() as db:
+        db.execute('''
+            INSERT INTO export_jobs (id, kind, params, dedup_key, status, created_at, expires_at, heartbeat_at)
+            VALUES (?, 'my_timesheet', '{}', ?, 'running', ?, ?, ?)
+        ''', ('dead', 'dead', now - 120, now + 3600, now - export_jobs.EXPORT_HEARTBEAT_TIMEOUT - 1))
+        db.execute('''
+            INSERT INTO export_jobs (id, kind, params, dedup_key, status, created_at, expires_at, heartbeat_at)
+            VALUES (?, 'my_timesheet', '{}', ?, 'running', ?, ?, ?)
+        ''', ('alive', 'alive', now - 3 * 3600, now + 3600, now - 1))
+        db.commit()
+    assert export_jobs.get_job('dead')['status'] == 'failed'
+    assert export_jobs.get_job('alive')['status'] == 'running'
+
+
+def test_admin_export_jobs_are_scoped_to_requester(clean_db, login):
+    clean_db(1, department='一组')
+    clean_db(2, department='二组')
+    for user_id in (1, 2):
+        assert login(user_id).post('/api/my_timesheet', json={
+            'workDate': f'2025-03-0{user_id}', 'visitHours': 1, 'notes': f'用户{user_id}的记录'}).get_json()['success']
+
+    manager_one = login(11, role='manager', department='一组')
+    manager_two = login(12, role='manager', department='二组')
+    admin = login(13, role='admin', department=None)
+    jobs = {}
+    for name, client in (('one', manager_one), ('two', manager_two), ('admin', admin)):
+        job = client.post('/api/exports', json={'kind': 'admin_records'}).get_json()['job']
+        jobs[name] = wait_for_job(client, job['id'])
+    # 相同筛选条件的导出不会在不同的人之间合并
+    assert len({job['id'] for job in jobs.values()}) == 3
+
+    assert '2025-03-01' in manager_one.get(jobs['one']['download_url']).get_data().decode('utf-8-sig')
+    assert '2025-03-02' not in manager_one.get(jobs['one']['download_url']).get_data().decode('utf-8-sig')
+    exported = admin.get(jobs['admin']['download_url']).get_data().decode('utf-8-sig')
+    assert '2025-03-01' in exported and '2025-03-02' in exported
+
+    for client, other in ((manager_one, 'two'), (manager_two, 'admin'), (admin, 'one')):
+        assert client.get(f"/api/exports/{jobs[other]['id']}").status_code == 404
+        assert client.get(jobs[other]['download_url']).status_code == 404
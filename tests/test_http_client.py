@@ -0,0 +1,119 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+import http_client as http_client_module
+from http_client import HTTPClient, RETRY_BACKOFF_BASE, RETRY_BACKOFF_MAX
+
+
+class FakeResponse:
+    def __init__(self, status=200):
+        self.status_code = status
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f'{self.status_code} Error')
+
+
+def scripted_get(outcomes):
+    """按顺序返回/抛出 outcomes 中的结果，记录每次调用的参数"""
+    calls = []
+
+    def get(url, params=None, timeout=None):
+        calls.append((url, params, timeout))
+        outcome = outcomes[len(calls) - 1]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    get.calls = calls
+    return get
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """记录退避等待，并让 random.uniform 返回区间上限以便核对"""
+    waits, bounds = [], []
+
+    def uniform(low, high):
+        bounds.append((low, high))
+        return high
+
+    monkeypatch.setattr(http_client_module.random, 'uniform', uniform)
+    monkeypatch.setattr(http_client_module.time, 'sleep', waits.append)
+    return waits, bounds
+
+
+def test_retries_with_jittered_exponential_backoff(sleeps):
+    waits, bounds = sleeps
+    client = HTTPClient(connect_timeout=1.5)
+    ok = FakeResponse()
+    client.session.get = scripted_get([
+        requests.exceptions.Timeout('slow'),
+        requests.exceptions.ConnectionError('reset'),
+        FakeResponse(502),
+        ok,
+    ])
+
+    assert client.get('https://apis.map.qq.com/ws/x', params={'q': 1}, timeout=8, max_retries=4) is ok
+    assert client.session.get.calls == [('https://apis.map.qq.com/ws/x', {'q': 1}, (1.5, 8))] * 4
+    assert bounds == [(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * 2 ** n)) for n in range(3)]
+    assert waits == [high for _, high in bounds]
+
+    metrics = client.metrics()['apis.map.qq.com']
+    assert (metrics['requests'], metrics['errors'], metrics['retries']) == (4, 3, 3)
+
+
+def test_last_failure_is_raised_without_waiting(sleeps):
+    waits, _ = sleeps
+    client = HTTPClient()
+    client.session.get = scripted_get([requests.exceptions.Timeout('slow')] * 2)
+
+    with pytest.raises(requests.exceptions.Timeout):
+        client.get('https://restapi.amap.com/v3/x', max_retries=2)
+    assert len(waits) == 1
+    metrics = client.metrics()['restapi.amap.com']
+    assert (metrics['requests'], metrics['errors'], metrics['retries']) == (2, 2, 1)
+
+
+def test_backoff_is_jittered_and_capped():
+    for attempt in range(8):
+        cap = min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * 2 ** attempt)
+        samples = [HTTPClient.backoff(attempt) for _ in range(200)]
+        assert all(0 <= s <= cap for s in samples)
+        # 抖动：并发失败的请求不会在同一时刻重试
+        assert len(set(samples)) > 150
+
+
+def test_metrics_are_consistent_under_concurrency(monkeypatch):
+    client = HTTPClient()
+    monkeypatch.setattr(client, 'backoff', lambda attempt: 0)
+    failed_once = set()
+    lock = threading.Lock()
+
+    def get(url, params=None, timeout=None):
+        # 每4个请求中有1个首次失败、重试成功
+        i = params['i']
+        with lock:
+            first_try = i not in failed_once
+            failed_once.add(i)
+        if i % 4 == 0 and first_try:
+            raise requests.exceptions.ConnectionError('reset')
+        return FakeResponse()
+
+    client.session.get = get
+    hosts = ['https://apis.map.qq.com/ws/x', 'https://restapi.amap.com/v3/x']
+    calls = 2000
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        list(pool.map(lambda i: client.get(hosts[i % 2], params={'i': i}, max_retries=2), range(calls)))
+
+    metrics = client.metrics()
+    assert set(metrics) == {'apis.map.qq.com', 'restapi.amap.com'}
+    # 下标 i%4==0 的请求全部落在第一个主机
+    qq, amap = metrics['apis.map.qq.com'], metrics['restapi.amap.com']
+    assert (qq['requests'], qq['errors'], qq['retries']) == (calls // 2 + calls // 4, calls // 4, calls // 4)
+    assert (amap['requests'], amap['errors'], amap['retries']) == (calls // 2, 0, 0)
+    for m in (qq, amap):
+        assert 0 <= m['p50_ms'] <= m['p95_ms'] <= m['max_ms']
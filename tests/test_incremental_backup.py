@@ -0,0 +1,106 @@
+import gzip
+import os
+
+import pytest
+
+from database_config import get_db_connection
+from incremental_backup import run_backup, restore_backup, load_manifest
+from rollups import rebuild_rollups
+
+RECORD_SQL = '''
+    INSERT INTO timesheet_records (id, user_id, work_date, audit_store_count, total_work_hours)
+    VALUES (?, ?, ?, 1, ?)
+'''
+
+
+@pytest.fixture
+def foreign_keys():
+    """SQLite默认不检查外键，这里打开以模拟PostgreSQL的外键约束"""
+    with get_db_connection() as db:
+        db.execute('PRAGMA foreign_keys = ON')
+    yield
+    with get_db_connection() as db:
+        db.execute('PRAGMA foreign_keys = OFF')
+
+
+def seed(add_user):
+    add_user(1)
+    add_user(2)
+    with get_db_connection() as db:
+        db.executemany(RECORD_SQL, [(1, 1, '2025-03-01', 2.0), (2, 1, '2025-03-02', 3.0), (3, 2, '2025-03-01', 1.5)])
+        db.execute('INSERT INTO user_monthly_defaults (user_id, year, month) VALUES (1, 2025, 3)')
+        # 让初始数据早于增量备份的回看窗口，增量分段只包含之后的修改
+        for table in ('users', 'timesheet_records', 'user_monthly_defaults'):
+            db.execute(f"UPDATE {table} SET updated_at = '2025-01-01 00:00:00'")
+        rebuild_rollups(db)
+        db.commit()
+
+
+def snapshot():
+    with get_db_connection() as db:
+        users = [tuple(r) for r in db.execute('SELECT id, name, department, updated_at FROM users ORDER BY id')]
+        records = [tuple(r) for r in db.execute(
+            'SELECT id, user_id, work_date, total_work_hours FROM timesheet_records ORDER BY id')]
+        defaults = [tuple(r) for r in db.execute(
+            'SELECT user_id, year, month, business_trip_days FROM user_monthly_defaults ORDER BY user_id')]
+        rollups = db.execute('SELECT COUNT(*), SUM(total_hours) FROM rollup_user_daily').fetchone()
+    return users, records, defaults, tuple(rollups)
+
+
+def test_restore_delta_with_changed_user_who_has_records(clean_db, foreign_keys, tmp_path):
+    seed(clean_db)
+    run_backup(str(tmp_path), full=True)
+    with get_db_connection() as db:
+        db.execute("UPDATE users SET name = '改名', department = '二组', "
+                   "updated_at = datetime(CURRENT_TIMESTAMP, '-1 minute') WHERE id = 1")
+        db.execute("UPDATE user_monthly_defaults SET business_trip_days = 4 WHERE user_id = 1")
+        rebuild_rollups(db)
+        db.commit()
+    segment = run_backup(str(tmp_path))
+    assert segment['type'] == 'delta'
+    assert segment['rows']['users'] == 1
+    # 回看窗口内再次导出同一条记录，重放时不应改写 updated_at
+    assert run_backup(str(tmp_path))['rows']['users'] == 1
+
+    expected = snapshot()
+    restore_backup(str(tmp_path), batch_size=1)
+
+    assert snapshot() == expected
+    assert expected[0][0][:3] == (1, '改名', '二组')
+    with get_db_connection() as db:
+        assert db.execute('PRAGMA foreign_key_check').fetchall() == []
+
+
+def test_restore_replays_deletes(clean_db, tmp_path):
+    seed(clean_db)
+    run_backup(str(tmp_path), full=True)
+    with get_db_connection() as db:
+        db.execute('DELETE FROM timesheet_records WHERE user_id = 2')
+        db.execute('DELETE FROM users WHERE id = 2')
+        db.execute(RECORD_SQL, (4, 1, '2025-03-05', 4.0))
+        rebuild_rollups(db)
+        db.commit()
+    segment = run_backup(str(tmp_path))
+    assert segment['deleted'] == 2
+
+    expected = snapshot()
+    restore_backup(str(tmp_path))
+    assert snapshot() == expected
+    assert [user[0] for user in expected[0]] == [1]
+
+
+def test_failed_restore_keeps_existing_data(clean_db, tmp_path):
+    seed(clean_db)
+    run_backup(str(tmp_path), full=True)
+    expected = snapshot()
+
+    # 截断全量分段，读取到一半时出错
+    path = os.path.join(str(tmp_path), load_manifest(str(tmp_path))['segments'][0]['file'])
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(data[:len(data) // 2])
+
+    with pytest.raises((EOFError, gzip.BadGzipFile, ValueError)):
+        restore_backup(str(tmp_path))
+    assert snapshot() == expected
@@ -0,0 +1,41 @@
+import random
+
+from database_config import get_db_connection
+from rollups import rebuild_rollups
+
+
+def rollup_state():
+    with get_db_connection() as db:
+        daily = sorted(tuple(r) for r in db.execute(
+            'SELECT user_id, work_date, record_count, round(total_hours, 6) FROM rollup_user_daily'))
+        monthly = sorted(tuple(r) for r in db.execute(
+            'SELECT department, month, record_count, round(total_hours, 6), work_days '
+            'FROM rollup_department_monthly WHERE record_count > 0'))
+    return daily, monthly
+
+
+def test_incremental_rollups_match_rebuild(clean_db, login):
+    clean_db(1)
+    clean_db(2)
+    clean_db(3, department='二组')
+    random.seed(1)
+    for _ in range(120):
+        user_id = random.randint(1, 3)
+        client = login(user_id)
+        with get_db_connection() as db:
+            mine = [r[0] for r in db.execute('SELECT id FROM timesheet_records WHERE user_id = ?', (user_id,))]
+        body = {'workDate': f'2025-03-0{random.randint(1, 4)}', 'transportMode': 'driving',
+                'travelHours': round(random.random(), 2), 'visitHours': 0.92, 'reportHours': 0.13}
+        action = random.random()
+        if action < 0.5 or not mine:
+            assert client.post('/api/my_timesheet', json=body).get_json()['success']
+        elif action < 0.75:
+            assert client.put(f'/api/my_timesheet/{random.choice(mine)}', json=body).get_json()['success']
+        else:
+            assert client.delete(f'/api/my_timesheet/{random.choice(mine)}').get_json()['success']
+
+    incremental = rollup_state()
+    with get_db_connection() as db:
+        rebuild_rollups(db)
+        db.commit()
+    assert incremental == rollup_state()
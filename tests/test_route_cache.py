@@ -0,0 +1,19 @@
+from route_cache import RouteCache
+
+
+def test_get_many_reads_database_and_memory(clean_db):
+    writer = RouteCache()
+    writer.set('120.1,30.1', '120.2,30.2', 'driving', '10', {'distance': 12.5})
+    writer.set('120.2,30.2', '120.1,30.1', 'driving', '10', {'distance': 13.0})
+
+    cache = RouteCache()
+    pairs = [('120.1,30.1', '120.2,30.2'), ('120.2,30.2', '120.1,30.1'), ('120.1,30.1', '120.3,30.3')]
+    found = cache.get_many(pairs, 'driving', '10')
+    assert found == {pairs[0]: {'distance': 12.5}, pairs[1]: {'distance': 13.0}}
+    assert (cache.db_hits, cache.misses) == (2, 1)
+
+    # 第二次从进程内缓存读取，坐标精度不同也能命中
+    assert cache.get_many([('120.100000,30.1', '120.2,30.2')], 'driving', '10') == {
+        ('120.100000,30.1', '120.2,30.2'): {'distance': 12.5}}
+    assert cache.db_hits == 2
+    assert cache.get_many(pairs, 'walking') == {}
@@ -0,0 +1,89 @@
+import pytest
+
+import app_clean
+from app_clean import calculate_route_matrix, resolve_stop
+from route_cache import route_cache
+
+STORE = {'store_code': '10001', 'name': '人民广场店', 'longitude': 121.47519, 'latitude': 31.22863}
+A, B, C, D = '121.47519,31.22863', '121.44123,31.22345', '121.50001,31.24002', '121.40111,31.19888'
+
+
+class StubAmap:
+    """替代高德驾车路径规划接口：按起终点返回固定结果，记录调用"""
+
+    def __init__(self):
+        self.calls = []
+        self.fail = set()
+
+    def __call__(self, url, params=None, timeout=15, max_retries=3):
+        assert url == 'https://restapi.amap.com/v3/direction/driving'
+        pair = (params['origin'], params['destination'])
+        self.calls.append(pair)
+        if pair in self.fail:
+            payload = {'status': '0', 'info': 'DAILY_QUERY_OVER_LIMIT'}
+        else:
+            meters = 1000 + 100 * len(self.calls)
+            payload = {'status': '1', 'route': {'paths': [{'distance': str(meters), 'duration': str(meters * 0.36)}]}}
+        return type('Response', (), {'json': lambda self: payload})()
+
+
+@pytest.fixture
+def amap(clean_db, monkeypatch):
+    route_cache._memory.clear()
+    stub = StubAmap()
+    monkeypatch.setattr(app_clean, 'safe_request', stub)
+    monkeypatch.setattr(app_clean, 'get_store_index', lambda: {STORE['store_code']: STORE})
+    yield stub
+    route_cache._memory.clear()
+
+
+def test_resolve_stop_forms(amap, monkeypatch):
+    monkeypatch.setattr(app_clean, 'search_location', lambda name: {
+        'success': True, 'locations': [{'location': D, 'store_code': '20002'}]})
+    assert resolve_stop('10001') == ('人民广场店', A, '10001')
+    assert resolve_stop({'store_code': '10001', 'name': '起点'}) == ('起点', A, '10001')
+    # 纬度,经度 顺序自动交换
+    assert resolve_stop('31.22345,121.44123') == ('31.22345,121.44123', B, '')
+    assert resolve_stop({'location': C, 'name': '外滩'}) == ('外滩', C, '')
+    assert resolve_stop('静安寺') == ('静安寺', D, '20002')
+    assert resolve_stop({'location': 'abc,def'}) is None
+    assert resolve_stop('99999') is None
+    assert amap.calls == []
+
+
+def test_route_matrix_cache_hits_skip_remote_calls(amap):
+    first = calculate_route_matrix(['10001', B, C, A])
+    assert first['success']
+    assert sorted(amap.calls) == sorted([(A, B), (B, C), (C, A)])
+    assert [leg['cached'] for leg in first['legs']] == [False] * 3
+    assert [leg['from']['location'] for leg in first['legs']] == [A, B, C]
+    assert first['total_distance'] == pytest.approx(sum(leg['distance'] for leg in first['legs']))
+
+    # 全部命中缓存：不再请求高德，结果相同
+    second = calculate_route_matrix([A, B, C, '10001'])
+    assert len(amap.calls) == 3
+    assert [leg['cached'] for leg in second['legs']] == [True] * 3
+    assert second['total_distance'] == first['total_distance']
+    assert second['total_duration'] == first['total_duration']
+
+    # 部分命中：只请求未缓存的路段；进程内缓存清空后从数据库命中
+    route_cache._memory.clear()
+    third = calculate_route_matrix([A, B, D])
+    assert amap.calls[3:] == [(B, D)]
+    assert [leg['cached'] for leg in third['legs']] == [True, False]
+    assert route_cache.db_hits >= 1
+
+
+def test_route_matrix_reports_failed_leg_without_caching(amap, login):
+    amap.fail.add((B, C))
+    result = calculate_route_matrix([A, B, C])
+    assert not result['success']
+    assert '第2段' in result['message']
+
+    # 失败的路段不写缓存，重试时再次请求
+    amap.fail.clear()
+    data = login(1).post('/api/route_matrix', json={'stops': [A, B, C]}).get_json()
+    assert data['success']
+    assert [leg['cached'] for leg in data['legs']] == [True, False]
+    assert amap.calls.count((B, C)) == 2
+    assert amap.calls.count((A, B)) == 1
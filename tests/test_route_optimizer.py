@@ -0,0 +1,39 @@
+import itertools
+import random
+
+import pytest
+
+from route_optimizer import nearest_neighbour, optimize_order, route_length, solve_exact, two_opt
+
+
+def brute_force(matrix, return_to_start):
+    n = len(matrix)
+    return min(route_length(matrix, [0, *rest], return_to_start)
+               for rest in itertools.permutations(range(1, n)))
+
+
+def random_matrix(rng, n):
+    # 非对称矩阵：往返的道路距离可以不同
+    return [[0.0 if i == j else rng.uniform(0.5, 30) for j in range(n)] for i in range(n)]
+
+
+@pytest.mark.parametrize('return_to_start', [False, True])
+def test_exact_matches_brute_force(return_to_start):
+    rng = random.Random(7)
+    for n in range(1, 9):
+        for _ in range(5):
+            matrix = random_matrix(rng, n)
+            order = solve_exact(matrix, return_to_start)
+            assert order[0] == 0 and sorted(order) == list(range(n))
+            assert route_length(matrix, order, return_to_start) == pytest.approx(brute_force(matrix, return_to_start))
+
+
+def test_heuristic_keeps_start_and_never_worse_than_nearest_neighbour():
+    rng = random.Random(11)
+    for _ in range(5):
+        matrix = random_matrix(rng, 15)
+        order, method = optimize_order(matrix)
+        assert method == 'nearest_neighbour+2opt'
+        assert order[0] == 0 and sorted(order) == list(range(15))
+        assert route_length(matrix, order) <= route_length(matrix, nearest_neighbour(matrix)) + 1e-9
+        assert two_opt(matrix, order) == order
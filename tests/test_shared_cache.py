@@ -0,0 +1,99 @@
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+import shared_cache
+from shared_cache import EVICT_EVERY, LRUCache, SharedCache, SQLiteCacheStore
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """可控时钟：每次读取前进1毫秒，clock.advance(秒) 跳过一段时间"""
+    class Clock:
+        now = 1_000_000.0
+
+        def __call__(self):
+            self.now += 0.001
+            return self.now
+
+        def advance(self, seconds):
+            self.now += seconds
+
+    clock = Clock()
+    monkeypatch.setattr(shared_cache.time, 'time', clock)
+    return clock
+
+
+def test_lru_cache_evicts_least_recently_used(clock):
+    cache = LRUCache(maxsize=3, ttl=10)
+    for key in 'abc':
+        cache.set(key, key.upper())
+    assert cache.get('a') == 'A'
+    cache.set('d', 'D')
+    assert cache.get('b') is None
+    assert [cache.get(k) for k in 'acd'] == ['A', 'C', 'D']
+
+    clock.advance(11)
+    assert cache.get('a') is None
+    assert len(cache) == 2
+
+
+def test_sqlite_store_evicts_by_last_access(tmp_path, clock):
+    store = SQLiteCacheStore(str(tmp_path / 'cache.db'))
+    for i in range(EVICT_EVERY - 1):
+        store.set('ns', f'k{i}', i, maxsize=10)
+    # 超过刷新间隔后读取，k0 的最近访问时间更新，不会被淘汰
+    clock.advance(SQLiteCacheStore.TOUCH_INTERVAL + 1)
+    assert store.get('ns', 'k0') == 0
+    # 第 EVICT_EVERY 次写入触发淘汰
+    store.set('ns', f'k{EVICT_EVERY - 1}', EVICT_EVERY - 1, maxsize=10)
+    store.set('other', 'x', 1)
+
+    assert store.size('ns') == 10
+    kept = {k for k in (f'k{i}' for i in range(EVICT_EVERY)) if store.get('ns', k) is not None}
+    assert kept == {'k0', *(f'k{i}' for i in range(EVICT_EVERY - 9, EVICT_EVERY))}
+    # 淘汰只针对本命名空间
+    assert store.get('other', 'x') == 1
+
+
+def test_shared_cache_size_stays_bounded(tmp_path):
+    cache = SharedCache('places', maxsize=20, local_size=5, store=SQLiteCacheStore(str(tmp_path / 'cache.db')))
+    for i in range(EVICT_EVERY * 3):
+        cache.set(f'q{i}', {'i': i})
+    assert cache.size() <= 20 + EVICT_EVERY
+    assert len(cache._local) == 5
+    assert cache.get(f'q{EVICT_EVERY * 3 - 1}') == {'i': EVICT_EVERY * 3 - 1}
+
+
+CHILD = '''
+import sys, json
+from shared_cache import SharedCache, SQLiteCacheStore
+cache = SharedCache('places', store=SQLiteCacheStore(sys.argv[1]))
+print(json.dumps([cache.get('from_parent'), cache.stats()['shared_hits']], ensure_ascii=False))
+cache.set('from_child', {'name': '静安寺店', 'location': [121.44, 31.22]})
+'''
+
+
+def test_shared_cache_is_shared_across_processes(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    cache = SharedCache('places', store=SQLiteCacheStore(path))
+    cache.set('from_parent', ['人民广场', 3])
+
+    result = subprocess.run(
+        [sys.executable, '-c', CHILD, path], cwd=tmp_path, capture_output=True, text=True, timeout=30,
+        env=dict(os.environ, PYTHONPATH=ROOT),
+    )
+    assert result.returncode == 0, result.stderr
+    # 子进程的进程内缓存为空，值经SQLite文件读到
+    assert json.loads(result.stdout) == [['人民广场', 3], 1]
+
+    assert cache.get('from_child') == {'name': '静安寺店', 'location': [121.44, 31.22]}
+    assert cache.shared_hits == 1
+    # 之后命中本进程缓存
+    cache.get('from_child')
+    assert cache.shared_hits == 1 and cache.hits == 2
@@ -0,0 +1,92 @@
+import random
+import time
+
+import pytest
+
+from spatial_index import GridIndex, haversine_distance
+from store_index import StoreIndex, load_stores_from_xlsx, make_store, parse_coordinates
+from xlsx_writer import iter_xlsx
+
+
+def random_points(rng, n):
+    return [(rng.uniform(28, 34), rng.uniform(116, 122), i) for i in range(n)]
+
+
+def brute_force(points, lat, lng, k, max_km=None):
+    distances = sorted((haversine_distance(lat, lng, p_lat, p_lng), item) for p_lat, p_lng, item in points)
+    return [(d, item) for d, item in distances if max_km is None or d <= max_km][:k]
+
+
+def test_nearest_matches_brute_force():
+    rng = random.Random(3)
+    points = random_points(rng, 2000)
+    grid = GridIndex(points)
+    for _ in range(50):
+        lat, lng = rng.uniform(27, 35), rng.uniform(115, 123)
+        k = rng.randint(1, 10)
+        for max_km in (None, 20):
+            got = grid.nearest(lat, lng, k=k, max_km=max_km)
+            expected = brute_force(points, lat, lng, k, max_km)
+            assert [item for _, item in got] == [item for _, item in expected]
+            assert [d for d, _ in got] == pytest.approx([d for d, _ in expected])
+
+
+def test_far_away_point_returns_quickly():
+    points = random_points(random.Random(5), 2000)
+    grid = GridIndex(points)
+    for lat, lng in ((0, 0), (-60, -120), (1000, 1000), (-89, 179)):
+        started = time.perf_counter()
+        got = grid.nearest(lat, lng, k=3)
+        assert time.perf_counter() - started < 1
+        assert [item for _, item in got] == [item for _, item in brute_force(points, lat, lng, 3)]
+        assert grid.nearest(lat, lng, k=3, max_km=500) == []
+
+
+def test_non_finite_coordinates_return_nothing():
+    grid = GridIndex(random_points(random.Random(7), 100))
+    for lat, lng in ((float('nan'), 120), (30, float('inf')), (float('-inf'), float('nan'))):
+        assert grid.nearest(lat, lng) == []
+        assert grid.within(lat, lng, 10) == []
+
+
+def test_parse_coordinates():
+    assert parse_coordinates('120.5', ' 30.25 ') == (120.5, 30.25)
+    for lng, lat in (('nan', 30), (120, 'inf'), (0, 0), (137, 30), (120, 60), ('', 30), (None, None)):
+        assert parse_coordinates(lng, lat) is None
+
+
+def test_store_index_nearby_excludes_origin():
+    stores = [make_store(f'S{i}', f'门店{i}', '杭州市', 120 + i * 0.01, 30) for i in range(10)]
+    index = StoreIndex(stores)
+    nearby = index.nearby(120.0, 30.0, k=3, exclude_code='S0')
+    assert [store['store_code'] for _, store in nearby] == ['S1', 'S2', 'S3']
+    within = index.nearby(120.0, 30.0, k=20, radius_km=2.5)
+    assert [store['store_code'] for _, store in within] == ['S0', 'S1', 'S2']
+
+
+def test_load_stores_from_xlsx_skips_invalid_rows(tmp_path):
+    columns = [(title, 'text') for title in ('门店编码', '门店名称', '门店城市', '经度', '纬度', '地址')]
+    rows = [
+        ['517091', '淮安财经学院北门店', '淮安市', '119.06697893', '33.56045473', '北京南路'],
+        ['517092', '坐标无效店', '淮安市', 'abc', '33.5', ''],
+        ['517093', '境外店', '淮安市', '10', '33.5', ''],
+        ['517094', '', '淮安市', '119', '33.5', ''],
+    ]
+    path = tmp_path / 'stores.xlsx'
+    path.write_bytes(b''.join(iter_xlsx([('门店', iter(rows))], columns)))
+
+    stores = load_stores_from_xlsx(str(path))
+    assert stores == [{'store_code': '517091', 'name': '淮安财经学院北门店', 'city': '淮安市',
+                       'longitude': 119.06697893, 'latitude': 33.56045473, 'address': '北京南路'}]
+
+
+def test_nearby_stores_endpoint_validates_input(clean_db, login):
+    from app_clean import app
+    assert app.test_client().get('/api/nearby_stores?location=120.1,30.2').status_code == 401
+
+    client = login(1)
+    for query in ('location=0,0', 'location=1000,1000', 'location=nan,30', 'location=120,inf',
+                  'longitude=-120&latitude=-60', 'location=120'):
+        response = client.get(f'/api/nearby_stores?{query}')
+        assert response.status_code == 400, query
+        assert not response.get_json()['success']
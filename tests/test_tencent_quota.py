@@ -0,0 +1,31 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import app_clean
+from app_clean import TENCENT_DAILY_LIMIT, TENCENT_DAYTIME_LIMIT, tencent_quota, tencent_quota_limit
+
+
+def test_quota_limit_by_hour():
+    assert tencent_quota_limit(datetime(2025, 5, 4, 9)) == TENCENT_DAYTIME_LIMIT
+    assert tencent_quota_limit(datetime(2025, 5, 4, 17, 59)) == TENCENT_DAYTIME_LIMIT
+    assert tencent_quota_limit(datetime(2025, 5, 4, 18)) == TENCENT_DAILY_LIMIT
+
+
+def test_concurrent_acquire_never_exceeds_daytime_limit(clean_db):
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: tencent_quota.try_acquire(limit=TENCENT_DAYTIME_LIMIT), range(180)))
+    assert sum(results) == TENCENT_DAYTIME_LIMIT
+    assert tencent_quota.usage_today() == TENCENT_DAYTIME_LIMIT
+
+
+def test_search_respects_daytime_reservation(clean_db, monkeypatch):
+    monkeypatch.setattr(app_clean, 'tencent_quota_limit', lambda now=None: TENCENT_DAYTIME_LIMIT)
+    for _ in range(TENCENT_DAYTIME_LIMIT):
+        assert tencent_quota.try_acquire()
+
+    def fail_request(*args, **kwargs):
+        raise AssertionError('日间配额用完后不应请求腾讯地图')
+
+    monkeypatch.setattr(app_clean, 'safe_request', fail_request)
+    assert app_clean.search_tencent_location('配额测试地标-日间') == []
+    assert tencent_quota.usage_today() == TENCENT_DAYTIME_LIMIT
@@ -0,0 +1,40 @@
+from database_config import get_db_connection
+
+
+def record_count():
+    with get_db_connection() as db:
+        return db.execute('SELECT COUNT(*) FROM timesheet_records').fetchone()[0]
+
+
+def test_batch_saves_all_valid_records(clean_db, login):
+    clean_db(1)
+    records = [{'workDate': f'2025-03-0{day}', 'transportMode': 'driving',
+                'travelHours': 1, 'visitHours': 0.92, 'reportHours': 0.13} for day in (1, 2, 3)]
+    response = login(1).post('/api/my_timesheet/batch', json={'records': records})
+    body = response.get_json()
+    assert response.status_code == 200 and body['saved'] == 3
+    assert [r['success'] for r in body['results']] == [True, True, True]
+    assert record_count() == 3
+    with get_db_connection() as db:
+        assert db.execute('SELECT record_count FROM rollup_department_monthly').fetchone()[0] == 3
+
+
+def test_batch_rejects_negative_field_and_saves_nothing(clean_db, login):
+    clean_db(1)
+    records = [
+        {'workDate': '2025-03-01', 'travelHours': 1, 'visitHours': 1},
+        # 合计为正，但巡店工时为负
+        {'workDate': '2025-03-02', 'travelHours': 5, 'visitHours': -4},
+        {'workDate': '2025-03-03', 'roundTripDistance': -10},
+        {'workDate': '2025-03-04', 'reportHours': 'nan'},
+        {'workDate': '2025/03/05'},
+    ]
+    response = login(1).post('/api/my_timesheet/batch', json={'records': records})
+    body = response.get_json()
+    assert response.status_code == 400 and not body['success']
+    assert [r['index'] for r in body['results']] == [0, 1, 2, 3, 4]
+    assert [r['success'] for r in body['results']] == [True, False, False, False, False]
+    assert '巡店工时' in body['results'][1]['message']
+    assert '往返距离' in body['results'][2]['message']
+    assert '报告工时' in body['results'][3]['message']
+    assert record_count() == 0
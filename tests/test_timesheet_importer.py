@@ -0,0 +1,35 @@
+import csv
+
+from database_config import get_db_connection
+from timesheet_importer import import_timesheet, parse_date, parse_datetime
+
+
+def test_parse_date_formats():
+    assert parse_date('2025-05-04') == '2025-05-04'
+    assert parse_date('2025/05/04') == '2025-05-04'
+    assert parse_date('20250504') == '2025-05-04'
+    assert parse_date('45781') == '2025-05-04'
+    assert parse_datetime('20250504') == '2025-05-04 00:00:00'
+    assert parse_datetime('45781.5') == '2025-05-04 12:00:00'
+
+
+def test_bad_values_reject_row_instead_of_aborting(clean_db, tmp_path):
+    clean_db(1)
+    path = tmp_path / 'records.csv'
+    with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        writer.writerow(['专员姓名', '工作日期', '审核门店数', '巡途工时(H)', '录入时间'])
+        writer.writerow(['用户1', '20250504', '2', '1.5', ''])
+        writer.writerow(['用户1', '99999999999', '1', '1', ''])     # 超出范围的日期序列值
+        writer.writerow(['用户1', '2025-05-05', 'inf', '1', ''])    # int 字段为 inf
+        writer.writerow(['用户1', '2025-05-05', '1', 'nan', ''])    # float 字段为 nan
+        writer.writerow(['用户1', '2025-05-05', '1', '1', '1e400'])  # 录入时间溢出
+
+    stats = import_timesheet(str(path))
+
+    assert stats['imported'] == 1
+    assert stats['rejected'] == 4
+    assert [error['row'] for error in stats['errors']] == ['第3行', '第4行', '第5行', '第6行']
+    with get_db_connection() as db:
+        rows = db.execute('SELECT work_date, audit_store_count FROM timesheet_records').fetchall()
+    assert [tuple(row) for row in rows] == [('2025-05-04', 2)]
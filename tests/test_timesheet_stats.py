@@ -0,0 +1,119 @@
+import math
+import random
+
+import pytest
+
+from database_config import get_db_connection
+from rollups import rebuild_rollups
+from timesheet_stats import calculate_bonus_salary, month_range
+
+
+def legacy_bonus_salary(avg_store_time, extra_stores):
+    """原记录页 calculateBonusSalary 的逐行移植，作为对照"""
+    if avg_store_time <= 1.5:
+        matrix = [25, 30, 35, 40]
+    elif avg_store_time <= 1.7:
+        matrix = [30, 35, 40, 45]
+    elif avg_store_time <= 2:
+        matrix = [35, 40, 45, 50]
+    else:
+        matrix = [40, 45, 50, 55]
+    if extra_stores <= 10:
+        tier = 0
+    elif extra_stores <= 20:
+        tier = 1
+    elif extra_stores <= 30:
+        tier = 2
+    else:
+        tier = 3
+    return extra_stores * matrix[tier]
+
+
+def legacy_statistics(records):
+    """原记录页 updateStatistics 的逐行移植，返回页面上显示的文本"""
+    total_hours = sum(r['total_work_hours'] or 0 for r in records)
+    total_stores = sum(r['audit_store_count'] or 0 for r in records)
+    total_distance = sum(r['round_trip_distance'] or 0 for r in records)
+    total_travel = sum(r['travel_hours'] or 0 for r in records)
+    total_visit = sum(r['visit_hours'] or 0 for r in records)
+    actual_work_days = len({r['work_date'] for r in records if r['work_date']})
+    adjusted = max(1, actual_work_days - 1) if actual_work_days > 0 else actual_work_days
+    avg_daily = total_hours / actual_work_days if actual_work_days > 0 else 0
+    avg_travel = total_travel / total_stores if total_stores > 0 else 0
+    avg_visit = total_visit / total_stores if total_stores > 0 else 0
+    avg_store_time = avg_travel + min(avg_visit, 1.0)
+    extra_hours = max(0, total_hours - adjusted * 8)
+    extra_stores = math.floor(extra_hours / avg_store_time) if avg_store_time > 0 else 0
+    return {
+        'totalRecords': str(len(records)),
+        'totalHours': f'{total_hours:.2f}h',
+        'totalDistance': f'{total_distance:.1f}km',
+        'actualWorkDays': f'{actual_work_days}天',
+        'avgDailyHours': f'{avg_daily:.2f}h',
+        'avgStoreTime': f'{avg_store_time:.2f}h',
+        'extraStores': f'{extra_stores}家',
+        'bonusSalary': f'{legacy_bonus_salary(avg_store_time, extra_stores)}元',
+    }
+
+
+@pytest.mark.parametrize('avg_store_time, extra_stores, expected', [
+    (1.5, 10, 250), (1.5, 11, 330), (1.51, 10, 300), (1.7, 20, 700), (1.71, 20, 800),
+    (2.0, 30, 1350), (2.0, 31, 1550), (2.01, 31, 1705), (0, 0, 0), (3.2, 0, 0),
+])
+def test_bonus_salary_tier_boundaries(avg_store_time, extra_stores, expected):
+    assert calculate_bonus_salary(avg_store_time, extra_stores) == expected
+    assert legacy_bonus_salary(avg_store_time, extra_stores) == expected
+
+
+def test_bonus_salary_matches_legacy_grid():
+    for avg in [x / 100 for x in range(0, 300, 5)] + [1.5, 1.7, 2.0]:
+        for extra in range(0, 45):
+            assert calculate_bonus_salary(avg, extra) == legacy_bonus_salary(avg, extra)
+
+
+def test_month_range():
+    assert month_range('2024-02') == ('2024-02-01', '2024-02-29')
+    assert month_range('2025-12') == ('2025-12-01', '2025-12-31')
+    with pytest.raises(ValueError):
+        month_range('2025-13')
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_my_stats_matches_legacy_client(clean_db, login, seed):
+    clean_db(1)
+    rng = random.Random(seed)
+    # 工时取0.25的倍数，两种累加顺序结果完全相同
+    records = [{
+        'work_date': f'2025-03-{rng.randint(1, 12):02d}',
+        'actual_visit_days': rng.choice([0, 1, 1, 2]),
+        'audit_store_count': rng.choice([0, 1, 1, 1, 2]),
+        'round_trip_distance': rng.randint(0, 400) / 4,
+        'travel_hours': rng.randint(0, 16) / 4,
+        'visit_hours': rng.randint(0, 12) / 4,
+        'report_hours': rng.randint(0, 4) / 4,
+    } for _ in range(rng.randint(20, 60))]
+    for record in records:
+        record['total_work_hours'] = record['travel_hours'] + record['visit_hours'] + record['report_hours']
+    # 其他月份的记录不计入
+    other_month = dict(records[0], work_date='2025-04-01')
+
+    columns = list(records[0])
+    with get_db_connection() as db:
+        db.executemany(
+            f"INSERT INTO timesheet_records (user_id, {', '.join(columns)}) VALUES (?, {', '.join('?' for _ in columns)})",
+            [(1, *(r[c] for c in columns)) for r in records + [other_month]]
+        )
+        rebuild_rollups(db)
+        db.commit()
+
+    stats = login(1).get('/api/my_stats?month=2025-03').get_json()['stats']
+    assert {
+        'totalRecords': str(stats['record_count']),
+        'totalHours': f"{stats['total_hours']:.2f}h",
+        'totalDistance': f"{stats['total_distance']:.1f}km",
+        'actualWorkDays': f"{stats['work_days']}天",
+        'avgDailyHours': f"{stats['avg_daily_hours']:.2f}h",
+        'avgStoreTime': f"{stats['avg_store_time']:.2f}h",
+        'extraStores': f"{stats['extra_stores']}家",
+        'bonusSalary': f"{stats['bonus_salary']}元",
+    } == legacy_statistics(records)
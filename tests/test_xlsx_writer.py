@@ -0,0 +1,77 @@
+import zipfile
+
+from timesheet_importer import parse_date, parse_datetime
+from xlsx_reader import iter_xlsx_rows, sheet_names
+from xlsx_writer import column_letter, iter_query_xlsx, iter_xlsx, sheet_title
+from database_config import get_db_connection
+
+COLUMNS = [('部门', 'text'), ('工作日期', 'date'), ('工时', 'number'), ('备注', 'text'), ('录入时间', 'datetime')]
+
+
+def write(tmp_path, chunks):
+    path = tmp_path / 'export.xlsx'
+    path.write_bytes(b''.join(chunks))
+    assert zipfile.ZipFile(path).testzip() is None
+    return str(path)
+
+
+def test_sheet_per_department_round_trip(clean_db, tmp_path):
+    clean_db(1, department='一组')
+    clean_db(2, department='二组/华东')
+    clean_db(3, department='')
+    with get_db_connection() as db:
+        db.executemany('''
+            INSERT INTO timesheet_records (user_id, work_date, audit_store_count, total_work_hours, notes, created_at)
+            VALUES (?, ?, 1, ?, ?, ?)
+        ''', [
+            (1, '2025-03-01', 7.5, '杭州西湖店 & <备注>', '2025-03-01 18:30:05'),
+            (1, '2025-03-02', 0.25, '', '2025-03-02 09:00:00'),
+            (2, '2025-02-28', 12, '古茗·上海"南京路"店', '2025-03-01 08:00:00'),
+            (3, '2025-03-03', 1, '未分组', '2025-03-03 00:00:00'),
+        ])
+        db.commit()
+
+    chunks = iter_query_xlsx(
+        COLUMNS,
+        '''
+            SELECT u.department, t.work_date, t.total_work_hours, t.notes, t.created_at
+            FROM timesheet_records t JOIN users u ON t.user_id = u.id
+            ORDER BY u.department, t.work_date
+        ''',
+        (),
+        lambda row: list(row),
+        sheet_key=lambda row: row['department'],
+        batch_size=1,
+    )
+    path = write(tmp_path, chunks)
+
+    # 非法字符替换为下划线，空部门使用默认名称
+    assert sheet_names(path) == ['未分组', '一组', '二组_华东']
+    sheets = [list(iter_xlsx_rows(path, i)) for i in range(3)]
+    for rows in sheets:
+        assert rows[0] == [title for title, _ in COLUMNS]
+
+    department, work_date, hours, notes, created_at = sheets[1][1]
+    assert (department, parse_date(work_date), float(hours), notes, parse_datetime(created_at)) == \
+        ('一组', '2025-03-01', 7.5, '杭州西湖店 & <备注>', '2025-03-01 18:30:05')
+    # 空备注不写单元格，读回为空字符串
+    department, work_date, hours, notes, _ = sheets[1][2]
+    assert (parse_date(work_date), hours, notes) == ('2025-03-02', '0.25', '')
+    assert sheets[2][1][3] == '古茗·上海"南京路"店' and float(sheets[2][1][2]) == 12
+    assert len(sheets[0]) == 2
+
+
+def test_empty_export_has_header_sheet(tmp_path):
+    path = write(tmp_path, iter_xlsx([], COLUMNS))
+    assert sheet_names(path) == ['工时记录']
+    assert list(iter_xlsx_rows(path)) == [[title for title, _ in COLUMNS]]
+
+
+def test_sheet_titles_and_column_letters():
+    used = set()
+    long_name = '很长的部门名称' * 6
+    assert sheet_title('A组', used) == 'A组'
+    assert sheet_title('a组', used) == 'a组(2)'
+    title = sheet_title(long_name, used)
+    assert len(title) == 31 and sheet_title(long_name, used) == title[:28] + '(2)'
+    assert [column_letter(i) for i in (0, 25, 26, 701, 702)] == ['A', 'Z', 'AA', 'ZZ', 'AAA']
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+工时记录批量导入
+流式读取CSV/XLSX（列与工时记录导出一致，另需“专员姓名”列），按姓名匹配专员后分批写入 timesheet_records，
+导入完成后重建工时汇总表（支持SQLite和PostgreSQL）
+使用方法：python timesheet_importer.py 文件路径 [--batch-size 5000] [--dry-run]
+"""
+
+import os
+import re
+import csv
+import math
+import sys
+import time
+import zipfile
+import logging
+import argparse
+from datetime import datetime, date, timedelta
+
+from database_config import get_db_connection, init_database, USE_POSTGRESQL
+from rollups import rebuild_rollups
+from xlsx_reader import iter_xlsx_rows, load_shared_strings, sheet_names
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 100
+
+NAME_COLUMN = '专员姓名'
+USERNAME_COLUMN = '用户名'      # 可选，有重名专员时用用户名区分
+DATE_COLUMN = '工作日期'
+
+# 表头 -> (字段, 类型, 空值时的默认值)
+COLUMNS = {
+    '工作日期': ('work_date', 'date', None),
+    '出差天数': ('business_trip_days', 'int', 1),
+    '实际巡店天数': ('actual_visit_days', 'int', 1),
+    '审核门店数': ('audit_store_count', 'int', 1),
+    '培训门店数': ('training_store_count', 'int', 0),
+    '起始门店': ('start_location', 'text', ''),
+    '终点门店': ('end_location', 'text', ''),
+    '单程距离(km)': ('round_trip_distance', 'float', 0),
+    '交通方式': ('transport_mode', 'text', 'driving'),
+    '班次号': ('schedule_number', 'text', ''),
+    '巡途工时(H)': ('travel_hours', 'float', 0),
+    '巡店工时(H)': ('visit_hours', 'float', 0),
+    '汇报工时(H)': ('report_hours', 'float', 0),
+    '合计工时(H)': ('total_work_hours', 'float', None),
+    '备注': ('notes', 'text', ''),
+    '门店编码': ('store_code', 'text', ''),
+    '城市': ('city', 'text', ''),
+    '录入时间': ('created_at', 'datetime', None),
+}
+
+INSERT_FIELDS = ['user_id'] + [field for field, _, _ in COLUMNS.values()]
+
+# 直接写入 updated_at，避免逐行触发SQLite的插入触发器（PostgreSQL由字段默认值填写）
+SQLITE_INSERT = f'''
+    INSERT INTO timesheet_records ({', '.join(INSERT_FIELDS)}, updated_at)
+    VALUES ({', '.join('COALESCE(?, CURRENT_TIMESTAMP)' if f == 'created_at' else '?' for f in INSERT_FIELDS)},
+            CURRENT_TIMESTAMP)
+'''
+
+POSTGRES_INSERT = f'''
+    INSERT INTO timesheet_records ({', '.join(INSERT_FIELDS)}) VALUES %s
+'''
+POSTGRES_TEMPLATE = '(' + ', '.join(
+    'COALESCE(%s::timestamp, CURRENT_TIMESTAMP)' if f == 'created_at' else '%s' for f in INSERT_FIELDS
+) + ')'
+
+EXCEL_EPOCH = date(1899, 12, 30)
+# Excel能表示的最大日期序列值（9999-12-31）
+EXCEL_SERIAL_MAX = 2958466
+_SERIAL_RE = re.compile(r'^\d+(\.\d+)?$')
+_COMPACT_DATE_RE = re.compile(r'^\d{8}$')
+
+
+def _excel_serial(value):
+    """Excel日期序列值（天数），超出范围抛出ValueError"""
+    serial = float(value)
+    if not 0 < serial < EXCEL_SERIAL_MAX:
+        raise ValueError(f'日期序列值超出范围: {value}')
+    return serial
+
+
+def parse_date(value):
+    """YYYY-MM-DD、YYYY/MM/DD、YYYYMMDD 或Excel日期序列值，返回 'YYYY-MM-DD'"""
+    if _COMPACT_DATE_RE.match(value):
+        return datetime.strptime(value, '%Y%m%d').date().isoformat()
+    if _SERIAL_RE.match(value):
+        return (EXCEL_EPOCH + timedelta(days=int(_excel_serial(value)))).isoformat()
+    return date.fromisoformat(value.replace('/', '-')[:10]).isoformat()
+
+
+def parse_datetime(value):
+    """'YYYY-MM-DD HH:MM[:SS]'、YYYYMMDD 或Excel日期序列值，返回 'YYYY-MM-DD HH:MM:SS'"""
+    if _COMPACT_DATE_RE.match(value):
+        return datetime.strptime(value, '%Y%m%d').strftime('%Y-%m-%d %H:%M:%S')
+    if _SERIAL_RE.match(value):
+        moment = datetime.combine(EXCEL_EPOCH, datetime.min.time()) + timedelta(seconds=round(_excel_serial(value) * 86400))
+        return moment.strftime('%Y-%m-%d %H:%M:%S')
+    return datetime.fromisoformat(value.replace('/', '-')[:19]).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def parse_float(value):
+    """数值，inf/nan 视为格式错误"""
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(f'无效数值: {value}')
+    return number
+
+
+PARSERS = {
+    'date': parse_date,
+    'datetime': parse_datetime,
+    'int': lambda value: int(parse_float(value)),
+    'float': parse_float,
+    'text': str,
+}
+
+
+def iter_rows(path):
+    """逐行返回 (位置说明, 单元格列表)，每个工作表/文件的第一行为表头（位置说明为None）"""
+    if path.lower().endswith('.xlsx'):
+        with zipfile.ZipFile(path) as zf:
+            shared_strings = load_shared_strings(zf)
+        names = sheet_names(path)
+        for index, name in enumerate(names):
+            prefix = f'{name}!' if len(names) > 1 else ''
+            for row_number, row in enumerate(iter_xlsx_rows(path, index, shared_strings), start=1):
+                yield (None if row_number == 1 else f'{prefix}第{row_number}行'), row
+    else:
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            for row_number, row in enumerate(csv.reader(f), start=1):
+                yield (None if row_number == 1 else f'第{row_number}行'), row
+
+
+def header_positions(row):
+    """表头 -> 列号，缺少必要列时抛出ValueError"""
+    headers = [str(h).strip() for h in row]
+    if NAME_COLUMN not in headers and USERNAME_COLUMN not in headers:
+        raise ValueError(f'表格缺少必要列: {NAME_COLUMN}')
+    if DATE_COLUMN not in headers:
+        raise ValueError(f'表格缺少必要列: {DATE_COLUMN}')
+    return {title: headers.index(title) for title in headers if title}
+
+
+def load_user_maps(cursor):
+    """姓名/用户名 -> 用户ID；重名的姓名映射为None"""
+    cursor.execute('SELECT id, name, username FROM users')
+    by_name, by_username = {}, {}
+    for user_id, name, username in cursor.fetchall():
+        name = (name or '').strip()
+        by_name[name] = None if name in by_name else user_id
+        by_username[(username or '').strip()] = user_id
+    return by_name, by_username
+
+
+def _write_batch(cursor, batch):
+    if not batch:
+        return
+    if USE_POSTGRESQL:
+        from psycopg2.extras import execute_values
+        execute_values(cursor, POSTGRES_INSERT, batch, template=POSTGRES_TEMPLATE, page_size=len(batch))
+    else:
+        cursor.executemany(SQLITE_INSERT, batch)
+
+
+def import_timesheet(path, batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+    """
+    导入工时记录，返回统计信息：imported / rejected / errors（拒绝原因，最多 MAX_REPORTED_ERRORS 条）
+    不合格的行跳过并记录原因，其余记录在一个事务内写入；dry_run 只校验不写入
+    """
+    started = time.time()
+    stats = {'imported': 0, 'rejected': 0, 'errors': []}
+
+    def reject(location, reason):
+        stats['rejected'] += 1
+        if len(stats['errors']) < MAX_REPORTED_ERRORS:
+            stats['errors'].append({'row': location, 'reason': reason})
+
+    # 先校验表头再连接数据库
+    rows = iter_rows(path)
+    try:
+        _, first_row = next(rows)
+    except StopIteration:
+        stats['elapsed'] = 0
+        return stats
+    positions = header_positions(first_row)
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        by_name, by_username = load_user_maps(cursor)
+        batch = []
+
+        for location, row in rows:
+            if location is None:
+                positions = header_positions(row)
+                continue
+
+            cells = {title: (row[i].strip() if i < len(row) and row[i] else '') for title, i in positions.items()}
+            if not any(cells.values()):
+                continue
+
+            username = cells.get(USERNAME_COLUMN, '')
+            name = cells.get(NAME_COLUMN, '')
+            if username:
+                user_id = by_username.get(username)
+                if user_id is None:
+                    reject(location, f'用户名不存在: {username}')
+                    continue
+            else:
+                if name not in by_name:
+                    reject(location, f'专员不存在: {name or "（空）"}')
+                    continue
+                user_id = by_name[name]
+                if user_id is None:
+                    reject(location, f'专员重名，请填写用户名列: {name}')
+                    continue
+
+            record = {'user_id': user_id}
+            error = None
+            for title, (field, kind, default) in COLUMNS.items():
+                value = cells.get(title, '')
+                if not value:
+                    record[field] = default
+                    continue
+                try:
+                    record[field] = PARSERS[kind](value)
+                except (ValueError, OverflowError):
+                    error = f'{title}格式错误: {value}'
+                    break
+            if error:
+                reject(location, error)
+                continue
+            if record['work_date'] is None:
+                reject(location, '工作日期为空')
+                continue
+            if record['total_work_hours'] is None:
+                record['total_work_hours'] = record['travel_hours'] + record['visit_hours'] + record['report_hours']
+
+            stats['imported'] += 1
+            if dry_run:
+                continue
+            batch.append(tuple(record[field] for field in INSERT_FIELDS))
+            if len(batch) >= batch_size:
+                _write_batch(cursor, batch)
+                batch = []
+
+        if not dry_run:
+            _write_batch(cursor, batch)
+            if stats['imported']:
+                rebuild_rollups(conn)
+            conn.commit()
+
+    stats['elapsed'] = round(time.time() - started, 2)
+    logger.info(
+        f"工时记录导入{'校验' if dry_run else ''}完成: 导入{stats['imported']} "
+        f"拒绝{stats['rejected']} 用时{stats['elapsed']}s"
+    )
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='从CSV/XLSX导入工时记录')
+    parser.add_argument('path', help='CSV或XLSX文件路径（列与工时记录导出一致，需包含专员姓名列）')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='每批写入行数')
+    parser.add_argument('--dry-run', action='store_true', help='只校验不写入')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if not os.path.exists(args.path):
+        print(f"❌ 文件不存在: {args.path}")
+        return 1
+    init_database()
+
+    print(f"🔄 开始导入工时记录: {args.path}")
+    try:
+        stats = import_timesheet(args.path, batch_size=args.batch_size, dry_run=args.dry_run)
+    except Exception as e:
+        print(f"❌ 导入失败: {e}")
+        return 1
+
+    print(f"✅ {'校验' if args.dry_run else '导入'}完成，用时 {stats['elapsed']} 秒")
+    print(f"➕ {'可导入' if args.dry_run else '导入'}: {stats['imported']}")
+    print(f"⚠️  拒绝: {stats['rejected']}")
+    for error in stats['errors']:
+        print(f"   {error['row']}: {error['reason']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+工时记录列表查询
+专员记录列表（/api/my_timesheet）和管理端记录列表（/api/admin/records）的分页SQL，
+接口和 db_indexes 的查询计划检查使用同一份SQL
+"""
+
+from database_config import USE_POSTGRESQL
+
+# 分页游标中的录入时间保留完整精度：PostgreSQL的时间戳按文本返回时只到秒（db_adapter.register_text_types），
+# 用截断后的值做 created_at = ? 比较会跳过或重复同一秒内的记录
+CURSOR_TIMESTAMP_SQL = "to_char({col}, 'YYYY-MM-DD HH24:MI:SS.US')" if USE_POSTGRESQL else '{col}'
+
+# 专员记录列表返回的字段
+MY_TIMESHEET_COLUMNS = (
+    'id', 'work_date', 'business_trip_days', 'actual_visit_days', 'audit_store_count',
+    'training_store_count', 'start_location', 'end_location', 'round_trip_distance',
+    'transport_mode', 'travel_hours', 'visit_hours', 'report_hours', 'total_work_hours',
+    'store_code', 'city', 'created_at'
+)
+
+
+def my_timesheet_page_sql(start_date=False, end_date=False, cursor=False):
+    """
+    专员记录分页查询，按 (work_date, created_at, id) 升序
+    参数依次为 user_id、[起始日期]、[结束日期]、[work_date, work_date, created_at, created_at, id]、条数
+    """
+    query = (f"SELECT {', '.join(MY_TIMESHEET_COLUMNS)}, "
+             f"{CURSOR_TIMESTAMP_SQL.format(col='created_at')} as cursor_created_at "
+             f"FROM timesheet_records WHERE user_id = ?")
+    if start_date:
+        query += ' AND work_date >= ?'
+    if end_date:
+        query += ' AND work_date <= ?'
+    if cursor:
+        query += """ AND (work_date > ? OR (work_date = ? AND (created_at > ?
+                     OR (created_at = ? AND id > ?))))"""
+    return query + ' ORDER BY work_date ASC, created_at ASC, id ASC LIMIT ?'
+
+
+def admin_records_page_sql(where, cursor=False):
+    """
+    管理端记录分页查询，按 (work_date, created_at, id) 倒序
+    where 为筛选条件（t=工时记录，u=用户），其参数之后依次为 [work_date, work_date, created_at, created_at, id]、条数
+    """
+    if cursor:
+        where += """ AND (t.work_date < ? OR (t.work_date = ? AND (t.created_at < ?
+                     OR (t.created_at = ? AND t.id < ?))))"""
+    return f"""
+        SELECT t.id, t.user_id, t.work_date, t.start_location, t.end_location,
+               t.round_trip_distance, t.total_work_hours, t.created_at,
+               {CURSOR_TIMESTAMP_SQL.format(col='t.created_at')} as cursor_created_at,
+               u.name as user_name, u.department as user_department
+        FROM timesheet_records t
+        JOIN users u ON t.user_id = u.id
+        WHERE {where}
+        ORDER BY t.work_date DESC, t.created_at DESC, t.id DESC
+        LIMIT ?
+    """
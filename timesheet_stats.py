@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+专员月度工时统计
+读取专员日汇总表，按月计算巡店日期数、日均工时、月店均巡店时长、
+额外巡店量和自主巡店加班薪资（原记录页 updateStatistics/calculateBonusSalary 的算法）
+"""
+
+import math
+from datetime import datetime, timedelta
+
+# 自主巡店加班薪资梯队：按月店均巡店时长（小时）选择单价行，按额外巡店量选择档位
+# (店均时长上限, [≤10家, ≤20家, ≤30家, >30家] 每家单价/元)，上限None表示以上全部
+SALARY_MATRIX = [
+    (1.5, [25, 30, 35, 40]),
+    (1.7, [30, 35, 40, 45]),
+    (2.0, [35, 40, 45, 50]),
+    (None, [40, 45, 50, 55]),
+]
+EXTRA_STORE_TIERS = [10, 20, 30]   # 额外巡店量档位上限
+
+STANDARD_DAILY_HOURS = 8           # 每个巡店日的标准工时
+MAX_VISIT_HOURS_PER_STORE = 1.0    # 店均巡店时长最高按60分钟计
+TRAVEL_DAYS_DEDUCTION = 1          # 非浙江省填写期间扣除的路途天数
+
+
+def month_range(month):
+    """'YYYY-MM' 转为当月首尾日期字符串，格式错误抛出ValueError"""
+    start = datetime.strptime(month, '%Y-%m')
+    next_month = (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start.strftime('%Y-%m-%d'), (next_month - timedelta(days=1)).strftime('%Y-%m-%d')
+
+
+def calculate_bonus_salary(avg_store_time, extra_stores):
+    """自主巡店加班薪资 = 额外巡店量 × 对应梯队单价"""
+    for limit, prices in SALARY_MATRIX:
+        if limit is None or avg_store_time <= limit:
+            break
+    tier = sum(1 for limit in EXTRA_STORE_TIERS if extra_stores > limit)
+    return extra_stores * prices[tier]
+
+
+def derive_statistics(totals):
+    """
+    由月度累计值计算展示指标
+    totals 包含 record_count、total_hours、total_stores、total_distance、
+    total_travel_hours、total_visit_hours、total_actual_visit_days、work_days
+    """
+    work_days = totals['work_days']
+    total_hours = totals['total_hours']
+    total_stores = totals['total_stores']
+
+    # 填写期间每个月扣除路途天数（最终核算时再统一处理）
+    adjusted_work_days = max(1, work_days - TRAVEL_DAYS_DEDUCTION) if work_days > 0 else 0
+
+    avg_daily_hours = total_hours / work_days if work_days > 0 else 0
+    avg_travel_per_store = totals['total_travel_hours'] / total_stores if total_stores > 0 else 0
+    avg_visit_per_store = totals['total_visit_hours'] / total_stores if total_stores > 0 else 0
+    avg_store_time = avg_travel_per_store + min(avg_visit_per_store, MAX_VISIT_HOURS_PER_STORE)
+
+    extra_hours = max(0, total_hours - adjusted_work_days * STANDARD_DAILY_HOURS)
+    extra_stores = math.floor(extra_hours / avg_store_time) if avg_store_time > 0 else 0
+
+    return {
+        'record_count': totals['record_count'],
+        'total_hours': round(total_hours, 2),
+        'total_distance': round(totals['total_distance'], 1),
+        'total_stores': total_stores,
+        'total_actual_visit_days': totals['total_actual_visit_days'],
+        'work_days': work_days,
+        'adjusted_work_days': adjusted_work_days,
+        'avg_daily_hours': round(avg_daily_hours, 2),
+        'avg_store_time': round(avg_store_time, 2),
+        'extra_hours': round(extra_hours, 2),
+        'extra_stores': extra_stores,
+        'bonus_salary': calculate_bonus_salary(avg_store_time, extra_stores),
+    }
+
+
+def _empty_totals():
+    return {
+        'record_count': 0, 'total_hours': 0.0, 'total_stores': 0, 'total_distance': 0.0,
+        'total_travel_hours': 0.0, 'total_visit_hours': 0.0, 'total_actual_visit_days': 0,
+        'work_days': 0,
+    }
+
+
+def fetch_monthly_totals(db, user_id, start_date=None, end_date=None):
+    """按月累计某个专员的工时（读取专员日汇总表 rollup_user_daily），返回 {'YYYY-MM': totals}"""
+    query = '''
+        SELECT work_date,
+               record_count,
+               total_hours,
+               total_stores,
+               total_distance,
+               travel_hours as total_travel_hours,
+               visit_hours as total_visit_hours,
+               actual_visit_days as total_actual_visit_days
+        FROM rollup_user_daily
+        WHERE user_id = ?
+    '''
+    params = [user_id]
+    if start_date:
+        query += ' AND work_date >= ?'
+        params.append(start_date)
+    if end_date:
+        query += ' AND work_date <= ?'
+        params.append(end_date)
+
+    months = {}
+    for day in db.execute(query, tuple(params)).fetchall():
+        totals = months.setdefault(str(day['work_date'])[:7], _empty_totals())
+        totals['work_days'] += 1
+        for key in ('record_count', 'total_hours', 'total_stores', 'total_distance',
+                    'total_travel_hours', 'total_visit_hours', 'total_actual_visit_days'):
+            totals[key] += day[key]
+    return months
+
+
+def get_monthly_statistics(db, user_id, month):
+    """某个专员指定月份的统计指标"""
+    start_date, end_date = month_range(month)
+    totals = fetch_monthly_totals(db, user_id, start_date, end_date).get(month, _empty_totals())
+    stats = derive_statistics(totals)
+    stats['month'] = month
+    return stats
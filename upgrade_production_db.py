@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 """
-生产环境数据库升级脚本：为已有PostgreSQL数据库添加phone字段
+生产环境数据库升级脚本：按版本执行 migrations.py 中的迁移
 使用方法：python upgrade_production_db.py
 """
 
@@ -9,7 +9,7 @@ import psycopg2
 from datetime import datetime
 
 def upgrade_production_database():
-    """升级生产环境数据库，添加缺失字段"""
+    """升级生产环境数据库（执行 migrations.py 中未完成的迁移）"""
     
     # PostgreSQL连接配置（来自Railway环境变量）
     DATABASE_URL = os.environ.get('DATABASE_URL')
@@ -20,93 +20,16 @@ def upgrade_production_database():
     print("🔄 开始升级生产环境数据库...")
     
     try:
-        # 连接PostgreSQL
-        pg_conn = psycopg2.connect(DATABASE_URL)
-        pg_cursor = pg_conn.cursor()
-        
-        # 检查并添加phone字段到users表
-        try:
-            pg_cursor.execute("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name='users' AND column_name='phone'
-            """)
-            if not pg_cursor.fetchone():
-                pg_cursor.execute('ALTER TABLE users ADD COLUMN phone VARCHAR(20) DEFAULT \'\'')
-                print("✅ 已添加phone字段到users表")
-            else:
-                print("ℹ️  users表已存在phone字段")
-                
-        except Exception as e:
-            print(f"❌ 添加phone字段失败: {e}")
-        
-        # 检查并添加store_code字段到timesheet_records表
-        try:
-            pg_cursor.execute("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name='timesheet_records' AND column_name='store_code'
-            """)
-            if not pg_cursor.fetchone():
-                pg_cursor.execute('ALTER TABLE timesheet_records ADD COLUMN store_code VARCHAR(255)')
-                print("✅ 已添加store_code字段到timesheet_records表")
-            else:
-                print("ℹ️  timesheet_records表已存在store_code字段")
-                
-        except Exception as e:
-            print(f"❌ 添加store_code字段失败: {e}")
-        
-        # 检查并添加city字段到timesheet_records表
-        try:
-            pg_cursor.execute("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name='timesheet_records' AND column_name='city'
-            """)
-            if not pg_cursor.fetchone():
-                pg_cursor.execute('ALTER TABLE timesheet_records ADD COLUMN city VARCHAR(255)')
-                print("✅ 已添加city字段到timesheet_records表")
-            else:
-                print("ℹ️  timesheet_records表已存在city字段")
-                
-        except Exception as e:
-            print(f"❌ 添加city字段失败: {e}")
-        
-        # 创建user_monthly_defaults表（如果不存在）
-        try:
-            pg_cursor.execute('''
-                CREATE TABLE IF NOT EXISTS user_monthly_defaults (
-                    id SERIAL PRIMARY KEY,
-                    user_id INTEGER NOT NULL,
-                    year INTEGER NOT NULL,
-                    month INTEGER NOT NULL,
-                    business_trip_days INTEGER DEFAULT 1,
-                    actual_visit_days INTEGER DEFAULT 1,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (id),
-                    UNIQUE(user_id, year, month)
-                )
-            ''')
-            print("✅ 已创建user_monthly_defaults表")
-        except Exception as e:
-            print(f"❌ 创建user_monthly_defaults表失败: {e}")
-        
-        # 提交所有更改
-        pg_conn.commit()
-        
+        from migrations import migrate
+        start, current = migrate()
+        print(f"✅ 数据库结构版本: {start} -> {current}")
         print("✅ 生产环境数据库升级完成！")
         print("📋 现在可以重新部署应用程序")
         return True
         
     except Exception as e:
         print(f"❌ 升级失败: {e}")
-        if 'pg_conn' in locals():
-            pg_conn.rollback()
         return False
-    finally:
-        if 'pg_conn' in locals():
-            pg_conn.close()
 
 def show_current_schema():
     """显示当前数据库结构"""
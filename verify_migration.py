@@ -13,10 +13,20 @@ def verify_migration(export_file_path):
     
     print("🔍 开始验证数据迁移...")
     
-    # 读取原始导出数据
+    # 读取原始导出数据（备份目录的 manifest.json 取最近一次全量备份的记录数）
     try:
         with open(export_file_path, 'r', encoding='utf-8') as f:
             original_data = json.load(f)
+        if 'segments' in original_data:
+            segment = original_data['segments'][-1]
+            if segment['type'] != 'full':
+                print("❌ 最近一次备份不是全量备份，无法按记录数验证")
+                return False
+            original_data = {
+                'users_count': segment['rows']['users'],
+                'records_count': segment['rows']['timesheet_records'],
+                'defaults_count': segment['rows']['user_monthly_defaults'],
+            }
     except Exception as e:
         print(f"❌ 无法读取原始数据文件: {e}")
         return False
@@ -121,16 +131,16 @@ if __name__ == '__main__':
     print("🚀 数据迁移验证工具")
     print("=" * 50)
     
-    # 查找导出文件
+    # 查找导出文件（备份目录或旧版JSON导出）
     import glob
-    export_files = glob.glob('railway_data_export_*.json')
+    export_files = sorted(glob.glob('railway_data_export_*.json')) + glob.glob('backups/manifest.json')
     
     if not export_files:
-        print("❌ 未找到导出数据文件，请确保已上传 railway_data_export_*.json 文件")
+        print("❌ 未找到导出数据文件，请确保已上传 backups 备份目录")
         exit(1)
     
-    # 使用最新的导出文件
-    export_file = sorted(export_files)[-1]
+    # 优先使用备份目录，其次是最新的JSON导出文件
+    export_file = export_files[-1]
     print(f"📄 使用导出文件: {export_file}")
     
     # 验证迁移
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+XLSX流式读取模块
+直接解析xlsx压缩包中的sheet XML，逐行返回单元格内容，不依赖openpyxl
+"""
+
+import re
+import zipfile
+import logging
+import xml.etree.ElementTree as ET
+
+logger = logging.getLogger(__name__)
+
+# SpreadsheetML命名空间
+NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+
+_CELL_REF_RE = re.compile(r'([A-Z]+)(\d*)')
+
+
+def column_index(cell_ref):
+    """将单元格引用（如 'C12'）转换为从0开始的列号"""
+    match = _CELL_REF_RE.match(cell_ref or '')
+    if not match:
+        return None
+    index = 0
+    for ch in match.group(1):
+        index = index * 26 + (ord(ch) - ord('A') + 1)
+    return index - 1
+
+
+def _text_of(element):
+    """拼接<si>或<is>节点下所有<t>文本（兼容富文本）"""
+    return ''.join(t.text or '' for t in element.iter(NS + 't'))
+
+
+def load_shared_strings(zf):
+    """读取共享字符串表，返回按索引排列的列表"""
+    try:
+        source = zf.open('xl/sharedStrings.xml')
+    except KeyError:
+        return []
+
+    strings = []
+    root = None
+    with source:
+        for event, elem in ET.iterparse(source, events=('start', 'end')):
+            if event == 'start':
+                if root is None:
+                    root = elem
+                continue
+            if elem.tag == NS + 'si':
+                strings.append(_text_of(elem))
+                # 释放已处理的节点，避免整棵树驻留内存
+                root.clear()
+    return strings
+
+
+def _sheet_paths(zf):
+    """按工作簿中的顺序返回 [(sheet名称, sheet XML路径)]"""
+    try:
+        workbook = ET.fromstring(zf.read('xl/workbook.xml'))
+        rels = ET.fromstring(zf.read('xl/_rels/workbook.xml.rels'))
+    except KeyError:
+        return [('Sheet1', 'xl/worksheets/sheet1.xml')]
+
+    targets = {}
+    for rel in rels:
+        target = rel.get('Target', '')
+        if target.startswith('/'):
+            target = target[1:]
+        elif not target.startswith('xl/'):
+            target = 'xl/' + target
+        targets[rel.get('Id')] = target
+
+    sheets = []
+    for sheet in workbook.iter(NS + 'sheet'):
+        rid = sheet.get(REL_NS + 'id')
+        if rid in targets:
+            sheets.append((sheet.get('name'), targets[rid]))
+    return sheets
+
+
+def sheet_names(path):
+    """按工作簿中的顺序返回所有工作表名称"""
+    with zipfile.ZipFile(path) as zf:
+        return [name for name, _ in _sheet_paths(zf)]
+
+
+def iter_xlsx_rows(path, sheet_index=0, shared_strings=None):
+    """
+    逐行读取xlsx中指定工作表
+    每次yield一个字符串列表（空单元格为''），内存占用只与共享字符串表和单行大小有关
+    """
+    with zipfile.ZipFile(path) as zf:
+        sheets = _sheet_paths(zf)
+        if sheet_index >= len(sheets):
+            raise IndexError(f"工作表索引超出范围: {sheet_index}")
+        sheet_path = sheets[sheet_index][1]
+
+        if shared_strings is None:
+            shared_strings = load_shared_strings(zf)
+
+        with zf.open(sheet_path) as source:
+            row = []
+            sheet_data = None
+            for event, elem in ET.iterparse(source, events=('start', 'end')):
+                tag = elem.tag
+                if event == 'start':
+                    if tag == NS + 'sheetData':
+                        sheet_data = elem
+                    continue
+                if tag == NS + 'c':
+                    col = column_index(elem.get('r'))
+                    if col is None:
+                        col = len(row)
+                    cell_type = elem.get('t')
+                    if cell_type == 'inlineStr':
+                        inline = elem.find(NS + 'is')
+                        value = _text_of(inline) if inline is not None else ''
+                    else:
+                        v = elem.find(NS + 'v')
+                        value = v.text if v is not None and v.text is not None else ''
+                        if cell_type == 's' and value:
+                            value = shared_strings[int(value)]
+                    if col >= len(row):
+                        row.extend([''] * (col - len(row) + 1))
+                    row[col] = value
+                    elem.clear()
+                elif tag == NS + 'row':
+                    yield row
+                    row = []
+                    # 已读完的行从sheetData中移除，保证内存占用与行数无关
+                    if sheet_data is not None:
+                        sheet_data.clear()
+
+
+def iter_xlsx_dicts(path, sheet_index=0):
+    """以首行为表头，逐行返回 {表头: 值} 字典"""
+    rows = iter_xlsx_rows(path, sheet_index)
+    try:
+        headers = [h.strip() for h in next(rows)]
+    except StopIteration:
+        return
+    for row in rows:
+        if not any(cell.strip() for cell in row):
+            continue
+        yield {header: (row[i] if i < len(row) else '') for i, header in enumerate(headers) if header}
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+XLSX流式写入模块
+逐行生成sheet XML并写入zip流，边写边输出字节块，不依赖openpyxl。
+字符串使用内联字符串（不需要共享字符串表），数值、日期写成带格式的数字单元格，
+内存占用与行数无关
+"""
+
+import re
+import zipfile
+import logging
+import itertools
+from datetime import datetime, date
+
+from csv_export import stream_response, EXPORT_BATCH_SIZE
+from database_config import get_db_connection
+from db_adapter import iter_batches
+
+logger = logging.getLogger(__name__)
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# 缓冲区超过该大小时输出一个字节块
+CHUNK_SIZE = 64 * 1024
+# 每次写入zip的行数
+ROWS_PER_WRITE = 200
+
+MAIN_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+PKG_REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+# 单元格样式序号，对应 STYLES_XML 中 cellXfs 的顺序
+STYLE_DATE = 1
+STYLE_DATETIME = 2
+STYLE_HEADER = 3
+
+STYLES_XML = f'''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<styleSheet xmlns="{MAIN_NS}">
+<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font><font><b/><sz val="11"/><name val="Calibri"/></font></fonts>
+<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>
+<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>
+<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>
+<cellXfs count="4">
+<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>
+<xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>
+<xf numFmtId="22" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>
+<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>
+</cellXfs>
+<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>
+</styleSheet>'''
+
+EXCEL_EPOCH_ORDINAL = date(1899, 12, 30).toordinal()
+
+# XML 1.0 不允许的控制字符
+_ILLEGAL_XML_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+# 工作表名称不允许的字符
+_ILLEGAL_SHEET_RE = re.compile(r'[\[\]:*?/\\]')
+SHEET_NAME_MAX = 31
+
+
+def column_letter(index):
+    """从0开始的列号转换为列字母（0 -> A, 26 -> AA）"""
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+def _escape(text):
+    text = _ILLEGAL_XML_RE.sub('', str(text))
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;')
+
+
+def _excel_serial(value):
+    """date/datetime 或 'YYYY-MM-DD[ HH:MM:SS]' 文本转换为Excel日期序列值，无法识别返回None"""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value[:19]) if len(value) > 10 else date.fromisoformat(value)
+        except ValueError:
+            return None
+    if isinstance(value, datetime):
+        seconds = value.hour * 3600 + value.minute * 60 + value.second
+        return value.toordinal() - EXCEL_EPOCH_ORDINAL + seconds / 86400
+    if isinstance(value, date):
+        return value.toordinal() - EXCEL_EPOCH_ORDINAL
+    return None
+
+
+def _cell(ref, value, kind):
+    """生成单元格XML；kind 为 number/date/datetime/text"""
+    if value is None or value == '':
+        return ''
+    if kind == 'number':
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return f'<c r="{ref}"><v>{value}</v></c>'
+        try:
+            return f'<c r="{ref}"><v>{float(value)}</v></c>'
+        except (TypeError, ValueError):
+            pass
+    elif kind in ('date', 'datetime'):
+        serial = _excel_serial(value)
+        if serial is not None:
+            style = STYLE_DATE if kind == 'date' else STYLE_DATETIME
+            return f'<c r="{ref}" s="{style}"><v>{serial}</v></c>'
+    return f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{_escape(value)}</t></is></c>'
+
+
+def sheet_title(name, used):
+    """生成合法且不重复的工作表名称"""
+    base = _ILLEGAL_SHEET_RE.sub('_', str(name or '').strip()) or '未分组'
+    base = base[:SHEET_NAME_MAX]
+    title, n = base, 2
+    while title.lower() in used:
+        suffix = f'({n})'
+        title = base[:SHEET_NAME_MAX - len(suffix)] + suffix
+        n += 1
+    used.add(title.lower())
+    return title
+
+
+class _StreamBuffer:
+    """zipfile写入目标：不可seek，写入的字节暂存，由生成器取走"""
+
+    def __init__(self):
+        self._chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        self.size = 0
+        return data
+
+
+def iter_xlsx(sheets, columns, chunk_size=CHUNK_SIZE):
+    """
+    生成xlsx文件的字节块
+    sheets: 可迭代的 (工作表名称, 行迭代器)，每行是与 columns 对应的值列表
+    columns: [(表头, 类型)]，类型为 number/date/datetime/text
+    """
+    buffer = _StreamBuffer()
+    titles = []
+    used = set()
+    header_row = '<row r="1">' + ''.join(
+        f'<c r="{column_letter(i)}1" t="inlineStr" s="{STYLE_HEADER}"><is><t>{_escape(title)}</t></is></c>'
+        for i, (title, _) in enumerate(columns)
+    ) + '</row>'
+    letters = [column_letter(i) for i in range(len(columns))]
+    kinds = [kind for _, kind in columns]
+
+    def write_sheet(zf, name, rows):
+        titles.append(sheet_title(name, used))
+        with zf.open(f'xl/worksheets/sheet{len(titles)}.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(
+                f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                f'<worksheet xmlns="{MAIN_NS}"><sheetViews><sheetView workbookViewId="0">'
+                f'<pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/>'
+                f'</sheetView></sheetViews><sheetData>{header_row}'.encode('utf-8')
+            )
+            pending = []
+            for row_number, values in enumerate(rows, start=2):
+                cells = ''.join([
+                    _cell(f'{letter}{row_number}', value, kind)
+                    for letter, kind, value in zip(letters, kinds, values)
+                ])
+                pending.append(f'<row r="{row_number}">{cells}</row>')
+                # 每 ROWS_PER_WRITE 行压缩一次，减少zip写入调用
+                if len(pending) >= ROWS_PER_WRITE:
+                    sheet.write(''.join(pending).encode('utf-8'))
+                    pending = []
+                    if buffer.size >= chunk_size:
+                        yield buffer.drain()
+            sheet.write(''.join(pending).encode('utf-8'))
+            sheet.write(b'</sheetData></worksheet>')
+        yield buffer.drain()
+
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, rows in sheets:
+            yield from write_sheet(zf, name, rows)
+        # 没有数据时也输出一个只有表头的工作表
+        if not titles:
+            yield from write_sheet(zf, '工时记录', ())
+
+        sheet_entries = ''.join(
+            f'<sheet name="{_escape(title)}" sheetId="{i}" r:id="rId{i}"/>'
+            for i, title in enumerate(titles, start=1)
+        )
+        zf.writestr('xl/workbook.xml',
+                    f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                    f'<workbook xmlns="{MAIN_NS}" xmlns:r="{REL_NS}"><sheets>{sheet_entries}</sheets></workbook>')
+        sheet_rels = ''.join(
+            f'<Relationship Id="rId{i}" Type="{REL_NS}/worksheet" Target="worksheets/sheet{i}.xml"/>'
+            for i in range(1, len(titles) + 1)
+        )
+        zf.writestr('xl/_rels/workbook.xml.rels',
+                    f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                    f'<Relationships xmlns="{PKG_REL_NS}">{sheet_rels}'
+                    f'<Relationship Id="rId{len(titles) + 1}" Type="{REL_NS}/styles" Target="styles.xml"/>'
+                    f'</Relationships>')
+        zf.writestr('xl/styles.xml', STYLES_XML)
+        zf.writestr('_rels/.rels',
+                    f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                    f'<Relationships xmlns="{PKG_REL_NS}">'
+                    f'<Relationship Id="rId1" Type="{REL_NS}/officeDocument" Target="xl/workbook.xml"/>'
+                    f'</Relationships>')
+        sheet_types = ''.join(
+            f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+            f'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            for i in range(1, len(titles) + 1)
+        )
+        zf.writestr('[Content_Types].xml',
+                    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                    '<Default Extension="xml" ContentType="application/xml"/>'
+                    '<Override PartName="/xl/workbook.xml" '
+                    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+                    '<Override PartName="/xl/styles.xml" '
+                    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+                    f'{sheet_types}</Types>')
+    yield buffer.drain()
+
+
+def iter_query_xlsx(columns, sql, params, row_builder, sheet_key, batch_size=None):
+    """
+    按批读取查询结果并生成xlsx字节块，sheet_key(row) 相同的连续记录写入同一个工作表
+    （查询需按 sheet_key 排序）
+    """
+    batch_size = batch_size or EXPORT_BATCH_SIZE
+    with get_db_connection() as db:
+        rows = itertools.chain.from_iterable(iter_batches(db, sql, params, batch_size))
+        sheets = (
+            (key, (row_builder(row) for row in group))
+            for key, group in itertools.groupby(rows, key=sheet_key)
+        )
+        yield from iter_xlsx(sheets, columns)
+
+
+def stream_query_xlsx(filename, columns, sql, params, row_builder, sheet_key, batch_size=None):
+    """把查询结果以xlsx流式返回"""
+    return stream_response(filename, XLSX_MIMETYPE,
+                           iter_query_xlsx(columns, sql, params, row_builder, sheet_key, batch_size))